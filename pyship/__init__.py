@@ -12,9 +12,8 @@ from .windows_sdk import find_sdk_tool, WINDOWS_SDK_BIN_DIR
 from .installer import INSTALLERS_DIR_NAME, installer_file_name, get_installers_dir
 from .logging import PyshipLog, log_process_output
 from .exceptions import PyshipException, PyshipNoProductDirectory, PyshipCouldNotGetVersion, PyshipLicenseFileDoesNotExist, PyshipInsufficientAppInfo, PyshipNoAppName
-from .exceptions import PyshipNoTargetAppInfo, PyshipSigningUnavailable
+from .exceptions import PyshipNoTargetAppInfo, PyshipSigningUnavailable, PyshipTraceFailed, PyshipWheelhouseMissing, PyshipZstdUnavailable, PyshipReleaseIndexConflict
 from .custom_print import pyship_print
-from .arguments import get_arguments
 from .subprocess import subprocess_run
 from .app_info import AppInfo, get_app_info, get_app_info_py_project
 from .get_icon import get_icon
@@ -23,8 +22,28 @@ from .download import file_download, extract, PyshipDownloadError
 from .signing import SigningConfig, DEFAULT_TIMESTAMP_URL, sign_if_configured, sign_file_token, is_token_present, is_certificate_in_store, is_rdp_session, check_signing_available
 from .msix import create_msix
 from .create_launcher import create_pyship_launcher
-from .clip import create_base_clip, install_target_app, create_clip, create_clip_file
-from .uv_util import find_or_bootstrap_uv, uv_python_install, copy_standalone_python, uv_pip_install, uv_build
+from .clip_prune import PRUNE_PROFILES, PruneStats, prune_clip
+from .trace import TRACE_FILE_NAME, run_trace, shake_clip
+from .bytecode import CompileStats, compile_clip
+from .site_packages_zip import SITE_PACKAGES_ZIP_NAME, PackStats, pack_site_packages
+from .arguments import get_arguments
+from .clip_archive import ArchiveStats, ClipArchiveWriter, write_clip_archive
+from .clip_v2 import CLIP_FORMATS, ClipV2ArchiveWriter, write_clip_v2_archive, read_clip_format, extract_clip, is_zstd_available
+from .clip_stream import StreamingClipArchiveWriter
+from .clip_manifest import CLIP_MANIFEST_NAME, ClipFileInfo, hash_clip_tree, create_clip_manifest, read_clip_manifest, read_clip_inventory, verify_clip
+from .clip import create_base_clip, install_target_app, create_clip, create_clip_file, get_clip_dir, resolve_python_version
+from .copy_engine import CopyStats, copy_tree, copy_file
+from .clip_template import get_clip_template, materialise_clip_template
+from .uv_util import find_or_bootstrap_uv, uv_version, uv_python_install, copy_standalone_python, uv_pip_install, uv_build
+from .build_cache import BuildCache, get_build_key, get_source_hash
+from .wheelhouse import LOCK_FILE_NAME, uv_lock, build_wheelhouse, get_wheelhouse_dir, is_wheelhouse_complete, require_wheelhouse
+from .chunk_store import CHUNK_MANIFEST_EXT, split_clip, create_chunk_manifest, assemble_clip
+from .upload_scheduler import UploadScheduler, get_upload_priority
+from .s3_upload import UPLOAD_STATE_DIR_NAME, S3Uploader, UploadStats
+from .release_index import get_release_index_name, create_release, add_release, get_latest_release
 from .cloud import PyShipCloud
+from .clip_patch import CLIP_PATCH_EXT, create_clip_patch, apply_clip_patch, create_clip_patches
+from .retention import RetentionReport, get_expired_versions, prune_cloud, prune_local
+from .stages import Stage, run_stages, check_stage_graph
 from .pyship import PyShip
 from .main import main
@@ -171,12 +171,13 @@ def get_app_info_wheel(app_info: AppInfo, dist_path: Path) -> AppInfo:
 
 
 @typechecked
-def get_app_info(target_app_project_dir: Path, target_app_dist_dir: Path, cache_dir: Optional[Path] = None) -> AppInfo:
+def get_app_info(target_app_project_dir: Path, target_app_dist_dir: Path, cache_dir: Optional[Path] = None, offline: bool = False) -> AppInfo:
     """
     Get combined app info from all potential sources.
     :param target_app_project_dir: app project dir, e.g. where a pyproject.toml may reside. (optional)
     :param target_app_dist_dir: the "distribution" dir, e.g. where a wheel may reside (optional)
     :param cache_dir: cache dir for uv bootstrap (optional)
+    :param offline: build the wheel (if there isn't one) without network access, from uv's cache
     :return: an AppInfo instance
     """
 
@@ -196,7 +197,7 @@ def get_app_info(target_app_project_dir: Path, target_app_dist_dir: Path, cache_
 
             if cache_dir is not None:
                 uv_path = find_or_bootstrap_uv(cache_dir)
-                uv_build(uv_path, target_app_project_dir, target_app_dist_dir)
+                uv_build(uv_path, target_app_project_dir, target_app_dist_dir, offline=offline)
                 wheel_list = list(target_app_dist_dir.glob(wheel_glob))  # try again to find the wheel
             else:
                 log.warning("no cache_dir provided, cannot bootstrap uv to build wheel")
@@ -9,6 +9,7 @@ from typing import Any
 from balsa import verbose_arg_string, delete_existing_arg_string, log_dir_arg_string
 
 from pyship import __name__, __version__
+from pyship.clip_prune import PRUNE_PROFILES
 
 
 def get_arguments() -> Any:
@@ -19,12 +20,24 @@ def get_arguments() -> Any:
     """
     parser = argparse.ArgumentParser(prog=__name__, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
+    parser.add_argument(
+        "command",
+        nargs="?",
+        default="ship",
+        choices=["ship", "trace", "lock", "wheelhouse", "prune-releases", "publish"],
+        help="ship the app, trace the CLIP files the app uses (see --smoke-script), lock its dependencies, download the locked wheels for --offline builds, "
+        "delete old published versions, or upload the last shipped version again (see --resume)",
+    )
+
     parser.add_argument("-p", "--profile", help="cloud profile")
     parser.add_argument("-i", "--id", help="cloud id")
     parser.add_argument("-s", "--secret", help="cloud secret")
 
     parser.add_argument("--noupload", default=False, action="store_true", help="do not upload files to the cloud (e.g. installer and clip files)")
     parser.add_argument("--public-readable", default=False, action="store_true", help="make uploaded S3 objects publicly readable")
+    parser.add_argument("--upload-part-size", type=int, help="multipart upload part size in bytes (default 16 MiB, at least 5 MiB)")
+    parser.add_argument("--upload-concurrency", type=int, help="most upload parts sent at the same time, adapted to the throughput (default 8)")
+    parser.add_argument("--upload-bandwidth", type=int, help="upload bandwidth cap in bytes per second (default no cap)")
 
     # Code signing
     parser.add_argument("--pfx-path", help="path to PFX certificate file")
@@ -34,6 +47,25 @@ def get_arguments() -> Any:
     parser.add_argument("--certificate-auto-select", default=False, action="store_true", help="auto-select best signing certificate from store")
     parser.add_argument("--code-sign", default=False, action="store_true", help="sign executables; abort ship() if signing fails")
 
+    parser.add_argument("--no-build-cache", default=False, action="store_true", help="rebuild every stage instead of restoring unchanged outputs from the build cache")
+
+    parser.add_argument("--prune", choices=[*PRUNE_PROFILES, "none"], help="CLIP pruning profile (overrides pyproject.toml)")
+    parser.add_argument("--compile-bytecode", default=False, action="store_true", help="compile the CLIP to .pyc files at build time")
+    parser.add_argument("--offline", default=False, action="store_true", help="install the CLIP from the lock file and wheelhouse, without network access")
+    parser.add_argument("--zip-packages", default=False, action="store_true", help="pack pure-Python packages in the CLIP into a zip on sys.path")
+    parser.add_argument("--clip-format", type=int, choices=[1, 2], help=".clip format: 1 (zip, default) or 2 (zstd compressed)")
+    parser.add_argument("--clip-compression-level", type=int, help=".clip compression level: zip 1-9 (default 6), v2 1-22 (default 12), 0 stores every file")
+    parser.add_argument("--clip-patches", type=int, help="create .clippatch deltas from this many previously uploaded versions")
+    parser.add_argument("--clip-streaming", default=False, action="store_true", help="compress the CLIP into the .clip while it is being built (zip format)")
+    parser.add_argument("--clip-chunks", default=False, action="store_true", help="upload the .clip as deduplicated content-defined chunks and a chunk manifest")
+    parser.add_argument("--smoke-script", help="trace: script that exercises the app, run inside the CLIP (default: run the app)")
+    parser.add_argument("--trace-file", help="trace file to write (trace) or to shake the CLIP down to (ship)")
+    parser.add_argument("--keep-versions", type=int, help="prune-releases: keep this many of the newest published versions (default 5)")
+    parser.add_argument("--keep-days", type=int, help="prune-releases: keep the versions published in the last this many days (default 30)")
+    parser.add_argument("--pin", action="append", help="prune-releases: keep this version (may be given more than once)")
+    parser.add_argument("--dry-run", default=False, action="store_true", help="prune-releases: only report what would be deleted")
+    parser.add_argument("--resume", default=False, action="store_true", help="publish: only upload the missing parts of interrupted uploads (ship always resumes)")
+
     parser.add_argument("--version", action="store_true", help="display version")
     parser.add_argument("-v", f"--{verbose_arg_string}", action="store_true", help="increase output verbosity")
     parser.add_argument(f"--{delete_existing_arg_string}", action="store_true", help="delete log prior to running")
@@ -0,0 +1,214 @@
+"""
+Content-addressed incremental build cache for the ship pipeline.
+
+Each cached stage has a key: a hash of everything its output depends on (the
+project's pyproject.toml and sources, the Python and uv versions, the icon, the
+pyship version, ...). When ``ship()`` sees a key it has built before, the stage's
+outputs are restored from the cache and the stage is skipped. This extends the
+metadata-hash idea :func:`pyship.launcher.calculate_metadata` applies to the
+launcher to the whole pipeline.
+
+Entries live in ``<cache_dir>/build/<app_name>/<stage>/<key>/``. Only the most
+recent :data:`BUILD_CACHE_MAX_ENTRIES` entries of each stage are kept.
+"""
+
+import hashlib
+import json
+import shutil
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Union
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, __version__ as pyship_version, pyship_print
+from pyship.launcher import get_file_sha256
+from pyship.copy_engine import copy_file, copy_tree
+
+log = get_logger(__application_name__)
+
+BUILD_CACHE_DIR_NAME = "build"
+BUILD_CACHE_MAX_ENTRIES = 4  # per app and stage
+
+_RESULT_FILE_NAME = "result.json"  # written last - an entry without it is incomplete
+_OUTPUTS_DIR_NAME = "outputs"
+
+# project root files that go into the source hash (in addition to the package sources)
+_PROJECT_FILES = ("pyproject.toml", "setup.py", "setup.cfg", "MANIFEST.in", "LICENSE")
+_IGNORED_DIR_NAMES = ("__pycache__",)
+_IGNORED_SUFFIXES = (".pyc", ".pyo")
+
+
+@typechecked
+def hash_files(file_paths: Iterable[Path], base_dir: Path) -> str:
+    """
+    Hash file contents together with their paths relative to *base_dir*.
+
+    :param file_paths: files to hash (order does not matter)
+    :param base_dir: directory the recorded relative paths are relative to
+    :return: SHA-256 hex digest
+    """
+    hash_object = hashlib.sha256()
+    for file_path in sorted(file_paths, key=lambda p: p.relative_to(base_dir).as_posix()):
+        hash_object.update(file_path.relative_to(base_dir).as_posix().encode())
+        hash_object.update(get_file_sha256(file_path).encode())
+    return hash_object.hexdigest()
+
+
+@typechecked
+def get_source_hash(project_dir: Path, app_name: str) -> str:
+    """
+    Hash the target app's project files (pyproject.toml etc.) and package sources.
+
+    :param project_dir: target app project dir
+    :param app_name: target app (package) name
+    :return: SHA-256 hex digest
+    """
+    file_paths = [Path(project_dir, file_name) for file_name in _PROJECT_FILES if Path(project_dir, file_name).is_file()]
+    for package_dir in (Path(project_dir, app_name), Path(project_dir, "src", app_name)):
+        if package_dir.is_dir():
+            for file_path in package_dir.rglob("*"):
+                if file_path.is_file() and file_path.suffix not in _IGNORED_SUFFIXES and not any(part in _IGNORED_DIR_NAMES for part in file_path.parts):
+                    file_paths.append(file_path)
+    return hash_files(file_paths, project_dir)
+
+
+@typechecked
+def get_build_key(**inputs: Any) -> str:
+    """
+    Combine a stage's inputs (strings, numbers, other keys, ...) into a cache key.
+    The pyship version is always included.
+
+    :param inputs: stage inputs (must be JSON serializable once converted with str())
+    :return: SHA-256 hex digest
+    """
+    inputs["pyship_version"] = pyship_version
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _remove(path: Path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def _copy(source: Path, destination: Path):
+    _remove(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    if source.is_dir():
+        copy_tree(source, destination)
+    else:
+        copy_file(source, destination)
+
+
+class BuildCache:
+    """
+    Stores and restores stage outputs (files or directories) keyed on a content hash of the stage's inputs.
+    """
+
+    @typechecked
+    def __init__(self, cache_dir: Path, app_name: str):
+        """
+        :param cache_dir: pyship cache dir
+        :param app_name: target app name (entries are kept per app)
+        """
+        self.cache_root = Path(cache_dir, BUILD_CACHE_DIR_NAME, app_name)
+
+    def _entry_dir(self, stage_name: str, key: str) -> Path:
+        return Path(self.cache_root, stage_name, key)
+
+    @typechecked
+    def restore(self, stage_name: str, key: str, outputs: List[Path]) -> bool:
+        """
+        Restore a stage's outputs from the cache, replacing anything at the output paths.
+
+        :param stage_name: stage name
+        :param key: stage key
+        :param outputs: output paths (in the same order they were stored)
+        :return: True if the outputs were restored, False on a cache miss
+        """
+        entry_dir = self._entry_dir(stage_name, key)
+        if not Path(entry_dir, _RESULT_FILE_NAME).exists():
+            return False
+        for index, output in enumerate(outputs):
+            _copy(Path(entry_dir, _OUTPUTS_DIR_NAME, str(index)), output)
+        entry_dir.touch()  # most recently used
+        return True
+
+    @typechecked
+    def store(self, stage_name: str, key: str, outputs: List[Path], result: Union[Path, None] = None):
+        """
+        Store a stage's outputs in the cache.
+
+        :param stage_name: stage name
+        :param key: stage key
+        :param outputs: output paths (files or directories) to store
+        :param result: the stage's return value - must be one of the outputs or inside one of them
+        """
+        entry_dir = self._entry_dir(stage_name, key)
+        staging_dir = entry_dir.with_name(f"{key}.tmp")
+        _remove(staging_dir)
+        for index, output in enumerate(outputs):
+            _copy(output, Path(staging_dir, _OUTPUTS_DIR_NAME, str(index)))
+        Path(staging_dir, _RESULT_FILE_NAME).write_text(json.dumps(self._encode_result(outputs, result)))
+        _remove(entry_dir)
+        staging_dir.rename(entry_dir)
+        self._evict(stage_name)
+
+    @typechecked
+    def load_result(self, stage_name: str, key: str, outputs: List[Path]) -> Union[Path, None]:
+        """
+        Get the stored return value of a stage, mapped onto the given output paths.
+
+        :param stage_name: stage name
+        :param key: stage key
+        :param outputs: output paths (in the same order they were stored)
+        :return: the stage's return value
+        """
+        encoded = json.loads(Path(self._entry_dir(stage_name, key), _RESULT_FILE_NAME).read_text())
+        if encoded is None:
+            return None
+        return Path(outputs[encoded["output"]], encoded["relative"])
+
+    @staticmethod
+    def _encode_result(outputs: List[Path], result: Union[Path, None]) -> Union[dict, None]:
+        if result is None:
+            return None
+        for index, output in enumerate(outputs):
+            if result == output or output in result.parents:
+                return {"output": index, "relative": result.relative_to(output).as_posix()}
+        raise ValueError(f"{result} is not in the stage outputs {outputs}")
+
+    def _evict(self, stage_name: str):
+        entry_dirs = sorted((p for p in Path(self.cache_root, stage_name).iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime, reverse=True)
+        for entry_dir in entry_dirs[BUILD_CACHE_MAX_ENTRIES:]:
+            log.info(f"evicting build cache entry {entry_dir}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+    @typechecked
+    def cached(self, stage_name: str, key: str, outputs: List[Path], function: Callable[..., Union[Path, None]]) -> Callable[..., Union[Path, None]]:
+        """
+        Wrap a stage function so that it restores its outputs from the cache on a hit,
+        and stores them after running on a miss. A None result is not cached (the
+        stage could not produce its output, e.g. a build tool was unavailable).
+
+        :param stage_name: stage name
+        :param key: stage key
+        :param outputs: paths the stage writes
+        :param function: stage function (called with the stage's inputs as keyword arguments)
+        :return: wrapped stage function
+        """
+
+        @wraps(function)
+        def cached_function(**kwargs: Any) -> Union[Path, None]:
+            if self.restore(stage_name, key, outputs):
+                pyship_print(f"{stage_name} restored from build cache ({key[:12]})")
+                return self.load_result(stage_name, key, outputs)
+            result = function(**kwargs)
+            if result is not None:
+                self.store(stage_name, key, outputs, result)
+            return result
+
+        return cached_function
@@ -0,0 +1,119 @@
+"""
+Ahead-of-time bytecode compilation of a CLIP.
+
+Without it, the first launch of every new app version compiles everything it
+imports - and may not even be able to write ``__pycache__`` under Program Files,
+in which case *every* launch pays. :func:`compile_clip` compiles the CLIP's stdlib
+and site-packages at build time with the CLIP's own interpreter (the ``.pyc``
+format is specific to the Python version), using several ``compileall``
+processes at once.
+
+The ``.pyc`` files are unchecked-hash based (PEP 552): the interpreter loads them
+without stat-ing or hashing the source, and CLIP files never change after
+installation.
+
+Sources matching the ``drop_sources`` globs are compiled to legacy (sourceless)
+``.pyc`` files next to the source instead, and the ``.py`` files are removed. Only
+drop sources whose licence permits distributing them in compiled form - and note
+that tracebacks then show no source lines.
+"""
+
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Union
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, pyship_print, subprocess_run
+from pyship.clip_prune import path_matches
+
+log = get_logger(__application_name__)
+
+COMPILED_DIRS = ("Lib",)  # stdlib and site-packages
+DEFAULT_COMPILE_WORKERS = os.cpu_count() or 1
+
+
+@dataclass
+class CompileStats:
+    """Sources compiled (and dropped) and how long it took."""
+
+    files: int = 0
+    failed: int = 0
+    sources_dropped: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        return f"{self.files} files compiled ({self.failed} failed, {self.sources_dropped} sources dropped) in {self.seconds:.2f}s"
+
+
+def _compile(python_exe: Path, source_paths: List[Path], legacy: bool, list_dir: Path) -> int:
+    """Compile files with one compileall process. :return: process return code"""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", dir=list_dir, delete=False, encoding="utf-8") as list_file:
+        list_file.write("\n".join(str(p) for p in source_paths))
+    cmd = [str(python_exe), "-m", "compileall", "-q", "-f", "--invalidation-mode", "unchecked-hash", "-i", list_file.name]
+    if legacy:
+        cmd.append("-b")
+    return_code, _, _ = subprocess_run(cmd)
+    return return_code
+
+
+@typechecked
+def compile_clip(python_exe: Path, clip_dir: Path, drop_sources: Union[List[str], None] = None, workers: int = DEFAULT_COMPILE_WORKERS) -> CompileStats:
+    """
+    Compile a CLIP's Python sources to unchecked-hash .pyc files.
+
+    :param python_exe: the CLIP's Python interpreter
+    :param clip_dir: CLIP dir
+    :param drop_sources: globs of CLIP paths whose .py sources are replaced by sourceless .pyc files (None to keep all sources)
+    :param workers: number of compileall processes
+    :return: compile statistics
+    """
+    start = time.monotonic()
+    cached_sources = []  # compiled to __pycache__
+    legacy_sources = []  # compiled next to the source, which is then removed
+    for compiled_dir in COMPILED_DIRS:
+        for source_path in Path(clip_dir, compiled_dir).rglob("*.py"):
+            if drop_sources is not None and path_matches(source_path.relative_to(clip_dir).as_posix(), drop_sources):
+                legacy_sources.append(source_path)
+            else:
+                cached_sources.append(source_path)
+
+    # one batch of files per compileall process (compileall only parallelizes directories, not file lists)
+    batches = []
+    for sources, legacy in ((cached_sources, False), (legacy_sources, True)):
+        batch_count = max(1, min(workers, len(sources)))
+        batches.extend((sources[index::batch_count], legacy) for index in range(batch_count) if len(sources[index::batch_count]) > 0)
+
+    with tempfile.TemporaryDirectory() as list_dir:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            return_codes = list(executor.map(lambda batch: _compile(python_exe, batch[0], batch[1], Path(list_dir)), batches))
+    if any(return_code != 0 for return_code in return_codes):
+        log.warning(f"some sources in {clip_dir} failed to compile ({return_codes=})")
+
+    compile_stats = CompileStats()
+    pycache_listings = {}
+    for source_path in cached_sources:
+        pycache_dir = Path(source_path.parent, "__pycache__")
+        if pycache_dir not in pycache_listings:
+            pycache_listings[pycache_dir] = os.listdir(pycache_dir) if pycache_dir.is_dir() else []
+        if any(name.startswith(f"{source_path.stem}.") and name.endswith(".pyc") for name in pycache_listings[pycache_dir]):
+            compile_stats.files += 1
+        else:
+            compile_stats.failed += 1
+    for source_path in legacy_sources:
+        if source_path.with_suffix(".pyc").exists():
+            compile_stats.files += 1
+            compile_stats.sources_dropped += 1
+            source_path.unlink()
+        else:
+            compile_stats.failed += 1  # the source is kept
+    compile_stats.seconds = time.monotonic() - start
+
+    log.info(f"compiled {clip_dir} with {python_exe} ({workers=},{drop_sources=}) : {compile_stats}")
+    pyship_print(f"{clip_dir.name}: {compile_stats}")
+    return compile_stats
@@ -0,0 +1,226 @@
+"""
+Content-defined chunking of ``.clip`` files for a deduplicating chunk store.
+
+Publishing one ``.clip`` per version stores (and uploads) the Python runtime and
+every unchanged dependency again with each release. In the chunked publishing
+mode (``clip_chunks = true``) the ``.clip`` is split into content-defined chunks
+that are stored once in the bucket under their SHA-256 (``chunks/<sha256>``),
+and each version only adds a small chunk manifest
+(``<app>_<version>.clipchunks``) listing its chunks in order. Storage and upload
+volume grow with the changed bytes only, and updaters fetch just the chunks they
+don't already have.
+
+Chunk boundaries are only placed at member starts (zip local file headers, the
+zip central directory and zstd frames of v2 containers), chosen by a hash of the
+bytes there, so inserting or changing a file moves just the boundaries next to
+it. Since ``.clip`` files are reproducible (see :mod:`pyship.clip_archive`),
+unchanged files compress to the same bytes and so to the same chunks. Large
+members are split at fixed offsets from their start.
+"""
+
+import hashlib
+import json
+import mmap
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Union
+
+from semver import VersionInfo
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__
+from pyship.clip_archive import DEFAULT_ARCHIVE_WORKERS, READ_CHUNK_SIZE
+
+log = get_logger(__application_name__)
+
+CHUNK_MANIFEST_EXT = "clipchunks"
+CHUNK_MANIFEST_FORMAT_VERSION = 1
+CHUNK_PREFIX = "chunks/"  # S3 key prefix of the chunks
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+BOUNDARY_MASK = 0x7  # on average every 8th member start (past MIN_CHUNK_SIZE) is a boundary
+
+# zip local file header, zip central directory header, zstd frame
+_ANCHORS = re.compile(b"|".join(re.escape(anchor) for anchor in (b"PK\x03\x04", b"PK\x01\x02", b"\x28\xb5\x2f\xfd")))
+_ANCHOR_HASH_SIZE = 64  # a member's header, including its name and CRC
+
+
+@dataclass
+class Chunk:
+    """
+    a chunk of a .clip file
+    """
+
+    sha256: str
+    offset: int
+    size: int
+
+
+@typechecked
+def get_chunk_key(sha256: str) -> str:
+    """
+    :param sha256: chunk's SHA-256
+    :return: chunk's S3 key
+    """
+    return f"{CHUNK_PREFIX}{sha256}"
+
+
+@typechecked
+def get_chunk_manifest_name(app_name: str, version: Union[VersionInfo, str]) -> str:
+    """
+    :param app_name: target app name
+    :param version: target app version
+    :return: chunk manifest file name (also its S3 key)
+    """
+    return f"{app_name}_{str(version)}.{CHUNK_MANIFEST_EXT}"
+
+
+@typechecked
+def version_from_chunk_manifest(app_name: str, s3_key: str) -> Union[VersionInfo, None]:
+    """
+    :param app_name: target app name
+    :param s3_key: S3 key (or file name)
+    :return: version if s3_key is a chunk manifest of app_name, otherwise None
+    """
+    prefix = f"{app_name}_"
+    suffix = f".{CHUNK_MANIFEST_EXT}"
+    version = None
+    if s3_key.startswith(prefix) and s3_key.endswith(suffix):
+        try:
+            version = VersionInfo.parse(s3_key[len(prefix) : -len(suffix)])
+        except ValueError:
+            pass
+    return version
+
+
+def _get_boundaries(data: Union[bytes, mmap.mmap], min_size: int, max_size: int, boundary_mask: int) -> List[int]:
+    boundaries = []
+    start = 0
+    for match in _ANCHORS.finditer(data):  # type: ignore[arg-type]  # re accepts any buffer
+        offset = match.start()
+        while offset - start > max_size:
+            start += max_size
+            boundaries.append(start)
+        if offset - start >= min_size and zlib.crc32(data[offset : offset + _ANCHOR_HASH_SIZE]) & boundary_mask == 0:
+            start = offset
+            boundaries.append(start)
+    while len(data) - start > max_size:
+        start += max_size
+        boundaries.append(start)
+    return boundaries
+
+
+@typechecked
+def split_clip(clip_path: Path, min_size: int = MIN_CHUNK_SIZE, max_size: int = MAX_CHUNK_SIZE, boundary_mask: int = BOUNDARY_MASK, workers: int = DEFAULT_ARCHIVE_WORKERS) -> List[Chunk]:
+    """
+    Split a .clip file into content-defined chunks.
+
+    :param clip_path: .clip file (zip or v2)
+    :param min_size: minimum chunk size (except for the last chunk)
+    :param max_size: maximum chunk size
+    :param boundary_mask: a member start becomes a boundary if the hash of its header & boundary_mask is 0
+    :param workers: number of threads hashing the chunks
+    :return: chunks, in order
+    """
+    if not 0 < min_size <= max_size:
+        raise ValueError(f"invalid chunk sizes {min_size=} {max_size=}")
+    size = clip_path.stat().st_size
+    if size == 0:
+        return []
+    with open(clip_path, "rb") as clip_file, mmap.mmap(clip_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        offsets = [0, *_get_boundaries(data, min_size, max_size, boundary_mask), size]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # hashlib releases the GIL for large buffers
+            sha256s = list(executor.map(lambda index: hashlib.sha256(data[offsets[index] : offsets[index + 1]]).hexdigest(), range(len(offsets) - 1)))
+    return [Chunk(sha256, offsets[index], offsets[index + 1] - offsets[index]) for index, sha256 in enumerate(sha256s)]
+
+
+@typechecked
+def create_chunk_manifest(clip_path: Path, app_name: str, version: Union[VersionInfo, str]) -> Path:
+    """
+    Split a .clip file into chunks and write its chunk manifest next to it.
+
+    :param clip_path: .clip file
+    :param app_name: target app name
+    :param version: target app version
+    :return: chunk manifest path
+    """
+    chunks = split_clip(clip_path)
+    clip_sha256 = hashlib.sha256()
+    with open(clip_path, "rb") as clip_file:
+        while len(buffer := clip_file.read(READ_CHUNK_SIZE)) > 0:
+            clip_sha256.update(buffer)
+    manifest = {
+        "format": CHUNK_MANIFEST_FORMAT_VERSION,
+        "app": app_name,
+        "version": str(version),
+        "clip": clip_path.name,
+        "size": clip_path.stat().st_size,
+        "sha256": clip_sha256.hexdigest(),
+        "chunks": [{"sha256": chunk.sha256, "size": chunk.size} for chunk in chunks],
+    }
+    manifest_path = Path(clip_path.parent, get_chunk_manifest_name(app_name, version))
+    manifest_path.write_text(json.dumps(manifest, indent=1))
+    unique_bytes = sum({chunk.sha256: chunk.size for chunk in chunks}.values())
+    log.info(f"{clip_path} : {len(chunks)} chunks, {unique_bytes} unique bytes")
+    return manifest_path
+
+
+@typechecked
+def read_chunk_manifest(manifest_path: Path) -> dict:
+    """
+    :param manifest_path: chunk manifest
+    :return: chunk manifest contents
+    """
+    manifest = json.loads(manifest_path.read_text())
+    if manifest.get("format") != CHUNK_MANIFEST_FORMAT_VERSION:
+        raise ValueError(f'"{manifest_path}" is an unsupported chunk manifest format ({manifest.get("format")})')
+    return manifest
+
+
+@typechecked
+def get_missing_chunks(manifest_path: Path, chunks_dir: Path) -> List[str]:
+    """
+    :param manifest_path: chunk manifest
+    :param chunks_dir: directory of chunk files, named by their SHA-256
+    :return: SHA-256 of the chunks that are not in chunks_dir (each once, in manifest order)
+    """
+    missing = {}
+    for chunk in read_chunk_manifest(manifest_path)["chunks"]:
+        if not Path(chunks_dir, chunk["sha256"]).exists():
+            missing[chunk["sha256"]] = None
+    return list(missing)
+
+
+@typechecked
+def assemble_clip(manifest_path: Path, chunks_dir: Path, clip_path: Path) -> Path:
+    """
+    Reassemble a .clip file from its chunks. Reference implementation for updaters.
+
+    :param manifest_path: chunk manifest
+    :param chunks_dir: directory of chunk files, named by their SHA-256 (see :func:`get_missing_chunks`)
+    :param clip_path: .clip file to write
+    :return: clip_path
+    """
+    manifest = read_chunk_manifest(manifest_path)
+    clip_sha256 = hashlib.sha256()
+    temp_path = Path(clip_path.parent, f"{clip_path.name}.tmp")
+    try:
+        with open(temp_path, "wb") as clip_file:
+            for chunk in manifest["chunks"]:
+                data = Path(chunks_dir, chunk["sha256"]).read_bytes()
+                if len(data) != chunk["size"] or hashlib.sha256(data).hexdigest() != chunk["sha256"]:
+                    raise ValueError(f'chunk {chunk["sha256"]} in "{chunks_dir}" is corrupt')
+                clip_sha256.update(data)
+                clip_file.write(data)
+        if clip_sha256.hexdigest() != manifest["sha256"]:
+            raise ValueError(f'"{clip_path}" assembled from "{manifest_path}" does not match its SHA-256')
+        temp_path.replace(clip_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return clip_path
@@ -7,21 +7,38 @@ target application and all of its dependencies.
 """
 
 import platform
-import shutil
 from pathlib import Path
-from typing import Union
+from typing import List, Union
 
 from typeguard import typechecked
 from balsa import get_logger
 
 from pyship import AppInfo, pyship_print, __application_name__, CLIP_EXT
 from pyship.uv_util import find_or_bootstrap_uv, copy_standalone_python, uv_pip_install
+from pyship.clip_prune import prune_clip
+from pyship.clip_manifest import create_clip_manifest
+from pyship.clip_archive import DEFAULT_COMPRESSION_LEVEL, write_clip_archive
+from pyship.clip_stream import StreamingClipArchiveWriter
+from pyship.clip_v2 import CLIP_FORMAT_ZIP, CLIP_FORMAT_V2, CLIP_FORMATS, DEFAULT_ZSTD_LEVEL, write_clip_v2_archive
 
 log = get_logger(__application_name__)
 
 
 @typechecked
-def create_clip(target_app_info: AppInfo, app_dir: Path, target_app_package_dist_dir: Path, cache_dir: Path, python_version: Union[str, None] = None) -> Path:
+def create_clip(
+    target_app_info: AppInfo,
+    app_dir: Path,
+    target_app_package_dist_dir: Path,
+    cache_dir: Path,
+    python_version: Union[str, None] = None,
+    prune_profile: Union[str, None] = None,
+    prune_include: Union[List[str], None] = None,
+    prune_exclude: Union[List[str], None] = None,
+    lock_path: Union[Path, None] = None,
+    wheelhouse_dir: Union[Path, None] = None,
+    manifest: bool = True,
+    clip_stream: Union[StreamingClipArchiveWriter, None] = None,
+) -> Path:
     """
     create clip (Complete Location Independent Python) environment
     clip is a stand-alone, relocatable directory that contains the entire python environment (including all libraries and the target app) needed to execute the target python application
@@ -30,26 +47,91 @@ def create_clip(target_app_info: AppInfo, app_dir: Path, target_app_package_dist
     :param target_app_package_dist_dir: target app module dist dir (as a package)
     :param cache_dir: cache dir
     :param python_version: Python version string (e.g. "3.12"). Defaults to running Python's major.minor version.
+    :param prune_profile: pruning profile ("minimal", "cli" or "gui") to strip unused payload with, or None
+    :param prune_include: globs of CLIP paths to keep even if pruned
+    :param prune_exclude: globs of CLIP paths to prune (in addition to the profile's)
+    :param lock_path: lock file to install the dependencies from, offline (requires wheelhouse_dir)
+    :param wheelhouse_dir: wheelhouse dir with the locked wheels
+    :param manifest: write the CLIP's clip_manifest.json (False if the CLIP is changed afterwards - see create_clip_manifest)
+    :param clip_stream: streaming .clip writer to feed the CLIP's files to as they are created (see create_clip_file)
     :return: path to the clip dir
     """
 
     clip_dir = create_base_clip(target_app_info, app_dir, cache_dir, python_version=python_version)
+    if clip_stream is not None:
+        clip_stream.feed()  # the base Python is compressed while uv installs the app
     assert isinstance(target_app_info.name, str)
-    install_target_app(target_app_info.name, clip_dir, target_app_package_dist_dir, cache_dir)
+    install_target_app(target_app_info.name, clip_dir, target_app_package_dist_dir, cache_dir, lock_path, wheelhouse_dir)
+    if prune_profile is not None or prune_exclude:
+        prune_clip(clip_dir, prune_profile, prune_include, prune_exclude)
+    if clip_stream is not None:
+        clip_stream.feed()
+    if manifest:
+        create_clip_manifest(clip_dir, target_app_info.name, str(target_app_info.version))
     return clip_dir
 
 
-def create_clip_file(clip_dir: Path) -> Path:
+def create_clip_file(
+    clip_dir: Path,
+    output_dir: Union[Path, None] = None,
+    compression_level: Union[int, None] = None,
+    clip_format: int = CLIP_FORMAT_ZIP,
+    dictionary: bool = True,
+    clip_stream: Union[StreamingClipArchiveWriter, None] = None,
+) -> Path:
     """
     Zip a CLIP directory into a ``.clip`` file (the update payload downloaded by pyshipupdate).
 
     :param clip_dir: CLIP directory to archive
-    :return: path to the created .clip file (next to the CLIP directory)
+    :param output_dir: directory to write the .clip file into (defaults to next to the CLIP directory)
+    :param compression_level: compression level - zlib's 1-9 for a zip, zstd's 1-22 for v2, or 0 to store every file (None for the format's default)
+    :param clip_format: CLIP_FORMAT_ZIP (readable by every pyshipupdate) or CLIP_FORMAT_V2 (zstd compressed)
+    :param dictionary: v2: compress small .py files with a trained zstd dictionary
+    :param clip_stream: the streaming writer the CLIP was fed to while it was built - finished rather than zipping the CLIP from scratch (zip format only)
+    :return: path to the created .clip file
     """
-    clip_dir_string = str(clip_dir)
-    archive_path = Path(shutil.make_archive(clip_dir_string, "zip", clip_dir_string))  # create a "zip" file of the clip dir
-    clip_path = archive_path.with_suffix("").with_suffix(f".{CLIP_EXT}")  # make_archive creates a .zip, but we want a .clip
-    return archive_path.rename(clip_path)
+    clip_path = Path(clip_dir.parent if output_dir is None else output_dir, f"{clip_dir.name}.{CLIP_EXT}")
+    if clip_stream is not None:
+        if clip_format != CLIP_FORMAT_ZIP or clip_stream.clip_dir != clip_dir or clip_stream.final_path != clip_path:
+            clip_stream.abort()
+            raise ValueError(f'streaming writer for "{clip_stream.final_path}" does not match "{clip_path}" (format {clip_format})')
+        archive_stats = clip_stream.finish()
+    elif clip_format == CLIP_FORMAT_ZIP:
+        # a zip file, with members compressed in parallel
+        archive_stats = write_clip_archive(clip_dir, clip_path, level=DEFAULT_COMPRESSION_LEVEL if compression_level is None else compression_level)
+    elif clip_format == CLIP_FORMAT_V2:
+        archive_stats = write_clip_v2_archive(clip_dir, clip_path, level=DEFAULT_ZSTD_LEVEL if compression_level is None else compression_level, dictionary=dictionary)
+    else:
+        raise ValueError(f"unknown .clip format {clip_format} (supported: {CLIP_FORMATS})")
+    pyship_print(f"{clip_path.name}: {archive_stats}")
+    pyship_print(archive_stats.class_report(top=8))
+    return clip_path
+
+
+@typechecked
+def resolve_python_version(python_version: Union[str, None] = None) -> str:
+    """
+    Resolve the CLIP's Python version.
+
+    :param python_version: Python version string (e.g. "3.12"), or None
+    :return: python_version, or the running Python's major.minor version if None
+    """
+    if python_version is None:
+        python_ver_tuple = platform.python_version_tuple()
+        python_version = f"{python_ver_tuple[0]}.{python_ver_tuple[1]}"
+    return python_version
+
+
+@typechecked
+def get_clip_dir(target_app_info: AppInfo, app_dir: Path) -> Path:
+    """
+    Get the CLIP directory for a target app version.
+
+    :param target_app_info: target app info
+    :param app_dir: app dir the CLIP is built in
+    :return: absolute path to the CLIP dir (``<app_dir>/<name>_<version>``)
+    """
+    return Path(app_dir, f"{target_app_info.name}_{str(target_app_info.version)}").absolute()
 
 
 @typechecked
@@ -64,28 +146,26 @@ def create_base_clip(target_app_info: AppInfo, app_dir: Path, cache_dir: Path, p
     :return absolute path to created clip
     """
 
-    if python_version is None:
-        python_ver_tuple = platform.python_version_tuple()
-        python_version = f"{python_ver_tuple[0]}.{python_ver_tuple[1]}"
-
-    clip_dir_name = f"{target_app_info.name}_{str(target_app_info.version)}"
-    clip_dir = Path(app_dir, clip_dir_name).absolute()
-    pyship_print(f'building clip {clip_dir_name} ("{clip_dir}")')
+    python_version = resolve_python_version(python_version)
+    clip_dir = get_clip_dir(target_app_info, app_dir)
+    pyship_print(f'building clip {clip_dir.name} ("{clip_dir}")')
 
     uv_path = find_or_bootstrap_uv(cache_dir)
-    copy_standalone_python(uv_path, python_version, clip_dir)
+    copy_standalone_python(uv_path, python_version, clip_dir, cache_dir)
 
     return clip_dir
 
 
 @typechecked
-def install_target_app(module_name: str, clip_dir: Path, target_app_package_dist_dir: Path, cache_dir: Path):
+def install_target_app(module_name: str, clip_dir: Path, target_app_package_dist_dir: Path, cache_dir: Path, lock_path: Union[Path, None] = None, wheelhouse_dir: Union[Path, None] = None):
     """
     install target app as a module (and its dependencies) into clip
     :param module_name: module name
     :param clip_dir: clip dir (a relocatable venv)
     :param target_app_package_dist_dir: target app module dist dir (as a package)
     :param cache_dir: cache dir
+    :param lock_path: lock file to install the dependencies from - with no index or network access (requires wheelhouse_dir)
+    :param wheelhouse_dir: wheelhouse dir with the locked wheels
     """
 
     log.info(f"installing {module_name}")
@@ -93,4 +173,9 @@ def install_target_app(module_name: str, clip_dir: Path, target_app_package_dist
     uv_path = find_or_bootstrap_uv(cache_dir)
     target_python = Path(clip_dir, "python.exe")
 
-    uv_pip_install(uv_path, target_python, [module_name], target_app_package_dist_dir.absolute(), upgrade=True, system=True)
+    if lock_path is None or wheelhouse_dir is None:
+        uv_pip_install(uv_path, target_python, [module_name], target_app_package_dist_dir.absolute(), upgrade=True, system=True)
+    else:
+        # the locked dependencies (hash checked), then the app itself
+        uv_pip_install(uv_path, target_python, [], wheelhouse_dir, upgrade=False, system=True, requirements_file=lock_path, offline=True)
+        uv_pip_install(uv_path, target_python, [module_name], target_app_package_dist_dir.absolute(), upgrade=False, system=True, offline=True, no_deps=True)
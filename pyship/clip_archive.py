@@ -0,0 +1,481 @@
+"""
+Parallel ``.clip`` archive writer.
+
+``shutil.make_archive`` deflates every CLIP file serially on one core. The
+:class:`ClipArchiveWriter` compresses members on a thread pool instead (zlib
+releases the GIL) and writes the compressed members, in the order they were
+added, followed by a standard zip central directory - so a ``.clip`` is still an
+ordinary zip file that pyshipupdate (or any zip tool) can extract. Zip64 records
+are written when sizes, offsets or the member count need them.
+
+Compressed members are spooled in memory, and to a temporary file if they are
+large. At most a few members per worker are in flight at any time.
+
+Deflating already-compressed files burns CPU for nothing, so each file is either
+stored or deflated (:func:`get_compression_method`): files with a
+:data:`STORED_SUFFIXES` extension are stored, and larger files are sampled - if a
+fast deflate of a few samples barely shrinks them (high entropy), they are
+stored too. The achieved ratio is reported per file class (extension).
+
+Archives are reproducible by default: members are added in sorted order, with a
+fixed timestamp (``SOURCE_DATE_EPOCH`` if set - see :func:`get_source_date_epoch`)
+and normalized permissions, and compressed independently of the number of
+workers - so identical CLIPs give byte-identical ``.clip`` files (with the same
+zlib/zstd version and settings).
+"""
+
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Deque, Dict, List, Tuple, Union
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__
+
+log = get_logger(__application_name__)
+
+DEFAULT_ARCHIVE_WORKERS = os.cpu_count() or 1
+DEFAULT_COMPRESSION_LEVEL = 6  # zlib's default, as make_archive uses
+READ_CHUNK_SIZE = 1024 * 1024
+SPOOL_MAX_SIZE = 8 * 1024 * 1024  # compressed members bigger than this are spooled to a temporary file
+IN_FLIGHT_PER_WORKER = 4
+
+#: extensions of files that are already compressed - always stored
+STORED_SUFFIXES = (
+    *(".zip", ".whl", ".egg", ".jar", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".zst", ".cab", ".msi"),  # archives
+    *(".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".icns"),  # images
+    *(".mp3", ".mp4", ".ogg", ".woff", ".woff2"),  # media and fonts
+)
+ENTROPY_SAMPLED_SIZE = 256 * 1024  # files from this size on are sampled before being deflated (smaller ones just are)
+ENTROPY_SAMPLE_SIZE = 16 * 1024
+ENTROPY_SAMPLES = 4  # spread evenly over the file
+STORE_RATIO = 0.9  # store files whose samples don't deflate below this ratio
+
+ZIP64_LIMIT = 0xFFFFFFFF  # sizes and offsets from this on need zip64 fields
+ZIP64_COUNT_LIMIT = 0xFFFF  # as do member counts from this on
+
+_STORED = 0
+_DEFLATED = 8
+_UTF8_FLAG = 0x0800
+_VERSION_NEEDED = 20  # deflate
+_VERSION_NEEDED_ZIP64 = 45
+_CREATE_SYSTEM = 0 if os.name == "nt" else 3  # as zipfile does
+_CREATE_SYSTEM_UNIX = 3  # reproducible archives are the same whatever the build OS
+
+SOURCE_DATE_EPOCH_ENV_VAR = "SOURCE_DATE_EPOCH"  # https://reproducible-builds.org/specs/source-date-epoch/
+DEFAULT_SOURCE_DATE_EPOCH = 315532800  # 1980-01-01T00:00:00Z, the earliest zip timestamp
+REPRODUCIBLE_FILE_MODE = 0o100644
+REPRODUCIBLE_DIRECTORY_MODE = 0o040755
+_DIRECTORY_ATTRIBUTE = 0x10  # MS-DOS directory attribute
+
+
+@dataclass
+class ClassStats:
+    """Files of one class (extension) written to an archive."""
+
+    files: int = 0
+    stored: int = 0  # files stored rather than deflated
+    bytes: int = 0  # uncompressed
+    compressed_bytes: int = 0
+
+    @property
+    def ratio(self) -> float:
+        return self.compressed_bytes / self.bytes if self.bytes > 0 else 1.0
+
+
+@dataclass
+class ArchiveStats:
+    """Members written to an archive and how long it took."""
+
+    files: int = 0
+    bytes: int = 0  # uncompressed
+    compressed_bytes: int = 0
+    seconds: float = 0.0
+    classes: Dict[str, ClassStats] = field(default_factory=dict)  # per file class (extension)
+
+    @property
+    def ratio(self) -> float:
+        return self.compressed_bytes / self.bytes if self.bytes > 0 else 1.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.files} files, {self.bytes / 1e6:.1f} MB -> {self.compressed_bytes / 1e6:.1f} MB ({self.ratio:.1%}) in {self.seconds:.2f}s ({self.bytes_per_second / 1e6:.1f} MB/s)"
+
+    def class_report(self, top: Union[int, None] = None) -> str:
+        """
+        :param top: number of file classes to report (the largest ones), or None for all
+        :return: the ratio achieved per file class, one class per line
+        """
+        classes = sorted(self.classes.items(), key=lambda item: item[1].bytes, reverse=True)[:top]
+        return "\n".join(
+            f"{file_class:>8} : {class_stats.files} files ({class_stats.stored} stored), {class_stats.bytes / 1e6:.1f} MB -> {class_stats.compressed_bytes / 1e6:.1f} MB ({class_stats.ratio:.1%})"
+            for file_class, class_stats in classes
+        )
+
+
+def get_file_class(arcname: str) -> str:
+    """
+    :param arcname: member name
+    :return: the member's file class - its extension (lower case), or "(none)"
+    """
+    suffix = os.path.splitext(arcname)[1].lower()
+    return suffix if len(suffix) > 0 else "(none)"
+
+
+@typechecked
+def get_compression_method(source_path: Path, size: int, level: int = DEFAULT_COMPRESSION_LEVEL, stored_suffixes: Tuple[str, ...] = STORED_SUFFIXES) -> int:
+    """
+    Decide whether to store or deflate a file.
+
+    :param source_path: file
+    :param size: file size
+    :param level: compression level (0 stores everything)
+    :param stored_suffixes: extensions of files to always store
+    :return: zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED
+    """
+    if level == 0 or size == 0 or source_path.suffix.lower() in stored_suffixes:
+        return _STORED
+    if size >= ENTROPY_SAMPLED_SIZE:
+        sample_size = 0
+        compressed_sample_size = 0
+        with open(source_path, "rb") as source_file:
+            for sample_index in range(ENTROPY_SAMPLES):
+                source_file.seek((size - ENTROPY_SAMPLE_SIZE) * sample_index // max(1, ENTROPY_SAMPLES - 1))
+                sample = source_file.read(ENTROPY_SAMPLE_SIZE)
+                sample_size += len(sample)
+                compressed_sample_size += len(zlib.compress(sample, 1))
+        if compressed_sample_size > STORE_RATIO * sample_size:
+            return _STORED
+    return _DEFLATED
+
+
+@dataclass
+class _Member:
+    """A compressed member, ready to be written."""
+
+    arcname: str
+    method: int
+    crc: int
+    size: int
+    compressed_size: int
+    mtime: float
+    mode: int  # st_mode
+    data: Union[BinaryIO, None]  # compressed data (None for directories)
+
+
+def get_source_date_epoch() -> int:
+    """
+    :return: the timestamp of reproducible archive members - SOURCE_DATE_EPOCH if set, otherwise DEFAULT_SOURCE_DATE_EPOCH
+    :raises ValueError: if SOURCE_DATE_EPOCH is not an integer
+    """
+    source_date_epoch = os.environ.get(SOURCE_DATE_EPOCH_ENV_VAR)
+    if source_date_epoch is None or len(source_date_epoch.strip()) == 0:
+        return DEFAULT_SOURCE_DATE_EPOCH
+    try:
+        return int(source_date_epoch)
+    except ValueError:
+        raise ValueError(f"{SOURCE_DATE_EPOCH_ENV_VAR} must be an integer ({source_date_epoch=})")
+
+
+def _dos_date_time(timestamp: float, utc: bool = False) -> Tuple[int, int]:
+    """:return: MS-DOS (date, time) of a timestamp, in local time like zipfile or UTC (clamped to the 1980-2107 range zip can represent)"""
+    year, month, day, hour, minute, second = (time.gmtime if utc else time.localtime)(timestamp)[:6]
+    if year < 1980:
+        year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    elif year > 2107:
+        year, month, day, hour, minute, second = 2107, 12, 31, 23, 59, 58
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+def _read_member(source_path: Path, compressor: Union[Any, None]) -> Tuple[BinaryIO, int, int]:
+    """Read a file into a spooled member, compressing it (with a compressor's compress() and flush()) or not. :return: member data, CRC and (uncompressed) size"""
+    data = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    crc = 0
+    size = 0
+    with open(source_path, "rb") as source_file:
+        while chunk := source_file.read(READ_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            data.write(chunk if compressor is None else compressor.compress(chunk))
+    if compressor is not None:
+        data.write(compressor.flush())
+    return data, crc, size
+
+
+class ClipArchiveWriter:
+    """
+    Writes a zip archive whose members are compressed in parallel. Members are written in the order they are added.
+
+    Use as a context manager, or call :meth:`close` to write the central directory.
+    """
+
+    compression_levels = range(0, 10)  # zlib's
+    compressed_method = _DEFLATED  # method of compressed members
+
+    @typechecked
+    def __init__(
+        self,
+        archive_path: Path,
+        workers: int = DEFAULT_ARCHIVE_WORKERS,
+        level: int = DEFAULT_COMPRESSION_LEVEL,
+        stored_suffixes: Tuple[str, ...] = STORED_SUFFIXES,
+        reproducible: bool = True,
+    ):
+        """
+        :param archive_path: archive to write (replaced if it exists)
+        :param workers: number of compression threads
+        :param level: compression level (zlib's 1-9, or 0 to store every file)
+        :param stored_suffixes: extensions of files that are always stored
+        :param reproducible: give every member the SOURCE_DATE_EPOCH timestamp and normalized permissions (False: the files' own)
+        """
+        if level not in self.compression_levels:
+            raise ValueError(f"compression level must be {self.compression_levels.start}-{self.compression_levels.stop - 1} ({level=})")
+        self.archive_path = archive_path
+        self.level = level
+        self.stored_suffixes = tuple(suffix.lower() for suffix in stored_suffixes)
+        self.reproducible = reproducible
+        self.timestamp = get_source_date_epoch() if reproducible else None
+        self.start = time.monotonic()
+        self.stats = ArchiveStats()
+        self._archive_file = open(archive_path, "wb")
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pyship_clip_archive")
+        self._max_in_flight = max(1, workers) * IN_FLIGHT_PER_WORKER
+        self._in_flight: Deque[Future] = deque()
+        self._central_directory: List[bytes] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add_file(self, source_path: Path, arcname: str):
+        """
+        Add a file (compressed on the thread pool).
+
+        :param source_path: file to add
+        :param arcname: member name (POSIX style path)
+        """
+        self._in_flight.append(self._executor.submit(self._compress_file, source_path, arcname))
+        self._write_completed()
+
+    def add_tree(self, source_dir: Path):
+        """
+        Add a directory's contents (like ``shutil.make_archive(..., "zip", source_dir)``), in sorted order - not the file system's.
+
+        :param source_dir: directory to add (member names are relative to it)
+        """
+        for dir_path, dir_names, file_names in os.walk(source_dir):
+            dir_names.sort()
+            relative_dir = Path(dir_path).relative_to(source_dir).as_posix()
+            prefix = "" if relative_dir == "." else f"{relative_dir}/"
+            if relative_dir != ".":
+                self.add_directory(Path(dir_path), relative_dir)
+            for file_name in sorted(file_names):
+                self.add_file(Path(dir_path, file_name), f"{prefix}{file_name}")
+
+    def add_directory(self, source_path: Path, arcname: str):
+        """
+        Add a directory entry.
+
+        :param source_path: directory (for its timestamp and permissions)
+        :param arcname: member name (POSIX style path - a trailing / is added)
+        """
+        stat = source_path.stat()
+        mtime, mode = (stat.st_mtime, stat.st_mode) if self.timestamp is None else (self.timestamp, REPRODUCIBLE_DIRECTORY_MODE)
+        member = _Member(f"{arcname.rstrip('/')}/", _STORED, 0, 0, 0, mtime, mode, None)
+        future: Future = Future()
+        future.set_result(member)
+        self._in_flight.append(future)
+        self._write_completed()
+
+    def _new_compressor(self, arcname: str, size: int) -> Any:
+        """:return: a compressor (with compress() and flush()) for a member"""
+        return zlib.compressobj(self.level, zlib.DEFLATED, -15)
+
+    def _compress_file(self, source_path: Path, arcname: str) -> _Member:
+        """Compress a file (on a worker thread) according to the compression policy, storing it if compression doesn't make it smaller."""
+        stat = source_path.stat()
+        compress = get_compression_method(source_path, stat.st_size, self.level, self.stored_suffixes) != _STORED
+        data, crc, size = _read_member(source_path, self._new_compressor(arcname, stat.st_size) if compress else None)
+        if compress and data.tell() >= size:
+            # incompressible - store it instead
+            data.close()
+            compress = False
+            data, crc, size = _read_member(source_path, None)
+        compressed_size = data.tell()
+        data.seek(0)
+        mtime, mode = (stat.st_mtime, stat.st_mode) if self.timestamp is None else (self.timestamp, REPRODUCIBLE_FILE_MODE)
+        return _Member(arcname, self.compressed_method if compress else _STORED, crc, size, compressed_size, mtime, mode, data)
+
+    def _write_completed(self):
+        # write members in order as soon as they are ready, and wait for the oldest if too many are in flight
+        while len(self._in_flight) > 0 and (self._in_flight[0].done() or len(self._in_flight) > self._max_in_flight):
+            self._write_member(self._in_flight.popleft().result())
+
+    def _write_member(self, member: _Member):
+        self._write_member_header(member)
+        if member.data is not None:
+            shutil.copyfileobj(member.data, self._archive_file, READ_CHUNK_SIZE)
+            member.data.close()
+            self.stats.files += 1
+            self.stats.bytes += member.size
+            self.stats.compressed_bytes += member.compressed_size
+            class_stats = self.stats.classes.setdefault(get_file_class(member.arcname), ClassStats())
+            class_stats.files += 1
+            class_stats.stored += int(member.method == _STORED)
+            class_stats.bytes += member.size
+            class_stats.compressed_bytes += member.compressed_size
+
+    def _write_member_header(self, member: _Member):
+        """Write a member's local file header (and keep its central directory entry for later)."""
+        offset = self._archive_file.tell()
+        dos_date, dos_time = _dos_date_time(member.mtime, utc=self.reproducible)
+        external_attributes = (member.mode & 0xFFFF) << 16 | (_DIRECTORY_ATTRIBUTE if member.data is None else 0)
+        name = member.arcname.encode("utf-8")
+        zip64_sizes = member.size >= ZIP64_LIMIT or member.compressed_size >= ZIP64_LIMIT
+        version_needed = _VERSION_NEEDED_ZIP64 if zip64_sizes or offset >= ZIP64_LIMIT else _VERSION_NEEDED
+
+        # local file header
+        if zip64_sizes:
+            local_extra = struct.pack("<HHQQ", 0x0001, 16, member.size, member.compressed_size)
+            local_size, local_compressed_size = 0xFFFFFFFF, 0xFFFFFFFF
+        else:
+            local_extra = b""
+            local_size, local_compressed_size = member.size, member.compressed_size
+        self._archive_file.write(
+            struct.pack(
+                "<4sHHHHHLLLHH",
+                b"PK\x03\x04",
+                version_needed,
+                _UTF8_FLAG,
+                member.method,
+                dos_time,
+                dos_date,
+                member.crc,
+                local_compressed_size,
+                local_size,
+                len(name),
+                len(local_extra),
+            )
+        )
+        self._archive_file.write(name)
+        self._archive_file.write(local_extra)
+
+        # central directory entry (fields that don't fit go in the zip64 extra field, in this order)
+        zip64_fields = []
+        central_size, central_compressed_size, central_offset = member.size, member.compressed_size, offset
+        if member.size >= ZIP64_LIMIT:
+            zip64_fields.append(member.size)
+            central_size = 0xFFFFFFFF
+        if member.compressed_size >= ZIP64_LIMIT:
+            zip64_fields.append(member.compressed_size)
+            central_compressed_size = 0xFFFFFFFF
+        if offset >= ZIP64_LIMIT:
+            zip64_fields.append(offset)
+            central_offset = 0xFFFFFFFF
+        central_extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields) if len(zip64_fields) > 0 else b""
+        self._central_directory.append(
+            struct.pack(
+                "<4sBBHHHHHLLLHHHHHLL",
+                b"PK\x01\x02",
+                version_needed,
+                _CREATE_SYSTEM_UNIX if self.reproducible else _CREATE_SYSTEM,
+                version_needed,
+                _UTF8_FLAG,
+                member.method,
+                dos_time,
+                dos_date,
+                member.crc,
+                central_compressed_size,
+                central_size,
+                len(name),
+                len(central_extra),
+                0,  # comment length
+                0,  # disk number
+                0,  # internal attributes
+                external_attributes,
+                central_offset,
+            )
+            + name
+            + central_extra
+        )
+
+    def close(self) -> ArchiveStats:
+        """
+        Write the remaining members and the central directory, and close the archive.
+
+        :return: archive statistics
+        """
+        try:
+            while len(self._in_flight) > 0:
+                self._write_member(self._in_flight.popleft().result())
+            self._write_end()
+        finally:
+            self._executor.shutdown()
+            self._archive_file.close()
+        self.stats.seconds = time.monotonic() - self.start
+        log.info(f'wrote "{self.archive_path}" ({self.level=}) : {self.stats}\n{self.stats.class_report()}')
+        return self.stats
+
+    def abort(self):
+        """Stop writing and remove the incomplete archive."""
+        for future in self._in_flight:
+            future.cancel()
+        self._executor.shutdown()
+        for future in self._in_flight:
+            if not future.cancelled() and future.exception() is None and (data := future.result().data) is not None:
+                data.close()
+        self._archive_file.close()
+        self.archive_path.unlink(missing_ok=True)
+
+    def _write_end(self):
+        """Write the central directory."""
+        central_directory_offset = self._archive_file.tell()
+        for entry in self._central_directory:
+            self._archive_file.write(entry)
+        central_directory_size = self._archive_file.tell() - central_directory_offset
+        count = len(self._central_directory)
+
+        if count >= ZIP64_COUNT_LIMIT or central_directory_size >= ZIP64_LIMIT or central_directory_offset >= ZIP64_LIMIT:
+            zip64_end_offset = self._archive_file.tell()
+            self._archive_file.write(
+                struct.pack("<4sQHHLLQQQQ", b"PK\x06\x06", 44, _VERSION_NEEDED_ZIP64, _VERSION_NEEDED_ZIP64, 0, 0, count, count, central_directory_size, central_directory_offset)
+            )
+            self._archive_file.write(struct.pack("<4sLQL", b"PK\x06\x07", 0, zip64_end_offset, 1))
+            count = min(count, 0xFFFF)
+            central_directory_size = min(central_directory_size, 0xFFFFFFFF)
+            central_directory_offset = min(central_directory_offset, 0xFFFFFFFF)
+        self._archive_file.write(struct.pack("<4sHHHHLLH", b"PK\x05\x06", 0, 0, count, count, central_directory_size, central_directory_offset, 0))
+
+
+@typechecked
+def write_clip_archive(clip_dir: Path, archive_path: Path, workers: int = DEFAULT_ARCHIVE_WORKERS, level: int = DEFAULT_COMPRESSION_LEVEL, reproducible: bool = True) -> ArchiveStats:
+    """
+    Zip a directory (like ``shutil.make_archive(..., "zip", clip_dir)``) with members compressed in parallel.
+
+    :param clip_dir: directory to archive (member names are relative to it)
+    :param archive_path: archive to write
+    :param workers: number of compression threads
+    :param level: zlib compression level (1-9, or 0 to store every file)
+    :param reproducible: give every member the SOURCE_DATE_EPOCH timestamp and normalized permissions
+    :return: archive statistics
+    """
+    with ClipArchiveWriter(archive_path, workers, level, reproducible=reproducible) as writer:
+        writer.add_tree(clip_dir)
+    return writer.stats
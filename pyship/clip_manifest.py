@@ -0,0 +1,164 @@
+"""
+CLIP file manifest - a machine-readable inventory of a CLIP.
+
+``clip_manifest.json`` (in the CLIP's root) lists every file of the CLIP with its
+POSIX style relative path, size, permission bits and SHA-256, plus its
+directories. It is written at
+the end of the CLIP build (the files are hashed in parallel), so it ends up in the
+``.clip``, and it is uploaded next to the ``.clip`` as
+``<app>_<version>_clip_manifest.json``. Integrity checks (:func:`verify_clip`),
+delta generation and size regression tracking can then use it instead of
+walking and hashing the tree again.
+"""
+
+import hashlib
+import json
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from semver import VersionInfo
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__
+from pyship.clip_archive import DEFAULT_ARCHIVE_WORKERS, READ_CHUNK_SIZE
+
+log = get_logger(__application_name__)
+
+CLIP_MANIFEST_NAME = "clip_manifest.json"
+CLIP_MANIFEST_FORMAT_VERSION = 1
+
+
+@dataclass(frozen=True)
+class ClipFileInfo:
+    """
+    a CLIP file's size, permission bits and SHA-256
+    """
+
+    size: int
+    mode: int
+    sha256: str
+
+
+@typechecked
+def get_clip_manifest_name(app_name: str, version: Union[VersionInfo, str]) -> str:
+    """
+    :param app_name: target app name
+    :param version: target app version
+    :return: file name (and S3 key) of the CLIP manifest uploaded next to the .clip
+    """
+    return f"{app_name}_{str(version)}_{CLIP_MANIFEST_NAME}"
+
+
+def _hash_file(file_path: str) -> ClipFileInfo:
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(file_path, "rb") as f:
+        mode = stat.S_IMODE(os.fstat(f.fileno()).st_mode)
+        while chunk := f.read(READ_CHUNK_SIZE):
+            sha256.update(chunk)
+            size += len(chunk)
+    return ClipFileInfo(size, mode, sha256.hexdigest())
+
+
+@typechecked
+def hash_clip_tree(root: Path, workers: int = DEFAULT_ARCHIVE_WORKERS) -> Tuple[Dict[str, ClipFileInfo], List[str]]:
+    """
+    Hash every file in a directory tree on a thread pool (hashlib releases the GIL).
+
+    :param root: directory tree (e.g. a CLIP)
+    :param workers: number of hashing threads
+    :return: POSIX style relative path to file info (sorted by path), and the (sorted) directories
+    """
+    paths = {}
+    directories = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        relative_dir = Path(dir_path).relative_to(root).as_posix()
+        prefix = "" if relative_dir == "." else f"{relative_dir}/"
+        directories.extend(f"{prefix}{dir_name}" for dir_name in dir_names)
+        paths.update({f"{prefix}{file_name}": os.path.join(dir_path, file_name) for file_name in file_names})
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        infos = dict(zip(paths, executor.map(_hash_file, paths.values())))
+    return dict(sorted(infos.items())), sorted(directories)
+
+
+@typechecked
+def create_clip_manifest(clip_dir: Path, app_name: str, version: Union[VersionInfo, str], workers: int = DEFAULT_ARCHIVE_WORKERS) -> Path:
+    """
+    Write the CLIP's manifest into the CLIP (call after the last change to the CLIP).
+
+    :param clip_dir: CLIP directory
+    :param app_name: target app name
+    :param version: target app version
+    :param workers: number of hashing threads
+    :return: manifest path
+    """
+    manifest_path = Path(clip_dir, CLIP_MANIFEST_NAME)
+    manifest_path.unlink(missing_ok=True)  # not in its own inventory
+    infos, directories = hash_clip_tree(clip_dir, workers)
+    manifest = {
+        "format": CLIP_MANIFEST_FORMAT_VERSION,
+        "app": app_name,
+        "version": str(version),
+        "size": sum(info.size for info in infos.values()),
+        "files": [{"path": path, "size": info.size, "mode": info.mode, "sha256": info.sha256} for path, info in infos.items()],
+        "directories": directories,
+    }
+    manifest_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    log.info(f"{manifest_path} : {len(infos)} files, {manifest['size']} bytes")
+    return manifest_path
+
+
+@typechecked
+def read_clip_manifest(manifest_path: Path) -> Dict[str, ClipFileInfo]:
+    """
+    :param manifest_path: CLIP manifest (in a CLIP or uploaded next to its .clip)
+    :return: POSIX style relative path to file info
+    """
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    if manifest.get("format") != CLIP_MANIFEST_FORMAT_VERSION:
+        raise ValueError(f'"{manifest_path}" is an unsupported CLIP manifest format ({manifest.get("format")})')
+    return {entry["path"]: ClipFileInfo(entry["size"], entry["mode"], entry["sha256"]) for entry in manifest["files"]}
+
+
+@typechecked
+def read_clip_inventory(clip_dir: Path, workers: int = DEFAULT_ARCHIVE_WORKERS) -> Tuple[Dict[str, ClipFileInfo], List[str]]:
+    """
+    Get a CLIP's files and directories from its manifest, without walking and hashing the tree - or, for a CLIP without a manifest
+    (e.g. one published before manifests), by hashing it.
+
+    :param clip_dir: CLIP directory
+    :param workers: number of hashing threads (if there is no manifest)
+    :return: POSIX style relative path to file info (sorted by path, including the manifest itself), and the (sorted) directories
+    :raises ValueError: if the manifest is malformed
+    """
+    manifest_path = Path(clip_dir, CLIP_MANIFEST_NAME)
+    if not manifest_path.exists():
+        log.info(f'"{clip_dir}" has no {CLIP_MANIFEST_NAME} - hashing it')
+        return hash_clip_tree(clip_dir, workers)
+    infos = read_clip_manifest(manifest_path)
+    infos[CLIP_MANIFEST_NAME] = _hash_file(str(manifest_path))
+    if (directories := json.loads(manifest_path.read_text(encoding="utf-8")).get("directories")) is None:
+        raise ValueError(f'"{manifest_path}" has no directories')
+    return dict(sorted(infos.items())), sorted(directories)
+
+
+@typechecked
+def verify_clip(clip_dir: Path, workers: int = DEFAULT_ARCHIVE_WORKERS) -> List[str]:
+    """
+    Check a CLIP against its manifest.
+
+    :param clip_dir: CLIP directory (with its clip_manifest.json)
+    :param workers: number of hashing threads
+    :return: paths that are missing, added or whose contents differ (empty if the CLIP is intact)
+    """
+    expected = read_clip_manifest(Path(clip_dir, CLIP_MANIFEST_NAME))
+    infos, _ = hash_clip_tree(clip_dir, workers)
+    del infos[CLIP_MANIFEST_NAME]
+    return sorted(
+        path for path in set(expected) | set(infos) if path not in expected or path not in infos or expected[path].sha256 != infos[path].sha256 or expected[path].size != infos[path].size
+    )
@@ -0,0 +1,251 @@
+"""
+Binary delta ``.clippatch`` files between published CLIP versions.
+
+Most releases only change the app itself - the Python runtime and most
+dependencies are byte-identical - yet every update downloads a full ``.clip``.
+A ``.clippatch`` (``<app>_<old version>_to_<new version>.clippatch``) turns an
+installed CLIP of the old version into the new one. It is a (reproducible) zip
+holding:
+
+- :data:`PATCH_MANIFEST_NAME`: every file of the new CLIP with its size, SHA-256
+  and how to get it - ``unchanged`` (from the old CLIP), ``full`` (in ``files/``)
+  or ``delta`` (a zstd "patch-from" frame in ``delta/`` that decompresses to the
+  new file with the old one as its dictionary) - plus the new CLIP's directories
+  and the old files that were removed
+- the added and changed files (or deltas)
+
+With ``clip_patches = N``, ``ship()`` creates patches from the N newest
+versions already in the bucket and uploads them next to the full ``.clip``.
+:func:`apply_clip_patch` is the reference implementation for updaters. Without
+zstd (see :mod:`pyship.clip_v2`) changed files are included in full.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Union
+
+from semver import VersionInfo
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, pyship_print, CLIP_EXT
+from pyship.cloud import PyShipCloud
+from pyship.clip_archive import ClipArchiveWriter, DEFAULT_ARCHIVE_WORKERS
+from pyship.clip_manifest import read_clip_inventory
+from pyship.clip_v2 import extract_clip, is_zstd_available, zstd, zstandard
+
+log = get_logger(__application_name__)
+
+CLIP_PATCH_EXT = "clippatch"
+PATCH_MANIFEST_NAME = "clippatch.json"
+PATCH_FORMAT_VERSION = 1
+DEFAULT_PATCH_LEVEL = 19  # patches are made once and downloaded many times
+
+_UNCHANGED = "unchanged"
+_FULL = "full"
+_DELTA = "delta"
+
+
+@typechecked
+def get_clip_patch_name(app_name: str, old_version: Union[VersionInfo, str], new_version: Union[VersionInfo, str]) -> str:
+    """
+    :param app_name: target app name
+    :param old_version: version the patch applies to
+    :param new_version: version the patch creates
+    :return: patch file name
+    """
+    return f"{app_name}_{str(old_version)}_to_{str(new_version)}.{CLIP_PATCH_EXT}"
+
+
+def _window_log(reference_size: int, size: int) -> int:
+    """zstd window log that reaches back over the whole reference ("patch-from")"""
+    return max(10, min(31, (reference_size + size).bit_length()))
+
+
+def _zstd_delta(reference: bytes, data: bytes, level: int) -> bytes:
+    """:return: a zstd frame of data, compressed with the reference as a raw content dictionary"""
+    if zstd is not None:
+        options = {
+            zstd.CompressionParameter.compression_level: level,
+            zstd.CompressionParameter.window_log: _window_log(len(reference), len(data)),
+            zstd.CompressionParameter.enable_long_distance_matching: 1,
+            zstd.CompressionParameter.checksum_flag: 1,
+        }
+        return zstd.compress(data, options=options, zstd_dict=zstd.ZstdDict(reference, is_raw=True))
+    reference_dict = zstandard.ZstdCompressionDict(reference, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    parameters = zstandard.ZstdCompressionParameters.from_level(
+        level, source_size=len(data), dict_size=len(reference), window_log=_window_log(len(reference), len(data)), enable_ldm=True, write_checksum=True
+    )
+    return zstandard.ZstdCompressor(dict_data=reference_dict, compression_params=parameters).compress(data)
+
+
+def _zstd_undelta(reference: bytes, delta: bytes) -> bytes:
+    """:return: the data a _zstd_delta frame was made from"""
+    if zstd is not None:
+        return zstd.decompress(delta, zstd_dict=zstd.ZstdDict(reference, is_raw=True), options={zstd.DecompressionParameter.window_log_max: 31})
+    reference_dict = zstandard.ZstdCompressionDict(reference, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    return zstandard.ZstdDecompressor(dict_data=reference_dict, max_window_size=2**31).decompress(delta)
+
+
+def _make_delta(reference_path: Path, file_path: Path, level: int) -> Union[bytes, None]:
+    """:return: a delta for a changed file, or None if including the (deflated) file is as small"""
+    data = file_path.read_bytes()
+    delta = _zstd_delta(reference_path.read_bytes(), data, level)
+    return delta if len(delta) < len(zlib.compress(data, 6)) else None
+
+
+@typechecked
+def create_clip_patch(
+    app_name: str,
+    old_version: Union[VersionInfo, str],
+    new_version: Union[VersionInfo, str],
+    old_clip_dir: Path,
+    new_clip_dir: Path,
+    output_dir: Path,
+    level: int = DEFAULT_PATCH_LEVEL,
+    workers: int = DEFAULT_ARCHIVE_WORKERS,
+) -> Path:
+    """
+    Create a patch that turns one CLIP version into another.
+
+    :param app_name: target app name
+    :param old_version: old CLIP's version
+    :param new_version: new CLIP's version
+    :param old_clip_dir: old CLIP (e.g. extracted from its .clip), with its clip_manifest.json if it has one
+    :param new_clip_dir: new CLIP, with its clip_manifest.json if it has one
+    :param output_dir: directory to write the patch into
+    :param level: zstd level of the deltas
+    :param workers: number of hashing/compression threads
+    :return: patch file
+    """
+    # the CLIPs' manifests say which files changed, so neither tree is walked and hashed again (unless a CLIP has no manifest)
+    old_hashes, _ = read_clip_inventory(old_clip_dir, workers)
+    new_hashes, directories = read_clip_inventory(new_clip_dir, workers)
+    changed = [path for path, info in new_hashes.items() if path in old_hashes and old_hashes[path].sha256 != info.sha256]
+
+    deltas: Dict[str, bytes] = {}
+    if is_zstd_available():
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            made = executor.map(lambda path: _make_delta(Path(old_clip_dir, path), Path(new_clip_dir, path), level), changed)
+            deltas = {path: delta for path, delta in zip(changed, made) if delta is not None}
+
+    files = {}
+    for path, info in new_hashes.items():
+        entry: Dict[str, Union[str, int]] = {"size": info.size, "sha256": info.sha256}
+        if path in old_hashes and old_hashes[path].sha256 == info.sha256:
+            entry["patch"] = _UNCHANGED
+        elif path in deltas:
+            entry["patch"] = _DELTA
+            entry["base_sha256"] = old_hashes[path].sha256
+        else:
+            entry["patch"] = _FULL
+        files[path] = entry
+    manifest = {
+        "format": PATCH_FORMAT_VERSION,
+        "app": app_name,
+        "from": str(old_version),
+        "to": str(new_version),
+        "directories": directories,
+        "removed": sorted(set(old_hashes) - set(new_hashes)),
+        "files": files,
+    }
+
+    patch_path = Path(output_dir, get_clip_patch_name(app_name, old_version, new_version))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manifest_path = Path(temp_dir, PATCH_MANIFEST_NAME)
+        manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        with ClipArchiveWriter(patch_path, workers) as writer:
+            writer.add_file(manifest_path, PATCH_MANIFEST_NAME)
+            for index, (path, entry) in enumerate(files.items()):
+                if entry["patch"] == _FULL:
+                    writer.add_file(Path(new_clip_dir, path), f"files/{path}")
+                elif entry["patch"] == _DELTA:
+                    delta_path = Path(temp_dir, f"{index}.zst")
+                    delta_path.write_bytes(deltas[path])
+                    writer.add_file(delta_path, f"delta/{path}.zst")
+
+    counts = {patch: sum(1 for entry in files.values() if entry["patch"] == patch) for patch in (_UNCHANGED, _FULL, _DELTA)}
+    log.info(f"{patch_path} : {counts}, {len(manifest['removed'])} removed")
+    pyship_print(f"{patch_path.name}: {patch_path.stat().st_size / 1e6:.2f} MB ({counts[_FULL]} full, {counts[_DELTA]} delta, {counts[_UNCHANGED]} unchanged files)")
+    return patch_path
+
+
+def _member_path(root: Path, path: str, patch_path: Path) -> Path:
+    """:return: a patch manifest path under a CLIP dir (like extract_clip, a downloaded patch can't reach outside it)"""
+    root_path = os.path.abspath(root)
+    member_path = os.path.abspath(os.path.join(root_path, path))
+    if not member_path.startswith(root_path + os.sep):
+        raise ValueError(f'"{patch_path}" path "{path}" is outside the CLIP')
+    return Path(member_path)
+
+
+@typechecked
+def apply_clip_patch(patch_path: Path, old_clip_dir: Path, new_clip_dir: Path) -> int:
+    """
+    Create a new CLIP from an old one and a patch, verifying every file.
+
+    :param patch_path: patch file
+    :param old_clip_dir: CLIP of the patch's old version
+    :param new_clip_dir: CLIP to create (must not exist)
+    :return: number of files
+    :raises ValueError: if the patch doesn't apply, is corrupt or has a path outside the CLIP
+    """
+    with zipfile.ZipFile(patch_path) as patch_file:
+        manifest = json.loads(patch_file.read(PATCH_MANIFEST_NAME))
+        if manifest["format"] != PATCH_FORMAT_VERSION:
+            raise ValueError(f'"{patch_path}" is a v{manifest["format"]} patch - pyship supports v{PATCH_FORMAT_VERSION}')
+        # every path is checked before anything is written
+        directories = [_member_path(new_clip_dir, directory, patch_path) for directory in manifest["directories"]]
+        files = [(path, entry, _member_path(old_clip_dir, path, patch_path), _member_path(new_clip_dir, path, patch_path)) for path, entry in manifest["files"].items()]
+        new_clip_dir.mkdir(parents=True)
+        for directory_path in directories:
+            directory_path.mkdir(parents=True, exist_ok=True)
+        for path, entry, old_path, new_path in files:
+            if entry["patch"] == _UNCHANGED:
+                data = old_path.read_bytes()
+            elif entry["patch"] == _FULL:
+                data = patch_file.read(f"files/{path}")
+            else:
+                reference = old_path.read_bytes()
+                if hashlib.sha256(reference).hexdigest() != entry["base_sha256"]:
+                    raise ValueError(f'"{old_path}" is not the version "{patch_path}" applies to')
+                data = _zstd_undelta(reference, patch_file.read(f"delta/{path}.zst"))
+            if len(data) != entry["size"] or hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                raise ValueError(f'"{path}" does not match "{patch_path}"')
+            new_path.parent.mkdir(parents=True, exist_ok=True)
+            new_path.write_bytes(data)
+    return len(files)
+
+
+@typechecked
+def create_clip_patches(cloud_access: PyShipCloud, new_version: VersionInfo, new_clip_dir: Path, output_dir: Path, count: int, level: int = DEFAULT_PATCH_LEVEL) -> List[Path]:
+    """
+    Create patches to a new CLIP from the newest older versions published in the cloud.
+
+    :param cloud_access: cloud access (its .clip files, or chunk manifests, are the old versions)
+    :param new_version: new CLIP's version
+    :param new_clip_dir: new CLIP
+    :param output_dir: directory to write the patches into
+    :param count: number of previous versions to create patches from
+    :param level: zstd level of the deltas
+    :return: patch files
+    """
+    app_name = cloud_access.app_name
+    old_versions = [version for version in cloud_access.get_clip_versions() if version < new_version][-count:] if count > 0 else []
+    patch_paths = []
+    for old_version in old_versions:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            old_clip_path = Path(temp_dir, f"{app_name}_{str(old_version)}.{CLIP_EXT}")
+            cloud_access.download_clip(old_clip_path)
+            old_clip_dir = Path(temp_dir, old_clip_path.stem)
+            extract_clip(old_clip_path, old_clip_dir)
+            patch_paths.append(create_clip_patch(app_name, old_version, new_version, old_clip_dir, new_clip_dir, output_dir, level))
+    if len(old_versions) == 0:
+        pyship_print(f"no earlier versions of {app_name} to create patches from")
+    return patch_paths
@@ -0,0 +1,174 @@
+"""
+CLIP pruning: strip payload the target app never uses from a built CLIP.
+
+A CLIP starts out as the full standalone CPython - the stdlib test suite, IDLE,
+tkinter, ensurepip, ``__pycache__`` left over from uv - plus every package's
+tests. Pruning runs after the target app is installed and removes paths that
+match a profile's exclude globs (see :data:`PRUNE_PROFILES`) and/or explicit
+exclude globs, except those that match an include glob.
+
+Globs are matched against POSIX style paths relative to the CLIP dir,
+case-insensitively (the CLIP is a Windows directory tree). ``*`` and ``?`` do not
+match ``/``, ``**`` matches any number of directories, and a glob without a
+``/`` matches a file or directory name at any depth. When a directory matches,
+everything in it is removed.
+"""
+
+import os
+import re
+import shutil
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Pattern, Tuple, Union
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, pyship_print
+
+log = get_logger(__application_name__)
+
+# no app needs these at run time
+_COMMON_EXCLUDES = (
+    "__pycache__",
+    "Lib/test",
+    "Lib/idlelib",
+    "Lib/turtledemo",
+    "Lib/ensurepip",
+    "Lib/tkinter/test",
+    "Lib/site-packages/**/tests",
+    "Lib/site-packages/**/docs",
+    "Include",
+    "libs",
+    "*.pdb",
+)
+_TKINTER_EXCLUDES = ("Lib/tkinter", "Lib/turtle.py", "tcl", "DLLs/_tkinter.pyd", "DLLs/tcl*.dll", "DLLs/tk*.dll")
+_DEVELOPMENT_EXCLUDES = ("Lib/lib2to3", "Lib/pydoc_data", "Lib/venv", "Lib/distutils", "Lib/site-packages/pip", "Lib/site-packages/pip-*.dist-info", "Scripts")
+
+#: pruning profile name to exclude globs
+PRUNE_PROFILES: Dict[str, Tuple[str, ...]] = {
+    "gui": _COMMON_EXCLUDES,  # keeps tkinter
+    "cli": _COMMON_EXCLUDES + _TKINTER_EXCLUDES,
+    "minimal": _COMMON_EXCLUDES + _TKINTER_EXCLUDES + _DEVELOPMENT_EXCLUDES,
+}
+
+
+@dataclass
+class PruneStats:
+    """Files and bytes removed from a CLIP."""
+
+    files: int = 0
+    bytes: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.files} files, {self.bytes / 1e6:.1f} MB"
+
+
+@lru_cache(maxsize=None)
+def _glob_regex(glob: str) -> Pattern:
+    """Translate a prune glob to a regex that matches a relative POSIX path."""
+    glob = glob.strip("/")
+    parts = []
+    index = 0
+    while index < len(glob):
+        if glob.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif glob.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif glob[index] == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif glob[index] == "?":
+            parts.append("[^/]")
+            index += 1
+        else:
+            parts.append(re.escape(glob[index]))
+            index += 1
+    prefix = "" if "/" in glob else "(?:.*/)?"  # a bare name matches at any depth
+    return re.compile(f"{prefix}{''.join(parts)}", re.IGNORECASE)
+
+
+def path_matches(relative_path: str, globs: Iterable[str]) -> bool:
+    """
+    Match a CLIP path against prune globs.
+
+    :param relative_path: POSIX style path relative to the CLIP dir
+    :param globs: prune globs
+    :return: True if the path, or any directory containing it, matches one of the globs
+    """
+    path_parts = relative_path.split("/")
+    candidates = ["/".join(path_parts[: count + 1]) for count in range(len(path_parts))]
+    return any(_glob_regex(glob).fullmatch(candidate) for glob in globs for candidate in candidates)
+
+
+@typechecked
+def get_prune_excludes(profile: Union[str, None] = None, exclude: Union[List[str], None] = None) -> List[str]:
+    """
+    Get the exclude globs for a pruning profile plus explicit exclude globs.
+
+    :param profile: pruning profile name (a key of PRUNE_PROFILES), or None for no profile
+    :param exclude: additional exclude globs
+    :return: exclude globs
+    """
+    excludes = []
+    if profile is not None:
+        if profile not in PRUNE_PROFILES:
+            raise ValueError(f'unknown prune profile "{profile}" (expected one of {", ".join(PRUNE_PROFILES)})')
+        excludes.extend(PRUNE_PROFILES[profile])
+    if exclude is not None:
+        excludes.extend(exclude)
+    return excludes
+
+
+@typechecked
+def prune_clip(clip_dir: Path, profile: Union[str, None] = None, include: Union[List[str], None] = None, exclude: Union[List[str], None] = None) -> PruneStats:
+    """
+    Remove unused payload from a CLIP.
+
+    :param clip_dir: CLIP dir
+    :param profile: pruning profile ("minimal", "cli" or "gui"), or None for only the explicit exclude globs
+    :param include: globs of paths to keep even if excluded
+    :param exclude: globs of paths to remove (in addition to the profile's)
+    :return: what was removed
+    """
+    excludes = get_prune_excludes(profile, exclude)
+    includes = [] if include is None else include
+    prune_stats = PruneStats()
+    if len(excludes) == 0:
+        return prune_stats
+
+    pruned_dirs = set()
+    for dir_path, dir_names, file_names in os.walk(clip_dir):
+        relative_dir = Path(dir_path).relative_to(clip_dir).as_posix()
+        relative_dir = "" if relative_dir == "." else f"{relative_dir}/"
+        for file_name in file_names:
+            relative_path = f"{relative_dir}{file_name}"
+            if path_matches(relative_path, excludes) and not path_matches(relative_path, includes):
+                file_path = Path(dir_path, file_name)
+                prune_stats.bytes += file_path.stat().st_size
+                prune_stats.files += 1
+                file_path.unlink()
+        for dir_name in list(dir_names):
+            if path_matches(f"{relative_dir}{dir_name}", excludes):
+                if len(includes) == 0:
+                    # nothing in it can be kept - remove it in one go rather than walking it
+                    dir_names.remove(dir_name)
+                    for file_path in Path(dir_path, dir_name).rglob("*"):
+                        if file_path.is_file():
+                            prune_stats.bytes += file_path.stat().st_size
+                            prune_stats.files += 1
+                    shutil.rmtree(Path(dir_path, dir_name))
+                else:
+                    pruned_dirs.add(Path(dir_path, dir_name))
+
+    # remove excluded directories left empty (everything in them was removed, unless included)
+    for pruned_dir in sorted(pruned_dirs, key=lambda p: len(p.parts), reverse=True):
+        if pruned_dir.is_dir() and not any(p.is_file() for p in pruned_dir.rglob("*")):
+            shutil.rmtree(pruned_dir)
+
+    log.info(f"pruned {clip_dir} ({profile=},{includes=},{excludes=}) : {prune_stats}")
+    pyship_print(f"pruned {prune_stats} from {clip_dir.name}")
+    return prune_stats
@@ -0,0 +1,153 @@
+"""
+Streaming ``.clip`` creation - compress CLIP files while the CLIP is being built.
+
+Normally the ``.clip`` is only started once the whole CLIP directory exists, and
+then every file is read back from disk. A :class:`StreamingClipArchiveWriter` is
+fed the CLIP directory as it is materialised - after the base Python is copied
+and after uv has installed the app and its dependencies - and starts compressing
+each new (or changed) file right away, on its thread pool, while the build goes
+on. When the CLIP is complete, :meth:`StreamingClipArchiveWriter.finish` adds the
+whole tree as usual: files that haven't changed since they were fed (same size
+and modification time) use their already compressed member, and only the rest
+(e.g. files the post-processing steps created) are compressed then.
+
+Members are still written in sorted order with the same compression policy, so
+the ``.clip`` is byte-identical to one written by
+:func:`pyship.clip_archive.write_clip_archive` from the finished CLIP. The price is
+memory (or temporary file space) for the compressed members until they are
+written. Only zip ``.clip`` files are streamed - the v2 dictionary is trained on
+the finished CLIP.
+"""
+
+import os
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Tuple
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__
+from pyship.clip_archive import ClipArchiveWriter, ArchiveStats, DEFAULT_ARCHIVE_WORKERS, DEFAULT_COMPRESSION_LEVEL, STORED_SUFFIXES
+
+log = get_logger(__application_name__)
+
+PARTIAL_SUFFIX = ".partial"  # the archive is written under this suffix until it is complete
+
+
+def _stat_key(source_path: Path) -> Tuple[int, int]:
+    stat = source_path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _discard(future: Future):
+    """Drop a compressed member that won't be written."""
+    if not future.cancel():
+        future.add_done_callback(lambda done: done.exception() is None and (data := done.result().data) is not None and data.close())
+
+
+class StreamingClipArchiveWriter(ClipArchiveWriter):
+    """
+    A :class:`ClipArchiveWriter` for a CLIP directory that is still being built. Call :meth:`feed` whenever files have
+    been added to the CLIP, then :meth:`finish` once it is complete (or :meth:`abort`).
+    """
+
+    @typechecked
+    def __init__(
+        self,
+        clip_dir: Path,
+        archive_path: Path,
+        workers: int = DEFAULT_ARCHIVE_WORKERS,
+        level: int = DEFAULT_COMPRESSION_LEVEL,
+        stored_suffixes: Tuple[str, ...] = STORED_SUFFIXES,
+        reproducible: bool = True,
+    ):
+        """
+        :param clip_dir: CLIP directory being built (member names are relative to it)
+        :param archive_path: archive to write (replaced when the archive is complete)
+        :param workers: number of compression threads
+        :param level: compression level (zlib's 1-9, or 0 to store every file)
+        :param stored_suffixes: extensions of files that are always stored
+        :param reproducible: give every member the SOURCE_DATE_EPOCH timestamp and normalized permissions (False: the files' own)
+        """
+        self.clip_dir = clip_dir
+        self.final_path = archive_path
+        super().__init__(Path(archive_path.parent, f"{archive_path.name}{PARTIAL_SUFFIX}"), workers, level, stored_suffixes, reproducible)
+        self.fed_files = 0  # compressions started by feed()
+        self.reused_files = 0  # members written from a fed compression
+        self._fed: Dict[str, Tuple[Tuple[int, int], Future]] = {}  # arcname to (size, mtime) when fed, and the compressed member
+
+    def feed(self) -> int:
+        """
+        Start compressing the CLIP's files that are new or have changed since the last feed.
+
+        :return: number of files whose compression was started
+        """
+        count = 0
+        for dir_path, _, file_names in os.walk(self.clip_dir):
+            relative_dir = Path(dir_path).relative_to(self.clip_dir).as_posix()
+            prefix = "" if relative_dir == "." else f"{relative_dir}/"
+            for file_name in file_names:
+                arcname = f"{prefix}{file_name}"
+                source_path = Path(dir_path, file_name)
+                key = _stat_key(source_path)
+                if (fed := self._fed.get(arcname)) is None or fed[0] != key:
+                    if fed is not None:
+                        _discard(fed[1])
+                    self._fed[arcname] = (key, self._executor.submit(self._compress_file, source_path, arcname))
+                    count += 1
+        self.fed_files += count
+        log.info(f"{self.clip_dir} : fed {count} files ({self.fed_files} in total)")
+        return count
+
+    def add_file(self, source_path: Path, arcname: str):
+        """
+        Add a file - the compressed member from :meth:`feed` if the file hasn't changed since, otherwise compressed now.
+
+        :param source_path: file to add
+        :param arcname: member name (POSIX style path)
+        """
+        fed = self._fed.pop(arcname, None)
+        if fed is not None and fed[0] == _stat_key(source_path):
+            self.reused_files += 1
+            self._in_flight.append(fed[1])
+            self._write_completed()
+        else:
+            if fed is not None:
+                _discard(fed[1])
+            super().add_file(source_path, arcname)
+
+    def finish(self) -> ArchiveStats:
+        """
+        Archive the complete CLIP and move the archive into place.
+
+        :return: archive statistics
+        """
+        try:
+            self.add_tree(self.clip_dir)
+        except Exception:
+            self.abort()
+            raise
+        return self.close()
+
+    def close(self) -> ArchiveStats:
+        """
+        Write the remaining members and the central directory, close the archive and move it into place.
+
+        :return: archive statistics
+        """
+        self._discard_fed()  # files removed from the CLIP after they were fed
+        stats = super().close()
+        self.archive_path.replace(self.final_path)
+        log.info(f'"{self.final_path}" : {self.reused_files} of {stats.files} members compressed while the CLIP was built')
+        return stats
+
+    def abort(self):
+        """Stop writing and remove the incomplete archive."""
+        self._discard_fed()
+        super().abort()
+
+    def _discard_fed(self):
+        for _, future in self._fed.values():
+            _discard(future)
+        self._fed.clear()
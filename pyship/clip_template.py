@@ -0,0 +1,146 @@
+"""
+Base CLIP template pool.
+
+Copying the whole uv-managed CPython install into every new CLIP means thousands
+of files and tens of MB of I/O per build. Instead, each standalone Python install
+is copied once into a "base CLIP" template in the pyship cache dir, already
+patched for CLIP use (``._pth`` file written, ``EXTERNALLY-MANAGED`` marker
+removed). New CLIPs are then materialised from the template with hardlinks.
+
+Hardlinked files share their contents with the template, so any file that is
+modified in place after materialisation must be a private copy instead. Those
+are the files under :data:`COPIED_PATHS` (``site-packages``, where uv installs and
+upgrades packages, ``Scripts``) plus the ``._pth`` and ``pyvenv.cfg`` files. The
+rest of the tree (stdlib, DLLs, executables) is only ever read, or replaced
+atomically (``.pyc`` writes), which breaks the link rather than writing through it.
+If the filesystem does not support hardlinks (e.g. the cache dir is on another
+volume), files are copied with :func:`pyship.copy_engine.copy_tree`.
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, pyship_print
+from pyship.copy_engine import CopyStats, copy_tree
+
+log = get_logger(__application_name__)
+
+CLIP_TEMPLATE_DIR_NAME = "clip_base"
+
+#: Template paths (relative, POSIX style) that are copied rather than hardlinked since they are modified after materialisation.
+COPIED_PATHS = ("Lib/site-packages", "Scripts")
+
+READY_MARKER_NAME = ".pyship_template_ready"  # in a template - written before the template is published, so a template with it is complete
+
+
+@typechecked
+def patch_standalone_python(python_dir: Path):
+    """
+    Patch a copy of a standalone Python install for use as a CLIP: remove the
+    EXTERNALLY-MANAGED marker (so uv pip install works) and write a ``._pth`` file.
+    :param python_dir: directory containing the standalone Python (python.exe at its root)
+    """
+
+    # Remove EXTERNALLY-MANAGED marker so uv pip install works
+    externally_managed = Path(python_dir, "Lib", "EXTERNALLY-MANAGED")
+    if externally_managed.exists():
+        externally_managed.unlink()
+        log.info(f"removed {externally_managed}")
+
+    # Create a ._pth file so Python uses isolated path mode.
+    # This takes precedence over pyvenv.cfg during initialization, setting up
+    # sys.path directly and skipping site.py (which would emit RuntimeWarnings
+    # about unexpected sys.prefix when pyvenv.cfg is present).
+    pth_pattern = "python3*._pth"
+    existing_pth = list(python_dir.glob(pth_pattern))
+    if not existing_pth:
+        python_dlls = list(python_dir.glob("python3*.dll"))
+        python_dlls = [d for d in python_dlls if d.stem != "python3"]  # exclude python3.dll
+        if python_dlls:
+            pth_name = python_dlls[0].stem + "._pth"
+        else:
+            pth_name = "python._pth"
+        pth_path = Path(python_dir, pth_name)
+        pth_path.write_text(".\nLib\nLib\\site-packages\nDLLs\n", encoding="utf-8")
+        log.info(f"created {pth_path}")
+
+
+@typechecked
+def write_pyvenv_cfg(python_dir: Path):
+    """
+    Create pyvenv.cfg so the interpreter can locate its environment.
+    Python 3.14+ may fail with "failed to locate pyvenv.cfg" (exit 106) without this.
+    Its ``home`` is the directory's absolute path, so it is written per CLIP (never templated).
+    :param python_dir: CLIP directory
+    """
+    pyvenv_cfg = Path(python_dir, "pyvenv.cfg")
+    if not pyvenv_cfg.exists():
+        abs_dest = str(python_dir.resolve())
+        pyvenv_cfg.write_text(f"home = {abs_dest}\ninclude-system-site-packages = false\n", encoding="utf-8")
+        log.info(f"created {pyvenv_cfg}")
+
+
+@typechecked
+def get_clip_template(python_install_dir: Path, cache_dir: Path) -> Path:
+    """
+    Get the base CLIP template for a standalone Python install, creating it on first use.
+    Templates are keyed on the install's directory name, which uv makes unique per full Python version and platform.
+    :param python_install_dir: uv-managed standalone Python install dir (e.g. ``cpython-3.12.8-windows-x86_64-none``)
+    :param cache_dir: pyship cache dir
+    :return: template dir
+    """
+    template_root = Path(cache_dir, CLIP_TEMPLATE_DIR_NAME)
+    template_dir = Path(template_root, python_install_dir.name)
+    if Path(template_dir, READY_MARKER_NAME).exists():
+        log.info(f"using base CLIP template {template_dir}")
+        return template_dir
+
+    pyship_print(f'creating base CLIP template from "{python_install_dir}"')
+    template_root.mkdir(parents=True, exist_ok=True)
+    # Built under a unique name, complete with its ready marker, then renamed into place - the rename alone publishes
+    # it, so a template dir with the marker is always complete and never deleted (other builds may be linking from it).
+    staging_dir = Path(tempfile.mkdtemp(prefix=f"{python_install_dir.name}_", dir=template_root))
+    copy_tree(python_install_dir, staging_dir)
+    patch_standalone_python(staging_dir)
+    Path(staging_dir, READY_MARKER_NAME).touch()
+    try:
+        staging_dir.rename(template_dir)
+    except OSError:
+        if not Path(template_dir, READY_MARKER_NAME).exists():
+            # left by an older pyship or an interrupted build - moved aside first, so only this process deletes it
+            retired_dir = Path(tempfile.mkdtemp(prefix=f"{python_install_dir.name}_retired_", dir=template_root))
+            try:
+                template_dir.rename(Path(retired_dir, template_dir.name))
+            except OSError:
+                pass  # another process moved it aside
+            shutil.rmtree(retired_dir, ignore_errors=True)
+            try:
+                staging_dir.rename(template_dir)
+            except OSError:
+                pass  # another process published it first
+        if staging_dir.exists():
+            shutil.rmtree(staging_dir, ignore_errors=True)  # another process completed the same template first
+    return template_dir
+
+
+def _is_copied(relative_path: str) -> bool:
+    if relative_path.endswith("._pth") or relative_path == "pyvenv.cfg":
+        return True
+    return any(relative_path == copied or relative_path.startswith(f"{copied}/") for copied in COPIED_PATHS)
+
+
+@typechecked
+def materialise_clip_template(template_dir: Path, dest_dir: Path) -> CopyStats:
+    """
+    Materialise a CLIP from a template: hardlink read-only files, copy the ones modified later.
+    :param template_dir: base CLIP template dir
+    :param dest_dir: destination CLIP dir (replaced if it exists)
+    :return: copy statistics
+    """
+    if dest_dir.exists():
+        shutil.rmtree(dest_dir)
+    return copy_tree(template_dir, dest_dir, link_filter=lambda relative_path: not _is_copied(relative_path), exclude=lambda relative_path: relative_path == READY_MARKER_NAME)
@@ -2,44 +2,139 @@
 AWS S3 upload/download of shipped artifacts (installer and .clip files).
 """
 
+import json
+import random
+import tempfile
+import time
+from datetime import datetime
 from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
 
+from semver import VersionInfo
 from typeguard import typechecked
 from awsimple import S3Access
+from botocore.exceptions import ClientError
+from pyshipupdate import version_from_clip_zip
+from balsa import get_logger
+
+from pyship import __application_name__, pyship_print, PyshipReleaseIndexConflict
+from pyship.s3_upload import S3Uploader, DEFAULT_PART_SIZE, DEFAULT_UPLOAD_CONCURRENCY
+from pyship.upload_scheduler import PRIORITY_CLIP
+from pyship.chunk_store import read_chunk_manifest, get_chunk_key, get_missing_chunks, assemble_clip, get_chunk_manifest_name, version_from_chunk_manifest, CHUNK_PREFIX
+from pyship.release_index import get_release_index_name, add_release, remove_releases, parse_release_index, get_latest_release
+
+log = get_logger(__application_name__)
 
 name_string = "name"
 version_string = "version"
 timestamp_string = "ts"  # timestamp is sometimes a keyword
 
+RELEASE_INDEX_ATTEMPTS = 5  # conditional put attempts when other publishers update the release index at the same time
+MAX_DELETE_KEYS = 1000  # S3 DeleteObjects maximum
+
 
 class PyShipCloud:
     """
-    AWS cloud access
+    AWS cloud access - its uploader's threads run until it is closed (use it as a context manager, or call close())
     """
 
-    def __init__(self, app_name: str, s3_access: S3Access):
+    def __init__(
+        self,
+        app_name: str,
+        s3_access: S3Access,
+        part_size: int = DEFAULT_PART_SIZE,
+        concurrency: int = DEFAULT_UPLOAD_CONCURRENCY,
+        upload_state_dir: Union[Path, None] = None,
+        bytes_per_second: Union[int, None] = None,
+    ):
         """
         AWS cloud access
         :param app_name: target application name
         :param s3_access: instance of an S3Access class from awsimple
+        :param part_size: multipart upload part size
+        :param concurrency: most parts uploaded at the same time (adapted to the observed throughput)
+        :param upload_state_dir: directory for resumable upload state (None for uploads that start over after a failure)
+        :param bytes_per_second: bandwidth cap over all uploads (None for no cap)
         """
         self.app_name = app_name
         self.s3_access = s3_access
+        # one client, bucket check and upload scheduler (priorities, bandwidth cap and concurrency) for all uploads
+        self.uploader = S3Uploader(s3_access, part_size, concurrency, upload_state_dir, bytes_per_second)
+
+    def close(self):
+        """stop the uploader's threads"""
+        self.uploader.close()
+
+    def __enter__(self) -> "PyShipCloud":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     @typechecked
-    def upload(self, file_path: Path) -> str:
+    def upload(self, file_path: Path, force: bool = False, resume: bool = True) -> str:
         """
-        upload a file to S3 and return the URL
+        upload a file to S3 (unless S3 already has it) and return the URL
         :param file_path: path to the file to be uploaded
+        :param force: upload even if the S3 object already has the file's contents
+        :param resume: resume an interrupted upload of the file (only the missing parts are uploaded) rather than start it over
         :return: URL of uploaded file
         """
         s3_key = file_path.name
-        # Note: AWS S3 now defaults to BucketOwnerEnforced which disables ACLs
-        # Use bucket policies or pre-signed URLs for access control instead
-        self.s3_access.create_bucket()
-        self.s3_access.upload(file_path, s3_key)
+        upload_stats = self.uploader.upload_file(file_path, s3_key, force=force, resume=resume)
+        pyship_print(f"{'skipped' if upload_stats.skipped else 'uploaded'} {upload_stats}")
         return self.s3_access.get_s3_object_url(s3_key)
 
+    @typechecked
+    def upload_chunked(self, clip_path: Path, manifest_path: Path) -> str:
+        """
+        upload a .clip file as chunks (skipping the chunks already in S3) and its chunk manifest
+        :param clip_path: .clip file
+        :param manifest_path: the .clip file's chunk manifest (see pyship.chunk_store)
+        :return: URL of the uploaded chunk manifest
+        """
+        self.uploader.ensure_bucket()
+        existing_keys = set(self.s3_access.keys(CHUNK_PREFIX))  # one listing rather than a request per chunk
+        extra_args = {"ACL": "public-read"} if self.s3_access.public_readable else {}
+        scheduler = self.uploader.scheduler
+        uploaded_bytes = 0
+        offset = 0
+        futures = []
+        chunks = read_chunk_manifest(manifest_path)["chunks"]
+
+        def put_chunk(s3_key: str, chunk_offset: int, chunk_size: int):
+            # read when the chunk is uploaded, so only the chunks being uploaded are in memory rather than every missing one
+            with open(clip_path, "rb") as clip_file:
+                clip_file.seek(chunk_offset)
+                chunk_bytes = clip_file.read(chunk_size)
+            self.s3_access.client.put_object(Bucket=self.s3_access.bucket_name, Key=s3_key, Body=scheduler.throttled(chunk_bytes), **extra_args)
+            scheduler.record(len(chunk_bytes))
+
+        for chunk in chunks:
+            s3_key = get_chunk_key(chunk["sha256"])
+            if s3_key not in existing_keys:
+                futures.append(scheduler.submit(PRIORITY_CLIP, put_chunk, s3_key, offset, chunk["size"]))
+                existing_keys.add(s3_key)
+                uploaded_bytes += chunk["size"]
+            offset += chunk["size"]
+        for future in futures:
+            future.result()
+        uploaded_count = len(futures)
+        pyship_print(f"uploaded {uploaded_count} of {len(chunks)} chunks of {clip_path.name} ({uploaded_bytes} of {offset} bytes)")
+        return self.upload(manifest_path)
+
+    @typechecked
+    def get_clip_versions(self) -> List[VersionInfo]:
+        """
+        get the versions of the app whose .clip files (or chunk manifests) have been uploaded
+        :return: sorted list of versions (empty if the bucket doesn't exist)
+        """
+        versions = set()
+        for s3_key in self.list_objects(f"{self.app_name}_"):  # one paginated listing, without the chunks
+            if (version := version_from_clip_zip(self.app_name, s3_key)) is not None or (version := version_from_chunk_manifest(self.app_name, s3_key)) is not None:
+                versions.add(version)
+        return sorted(versions)
+
     @typechecked
     def download(self, file_path: Path):
         """
@@ -47,3 +142,135 @@ class PyShipCloud:
         :param file_path: destination path; its name is used as the S3 key
         """
         self.s3_access.download_cached(file_path.name, file_path)
+
+    @typechecked
+    def download_clip(self, clip_path: Path, chunks_dir: Union[Path, None] = None):
+        """
+        download a .clip file, reassembling it from its chunks if it was uploaded chunked
+        :param clip_path: destination path; its name is the .clip file's S3 key
+        :param chunks_dir: directory to keep chunks in (only missing chunks are downloaded); None for a temporary directory
+        """
+        app_version = clip_path.stem[len(self.app_name) + 1 :]
+        manifest_name = get_chunk_manifest_name(self.app_name, app_version)
+        if not self.s3_access.object_exists(manifest_name):
+            self.download(clip_path)
+        else:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                chunks_dir = Path(temp_dir) if chunks_dir is None else chunks_dir
+                chunks_dir.mkdir(parents=True, exist_ok=True)
+                manifest_path = Path(chunks_dir, manifest_name)
+                self.s3_access.download(manifest_name, manifest_path)
+                missing = get_missing_chunks(manifest_path, chunks_dir)
+                for sha256 in missing:
+                    response = self.s3_access.client.get_object(Bucket=self.s3_access.bucket_name, Key=get_chunk_key(sha256))
+                    Path(chunks_dir, sha256).write_bytes(response["Body"].read())
+                log.info(f"downloaded {len(missing)} chunks of {clip_path.name}")
+                assemble_clip(manifest_path, chunks_dir, clip_path)
+
+    @typechecked
+    def get_release_index(self) -> Tuple[Union[dict, None], Union[str, None]]:
+        """
+        get the app's release index (one GET)
+        :return: release index and its ETag, or None and None if nothing has been released
+        """
+        try:
+            response = self.s3_access.client.get_object(Bucket=self.s3_access.bucket_name, Key=get_release_index_name(self.app_name))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "NoSuchBucket", "404"):
+                return None, None
+            raise
+        return parse_release_index(response["Body"].read(), self.app_name), response["ETag"]
+
+    @typechecked
+    def get_latest_release(self) -> Union[dict, None]:
+        """
+        get the latest release from the app's release index
+        :return: the latest release's release index entry (see pyship.release_index), or None if nothing has been released
+        """
+        return get_latest_release(self.get_release_index()[0])
+
+    def _update_release_index(self, update: Callable[[Union[dict, None]], Union[dict, None]], attempts: int) -> str:
+        s3_key = get_release_index_name(self.app_name)
+        extra_args = {"ACL": "public-read"} if self.s3_access.public_readable else {}
+        for attempt in range(attempts):
+            release_index, etag = self.get_release_index()
+            if (updated_release_index := update(release_index)) is None:
+                break  # nothing to change
+            # only written if the index is still the one just read (or still doesn't exist)
+            condition = {"IfNoneMatch": "*"} if etag is None else {"IfMatch": etag}
+            body = json.dumps(updated_release_index, indent=2).encode()
+            try:
+                self.s3_access.client.put_object(Bucket=self.s3_access.bucket_name, Key=s3_key, Body=body, ContentType="application/json", CacheControl="no-cache", **condition, **extra_args)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ("PreconditionFailed", "ConditionalRequestConflict"):
+                    raise
+                log.info(f"{s3_key} changed while being updated (attempt {attempt + 1} of {attempts})")
+                time.sleep(random.uniform(0.0, 0.1 * 2**attempt))
+            else:
+                break
+        else:
+            raise PyshipReleaseIndexConflict(f"could not update {s3_key} in {attempts} attempts")
+        return self.s3_access.get_s3_object_url(s3_key)
+
+    @typechecked
+    def publish_release(self, release: dict, attempts: int = RELEASE_INDEX_ATTEMPTS) -> str:
+        """
+        add a release to the app's release index, with a conditional put so releases published at the same time aren't lost
+        :param release: release index entry (see pyship.release_index.create_release) - its files must already be uploaded
+        :param attempts: attempts before giving up when the release index keeps being changed by other publishers
+        :return: URL of the release index
+        """
+        self.uploader.ensure_bucket()
+        url = self._update_release_index(lambda release_index: add_release(release_index, self.app_name, release), attempts)
+        pyship_print(f"published {release['version']} in {get_release_index_name(self.app_name)}")
+        return url
+
+    @typechecked
+    def unpublish_releases(self, versions: List[VersionInfo], attempts: int = RELEASE_INDEX_ATTEMPTS) -> str:
+        """
+        remove releases from the app's release index (if they are in it), with a conditional put
+        :param versions: versions to remove
+        :param attempts: attempts before giving up when the release index keeps being changed by other publishers
+        :return: URL of the release index
+        """
+        removed = {str(version) for version in versions}
+
+        def update(release_index: Union[dict, None]) -> Union[dict, None]:
+            if release_index is None or not any(release["version"] in removed for release in release_index["releases"]):
+                return None
+            return remove_releases(release_index, self.app_name, versions)
+
+        return self._update_release_index(update, attempts)
+
+    @typechecked
+    def list_objects(self, prefix: str = "") -> Dict[str, Tuple[int, datetime]]:
+        """
+        list the bucket's objects with one (paginated) listing - unlike S3Access.dir(), without a request per object
+        :param prefix: only list the objects whose keys start with this prefix
+        :return: S3 key to size and last modified time (empty if the bucket doesn't exist)
+        """
+        objects = {}
+        try:
+            for page in self.s3_access.client.get_paginator("list_objects_v2").paginate(Bucket=self.s3_access.bucket_name, Prefix=prefix):
+                for content in page.get("Contents", []):
+                    objects[content["Key"]] = (content["Size"], content["LastModified"])
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "NoSuchBucket":
+                raise
+        return objects
+
+    @typechecked
+    def delete(self, s3_keys: List[str]) -> List[str]:
+        """
+        delete objects, in batches of up to MAX_DELETE_KEYS per request
+        :param s3_keys: S3 keys to delete
+        :return: the keys that could not be deleted
+        """
+        failed = []
+        for start in range(0, len(s3_keys), MAX_DELETE_KEYS):
+            batch = s3_keys[start : start + MAX_DELETE_KEYS]
+            response = self.s3_access.client.delete_objects(Bucket=self.s3_access.bucket_name, Delete={"Objects": [{"Key": s3_key} for s3_key in batch], "Quiet": True})
+            for error in response.get("Errors", []):
+                log.warning(f"could not delete {error['Key']} : {error.get('Code')} {error.get('Message')}")
+                failed.append(error["Key"])
+        return failed
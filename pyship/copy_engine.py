@@ -0,0 +1,192 @@
+"""
+Parallel, size-aware file copy engine.
+
+:func:`copy_tree` walks the source tree with :func:`os.scandir`, hands batches of
+small files to a thread pool (per-file overhead dominates for them, and the
+copies overlap well even on network storage), and streams large files in the
+kernel with ``copy_file_range``/``sendfile`` where the OS offers them. It can
+also hardlink files instead of copying them (see :mod:`pyship.clip_template`).
+Every copy reports its throughput as :class:`CopyStats`.
+"""
+
+import errno
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Tuple, Union
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__
+
+log = get_logger(__application_name__)
+
+LARGE_FILE_SIZE = 1024 * 1024  # files at least this big are streamed on their own, smaller ones are batched
+SMALL_FILE_BATCH_COUNT = 64  # maximum number of small files per batch
+SMALL_FILE_BATCH_SIZE = 4 * 1024 * 1024  # maximum bytes per batch of small files
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_COPY_WORKERS = min(32, 4 * (os.cpu_count() or 1))  # copies are I/O bound
+
+
+@dataclass
+class CopyStats:
+    """Files and bytes copied (or hardlinked) and how long it took."""
+
+    files: int = 0
+    bytes: int = 0
+    linked: int = 0  # files hardlinked rather than copied (included in files and bytes)
+    seconds: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.files} files ({self.linked} hardlinked), {self.bytes / 1e6:.1f} MB in {self.seconds:.2f}s ({self.files_per_second:.0f} files/s, {self.bytes_per_second / 1e6:.1f} MB/s)"
+
+
+def _stream(source_fd: int, dest_fd: int, size: int):
+    """Copy size bytes between file descriptors in the kernel if possible, otherwise via a user-space buffer."""
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size and (count := os.copy_file_range(source_fd, dest_fd, min(STREAM_CHUNK_SIZE, size - copied))) > 0:
+                copied += count
+        except OSError:
+            pass  # e.g. cross-filesystem on older kernels - fall through with what's left
+    if copied < size and hasattr(os, "sendfile"):
+        try:
+            while copied < size and (count := os.sendfile(dest_fd, source_fd, copied, min(STREAM_CHUNK_SIZE, size - copied))) > 0:
+                copied += count
+        except OSError:
+            pass
+    if copied < size:
+        os.lseek(source_fd, copied, os.SEEK_SET)
+        os.lseek(dest_fd, copied, os.SEEK_SET)
+        while chunk := os.read(source_fd, STREAM_CHUNK_SIZE):
+            os.write(dest_fd, chunk)
+
+
+@typechecked
+def copy_file(source: Path, dest: Path) -> int:
+    """
+    Copy a file with its metadata (like shutil.copy2), streaming large files in the kernel where possible.
+    :param source: source file
+    :param dest: destination file (its directory must exist)
+    :return: number of bytes copied
+    """
+    size = source.stat().st_size
+    if size < LARGE_FILE_SIZE:
+        shutil.copy2(source, dest)
+    else:
+        with open(source, "rb") as source_file, open(dest, "wb") as dest_file:
+            _stream(source_file.fileno(), dest_file.fileno(), size)
+        shutil.copystat(source, dest)
+    return size
+
+
+# errors that mean the filesystem can't hardlink (rather than that one file can't be linked)
+_NO_LINK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.EMLINK}
+_NO_LINK_WINERRORS = {1, 17, 50, 1142}  # ERROR_INVALID_FUNCTION, ERROR_NOT_SAME_DEVICE, ERROR_NOT_SUPPORTED, ERROR_TOO_MANY_LINKS
+
+
+class _Linker:
+    """Hardlinks files for which a filter says so, falling back to copying (for good) once the filesystem turns out not to support it."""
+
+    def __init__(self, link_filter: Union[Callable[[str], bool], None]):
+        self.link_filter = link_filter
+        self.can_link = link_filter is not None
+        self.lock = threading.Lock()
+
+    def copy_or_link(self, source: Path, dest: Path, relative_path: str) -> bool:
+        """:return: True if hardlinked, False if copied"""
+        if self.can_link and self.link_filter is not None and self.link_filter(relative_path):
+            try:
+                os.link(source, dest)
+                return True
+            except OSError as e:
+                if e.errno in _NO_LINK_ERRNOS or getattr(e, "winerror", None) in _NO_LINK_WINERRORS:
+                    with self.lock:
+                        if self.can_link:
+                            log.info(f"hardlinks unavailable ({e}) - copying")
+                            self.can_link = False
+                else:
+                    log.info(f'could not hardlink "{source}" ({e}) - copying it')  # e.g. it already exists or is locked
+        copy_file(source, dest)
+        return False
+
+
+def _scan(source_dir: Path, dest_dir: Path) -> List[Tuple[Path, Path, str, int]]:
+    """Walk source_dir with os.scandir, creating the destination directories. :return: list of (source, dest, relative path, size)"""
+    files = []
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    stack = [(source_dir, dest_dir, "")]
+    while stack:
+        source, dest, relative = stack.pop()
+        with os.scandir(source) as entries:
+            for entry in entries:
+                entry_relative = f"{relative}{entry.name}"
+                if entry.is_dir():
+                    Path(dest, entry.name).mkdir(exist_ok=True)
+                    stack.append((Path(entry.path), Path(dest, entry.name), f"{entry_relative}/"))
+                else:
+                    files.append((Path(entry.path), Path(dest, entry.name), entry_relative, entry.stat().st_size))
+    return files
+
+
+@typechecked
+def copy_tree(
+    source_dir: Path, dest_dir: Path, link_filter: Union[Callable[[str], bool], None] = None, workers: int = DEFAULT_COPY_WORKERS, exclude: Union[Callable[[str], bool], None] = None
+) -> CopyStats:
+    """
+    Copy a directory tree (like shutil.copytree) on a thread pool.
+    :param source_dir: source directory
+    :param dest_dir: destination directory (created if needed; existing files are overwritten)
+    :param link_filter: called with each file's POSIX style path relative to source_dir - hardlink the file instead of copying it if True
+    :param workers: number of copy threads
+    :param exclude: called with each file's POSIX style path relative to source_dir - skip the file if True
+    :return: copy statistics
+    """
+    start = time.monotonic()
+    files = [file for file in _scan(source_dir, dest_dir) if exclude is None or not exclude(file[2])]
+    linker = _Linker(link_filter)
+
+    def copy_batch(batch: List[Tuple[Path, Path, str, int]]) -> int:
+        linked_count = 0
+        for source, dest, relative_path, _ in batch:
+            if linker.copy_or_link(source, dest, relative_path):
+                linked_count += 1
+        return linked_count
+
+    # one task per large file, small files in batches
+    batches: List[List[Tuple[Path, Path, str, int]]] = []
+    batch: List[Tuple[Path, Path, str, int]] = []
+    batch_size = 0
+    for file in files:
+        if file[3] >= LARGE_FILE_SIZE:
+            batches.append([file])
+        else:
+            batch.append(file)
+            batch_size += file[3]
+            if len(batch) >= SMALL_FILE_BATCH_COUNT or batch_size >= SMALL_FILE_BATCH_SIZE:
+                batches.append(batch)
+                batch = []
+                batch_size = 0
+    if len(batch) > 0:
+        batches.append(batch)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pyship_copy") as executor:
+        linked_count = sum(executor.map(copy_batch, batches))
+
+    stats = CopyStats(files=len(files), bytes=sum(file[3] for file in files), linked=linked_count, seconds=time.monotonic() - start)
+    log.info(f'copied "{source_dir}" to "{dest_dir}" : {stats}')
+    return stats
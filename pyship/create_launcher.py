@@ -6,7 +6,6 @@ the newest CLIP and runs the standalone Python launcher script, plus a
 diagnostic ``.bat`` (console output always visible) and the app icon.
 """
 
-import shutil
 from pathlib import Path
 from typing import Union
 
@@ -21,6 +20,7 @@ from pyship import __application_name__ as pyship_application_name
 from pyship.launcher import application_name as launcher_application_name
 from pyship.launcher import calculate_metadata, load_metadata, store_metadata
 from pyship.launcher_stub import compile_launcher_stub
+from pyship.copy_engine import copy_file
 
 log = get_logger(launcher_application_name)
 
@@ -131,7 +131,7 @@ def create_pyship_launcher(target_app_info: AppInfo, app_path_output: Path) -> U
             # 2. Copy the standalone launcher script alongside the stub
             standalone_source = Path(launcher_module_dir, "launcher.py")
             standalone_dest = Path(launcher_dir, f"{target_app_info.name}_launcher.py")
-            shutil.copy2(str(standalone_source), str(standalone_dest))
+            copy_file(standalone_source, standalone_dest)
             log.info(f"copied launcher script to {standalone_dest}")
 
             # 3. Generate diagnostic .bat launcher (always uses python.exe for console output)
@@ -142,7 +142,7 @@ def create_pyship_launcher(target_app_info: AppInfo, app_path_output: Path) -> U
             # 4. Copy the icon alongside
             if icon_path.exists():
                 icon_dest = Path(launcher_dir, f"{target_app_info.name}.ico")
-                shutil.copy2(str(icon_path), str(icon_dest))
+                copy_file(icon_path, icon_dest)
                 log.info(f"copied icon to {icon_dest}")
 
             # 5. Store metadata for cache invalidation
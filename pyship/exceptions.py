@@ -59,3 +59,31 @@ class PyshipSigningUnavailable(PyshipException):
 
     def __init__(self, message: str = ""):
         super().__init__(self.__class__.__name__, message)
+
+
+class PyshipWheelhouseMissing(PyshipException):
+    """An offline build needs a lock file and its wheelhouse (``pyship lock``, ``pyship wheelhouse``)."""
+
+    def __init__(self, message: str = ""):
+        super().__init__(self.__class__.__name__, message)
+
+
+class PyshipTraceFailed(PyshipException):
+    """A traced run of the target app did not produce a trace."""
+
+    def __init__(self, message: str = ""):
+        super().__init__(self.__class__.__name__, message)
+
+
+class PyshipZstdUnavailable(PyshipException):
+    """The .clip v2 format needs zstd (Python 3.14+ or the zstandard package)."""
+
+    def __init__(self, message: str = ""):
+        super().__init__(self.__class__.__name__, message)
+
+
+class PyshipReleaseIndexConflict(PyshipException):
+    """The release index kept being changed by another publisher while it was being updated."""
+
+    def __init__(self, message: str = ""):
+        super().__init__(self.__class__.__name__, message)
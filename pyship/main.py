@@ -2,7 +2,10 @@
 CLI entry point for ``python -m pyship``.
 
 Reads configuration from ``[tool.pyship]`` in the current directory's
-``pyproject.toml``, applies CLI argument overrides, then runs :meth:`PyShip.ship`.
+``pyproject.toml``, applies CLI argument overrides, then runs :meth:`PyShip.ship` (or
+:meth:`PyShip.trace`, :meth:`PyShip.lock`, :meth:`PyShip.wheelhouse`,
+:meth:`PyShip.prune_releases` or :meth:`PyShip.publish` for ``pyship trace``, ``pyship lock``,
+``pyship wheelhouse``, ``pyship prune-releases`` and ``pyship publish``).
 """
 
 import sys
@@ -23,8 +26,34 @@ _TOML_KEYS = [
     ("certificate_subject", "certificate_subject"),
     ("certificate_auto_select", "certificate_auto_select"),
     ("code_sign", "code_sign"),
+    ("build_cache", "build_cache"),
+    ("prune", "prune"),
+    ("prune_include", "prune_include"),
+    ("prune_exclude", "prune_exclude"),
+    ("trace_file", "trace_file"),
+    ("lock_file", "lock_file"),
+    ("offline", "offline"),
+    ("compile_bytecode", "compile_bytecode"),
+    ("drop_sources", "drop_sources"),
+    ("zip_packages", "zip_packages"),
+    ("zip_exclude", "zip_exclude"),
+    ("clip_format", "clip_format"),
+    ("clip_compression_level", "clip_compression_level"),
+    ("clip_dictionary", "clip_dictionary"),
+    ("clip_patches", "clip_patches"),
+    ("clip_chunks", "clip_chunks"),
+    ("clip_streaming", "clip_streaming"),
+    ("upload_part_size", "upload_part_size"),
+    ("upload_concurrency", "upload_concurrency"),
+    ("upload_bandwidth", "upload_bandwidth"),
+    ("keep_versions", "keep_versions"),
+    ("keep_days", "keep_days"),
+    ("pinned_versions", "pinned_versions"),
 ]
 
+#: PyShip attributes that are paths (pyproject.toml has them as strings)
+_PATH_ATTRS = ("trace_file", "lock_file")
+
 
 def read_pyship_config() -> dict:
     """
@@ -42,7 +71,7 @@ def read_pyship_config() -> dict:
         pyship_section = pyproject.get("tool", {}).get("pyship", {})
         for toml_key, attr_name in _TOML_KEYS:
             if toml_key in pyship_section:
-                config[attr_name] = pyship_section[toml_key]
+                config[attr_name] = Path(pyship_section[toml_key]) if attr_name in _PATH_ATTRS else pyship_section[toml_key]
     return config
 
 
@@ -84,6 +113,57 @@ def main():
         pyship.certificate_auto_select = True
     if args.code_sign:
         pyship.code_sign = True
+    if args.no_build_cache:
+        pyship.build_cache = False
+    if args.prune is not None:
+        pyship.prune = None if args.prune == "none" else args.prune
+    if args.compile_bytecode:
+        pyship.compile_bytecode = True
+    if args.offline:
+        pyship.offline = True
+    if args.zip_packages:
+        pyship.zip_packages = True
+    if args.trace_file is not None:
+        pyship.trace_file = Path(args.trace_file)
+    if args.clip_format is not None:
+        pyship.clip_format = args.clip_format
+    if args.clip_patches is not None:
+        pyship.clip_patches = args.clip_patches
+    if args.clip_compression_level is not None:
+        pyship.clip_compression_level = args.clip_compression_level
+    if args.clip_chunks:
+        pyship.clip_chunks = True
+    if args.clip_streaming:
+        pyship.clip_streaming = True
+    if args.upload_part_size is not None:
+        pyship.upload_part_size = args.upload_part_size
+    if args.upload_concurrency is not None:
+        pyship.upload_concurrency = args.upload_concurrency
+    if args.upload_bandwidth is not None:
+        pyship.upload_bandwidth = args.upload_bandwidth
+    if args.keep_versions is not None:
+        pyship.keep_versions = args.keep_versions
+    if args.keep_days is not None:
+        pyship.keep_days = args.keep_days
+    if args.pin is not None:
+        pyship.pinned_versions = [*(pyship.pinned_versions or []), *args.pin]
+
+    if args.command == "trace":
+        pyship.trace(None if args.smoke_script is None else Path(args.smoke_script))
+        return
+    if args.command == "lock":
+        pyship.lock()
+        return
+    if args.command == "wheelhouse":
+        pyship.wheelhouse()
+        return
+    if args.command == "prune-releases":
+        pyship.prune_releases(args.dry_run)
+        return
+    if args.command == "publish":
+        pyship.publish(args.resume)
+        return
+
     installer_path = pyship.ship()
     if installer_path is None and not is_ci():
         # No installer produced (e.g. RDP session blocked signing) - fail so build
@@ -3,9 +3,12 @@ PyShip orchestrator — the ``ship()`` method drives the full build-sign-package
 """
 
 import os
+import shutil
+import subprocess
+from functools import partial
 from pathlib import Path
 from datetime import datetime
-from typing import Union
+from typing import Callable, Dict, List, Tuple, Union
 
 import platformdirs
 from attr import attrs
@@ -14,10 +17,30 @@ from awsimple import S3Access
 from balsa import get_logger
 from semver import VersionInfo
 
+import pyship
+
 from pyship import __application_name__ as pyship_application_name
 from pyship import __author__ as pyship_author
 from pyship import __version__ as pyship_version
-from pyship import run_nsis, create_clip, create_pyship_launcher, pyship_print, APP_DIR_NAME, create_clip_file, get_app_info, PyShipCloud
+from pyship import run_nsis, create_clip, create_pyship_launcher, pyship_print, APP_DIR_NAME, CLIP_EXT, create_clip_file, get_app_info, get_app_info_py_project, PyShipCloud, AppInfo
+from pyship import get_icon, get_clip_dir, resolve_python_version, find_or_bootstrap_uv, uv_version
+from pyship.trace import TRACE_FILE_NAME, run_trace, shake_clip
+from pyship.bytecode import compile_clip
+from pyship.site_packages_zip import pack_site_packages
+from pyship.clip_archive import DEFAULT_COMPRESSION_LEVEL, get_source_date_epoch
+from pyship.clip_v2 import CLIP_FORMAT_ZIP
+from pyship.clip_stream import StreamingClipArchiveWriter
+from pyship.s3_upload import DEFAULT_PART_SIZE, DEFAULT_UPLOAD_CONCURRENCY, UPLOAD_STATE_DIR_NAME
+from pyship.clip_patch import CLIP_PATCH_EXT, create_clip_patches
+from pyship.chunk_store import create_chunk_manifest, get_chunk_manifest_name
+from pyship.clip_manifest import CLIP_MANIFEST_NAME, create_clip_manifest, get_clip_manifest_name
+from pyship.release_index import create_release
+from pyship.retention import RetentionReport, DEFAULT_KEEP_VERSIONS, DEFAULT_KEEP_DAYS, prune_cloud, prune_local, version_from_artifact_name
+from pyship.build_cache import BuildCache, get_build_key, get_source_hash, hash_files
+from pyship.installer import get_installers_dir, installer_file_name
+from pyship.launcher import calculate_metadata, get_file_sha256
+from pyship.wheelhouse import LOCK_FILE_NAME, get_requirements_hash, uv_lock, build_wheelhouse, require_wheelhouse
+from pyship.stages import Stage, run_stages
 from pyship.signing import SigningConfig, sign_if_configured, check_signing_available, is_rdp_session, RDP_SIGNING_BLOCKED_MESSAGE, DEFAULT_TIMESTAMP_URL
 from pyship.msix import create_msix
 from pyship import PyshipNoAppName
@@ -53,9 +76,34 @@ class PyShip:
     name: Union[str, None] = None  # optional target application name (overrides pyproject.toml)
     upload: bool = True
     public_readable: bool = False
+    upload_part_size: int = DEFAULT_PART_SIZE  # multipart upload part size (bytes)
+    upload_concurrency: int = DEFAULT_UPLOAD_CONCURRENCY  # most parts uploaded at the same time (adapted to the observed throughput)
+    upload_bandwidth: Union[int, None] = None  # upload bandwidth cap in bytes per second, over all uploads (None: no cap)
 
     # --- build ---
     python_version: Union[str, None] = None  # e.g. "3.12"; defaults to running Python's major.minor
+    lock_file: Union[Path, None] = None  # dependency lock file; defaults to pyship-lock.txt in project_dir
+    offline: bool = False  # install the CLIP's dependencies from the lock file's wheelhouse - no index or network access
+
+    # --- CLIP pruning ---
+    prune: Union[str, None] = None  # pruning profile: "minimal", "cli" or "gui" (None: no profile)
+    prune_include: Union[List[str], None] = None  # globs of CLIP paths to keep even if pruned
+    prune_exclude: Union[List[str], None] = None  # globs of CLIP paths to prune (in addition to the profile's)
+    trace_file: Union[Path, None] = None  # trace from `pyship trace` - keep only the traced CLIP files (plus prune_include)
+
+    # --- bytecode ---
+    compile_bytecode: bool = False  # compile the CLIP to unchecked-hash .pyc files at build time
+    drop_sources: Union[List[str], None] = None  # globs of CLIP paths whose .py sources are replaced by sourceless .pyc files (implies compile_bytecode)
+    zip_packages: bool = False  # pack pure-Python distributions from site-packages into a zip on sys.path
+    zip_exclude: Union[List[str], None] = None  # distribution name globs to leave in site-packages
+
+    # --- .clip ---
+    clip_format: int = CLIP_FORMAT_ZIP  # 1: zip (readable by every pyshipupdate), 2: zstd compressed v2 container
+    clip_compression_level: Union[int, None] = None  # zlib (1-9) or zstd (1-22) level, 0 stores every file; None for the format's default
+    clip_dictionary: bool = True  # v2: compress small .py files with a zstd dictionary trained on the CLIP
+    clip_patches: int = 0  # create (and upload) .clippatch deltas from this many previously uploaded versions
+    clip_chunks: bool = False  # upload the .clip as content-defined chunks (stored once per bucket) and a chunk manifest instead of the whole file
+    clip_streaming: bool = False  # zip format: compress the CLIP's files for the .clip while the CLIP is being built
 
     # --- code signing (common) ---
     code_sign: bool = False  # master switch: True → sign executables; failure aborts ship()
@@ -79,6 +127,14 @@ class PyShip:
     store_assets_dir: Union[Path, None] = None  # directory with Store logo PNGs
     makeappx_path: Union[Path, None] = None  # explicit makeappx.exe; auto-discovered if None
 
+    # --- build cache ---
+    build_cache: bool = True  # restore unchanged stage outputs (wheel, launcher, CLIP, installers, .clip) from the pyship cache
+
+    # --- retention (pyship prune-releases) ---
+    keep_versions: int = DEFAULT_KEEP_VERSIONS  # keep this many of the newest published versions
+    keep_days: int = DEFAULT_KEEP_DAYS  # and the versions published in the last keep_days days
+    pinned_versions: Union[List[str], None] = None  # and these versions
+
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
@@ -123,6 +179,347 @@ class PyShip:
         if not sign_if_configured(file_path, signing_config):
             raise PyshipSigningUnavailable(f"failed to sign {file_path}")
 
+    def _lock_path(self) -> Path:
+        """
+        The dependency lock file written by :meth:`lock`.
+        """
+        return Path(self.project_dir, LOCK_FILE_NAME) if self.lock_file is None else self.lock_file
+
+    def _connect_cloud(self, target_app_info: AppInfo) -> Union[PyShipCloud, None]:
+        """
+        Create the cloud access used for uploads from the configured profile or id/secret.
+
+        :param target_app_info: target app info (the bucket name defaults to one derived from the app name and author)
+        :return: cloud access, or None if no (or incomplete) cloud credentials were provided
+        """
+        if self.cloud_profile is None and self.cloud_id is None:
+            pyship_print("no cloud access provided - will not attempt upload")
+            return None
+
+        assert isinstance(target_app_info.name, str)
+        assert isinstance(target_app_info.author, str)
+        bucket = create_bucket_name(target_app_info.name, target_app_info.author) if self.cloud_bucket is None else self.cloud_bucket
+
+        if self.cloud_profile is None:
+            if self.cloud_secret is None:
+                log.error(f"{self.cloud_secret=}")
+                return None
+            s3_access = S3Access(bucket, aws_access_key_id=self.cloud_id, aws_secret_access_key=self.cloud_secret)
+        else:
+            s3_access = S3Access(bucket, profile_name=self.cloud_profile)
+
+        s3_access.public_readable = self.public_readable
+        # interrupted multipart uploads are resumed by the next ship() or publish()
+        upload_state_dir = Path(platformdirs.user_cache_dir(pyship_application_name, pyship_author), UPLOAD_STATE_DIR_NAME)
+        self.cloud_access = PyShipCloud(target_app_info.name, s3_access, self.upload_part_size, self.upload_concurrency, upload_state_dir, self.upload_bandwidth)
+        return self.cloud_access
+
+    def _signing_identity(self) -> dict:
+        """
+        The signing settings that determine a signed file's contents (never the password/PIN), for build cache keys.
+        """
+        if not self.code_sign:
+            return {}
+        return {
+            "pfx_sha256": None if self.pfx_path is None or not self.pfx_path.exists() else hash_files([self.pfx_path], self.pfx_path.parent),
+            "certificate_sha1": self.certificate_sha1,
+            "certificate_subject": self.certificate_subject,
+            "certificate_auto_select": self.certificate_auto_select,
+            "timestamp_url": self.timestamp_url,
+        }
+
+    def _stage_keys(self, target_app_info: AppInfo, cache_dir: Path, source_hash: str) -> Dict[str, str]:
+        """
+        Build cache keys for the cached stages.
+
+        :param target_app_info: target app info
+        :param cache_dir: pyship cache dir
+        :param source_hash: hash of the target app's project files and sources
+        :return: dict of stage name to build cache key (stages without a key are not cached)
+        """
+        assert isinstance(target_app_info.name, str)
+        assert isinstance(target_app_info.author, str)
+        assert isinstance(target_app_info.version, VersionInfo)
+        assert isinstance(target_app_info.ui, str)
+        signing = self._signing_identity()
+        launcher_source_dir = Path(Path(pyship.__file__).parent, "launcher")
+        icon_path = get_icon(target_app_info, log.info)
+        launcher_metadata = calculate_metadata(target_app_info.name, target_app_info.author, target_app_info.version, launcher_source_dir, icon_path, target_app_info.ui)
+
+        keys = {"launcher": get_build_key(stage="launcher", metadata=launcher_metadata, signing=signing)}
+
+        # the CLIP's key has its dependencies - the lock, and for online builds (which resolve against the index) what would be installed now
+        uv_path = find_or_bootstrap_uv(cache_dir)
+        python_version = resolve_python_version(self.python_version)
+        lock_path = self._lock_path()
+        dependencies = {"lock": get_file_sha256(lock_path) if lock_path.exists() else None}
+        if not self.offline:
+            try:
+                dependencies["resolved"] = get_requirements_hash(uv_path, self.project_dir, python_version)
+            except (OSError, subprocess.CalledProcessError) as e:
+                log.warning(f"could not resolve the dependencies ({e}) - the CLIP and the stages that use it are not cached")
+                return keys
+
+        keys["clip"] = get_build_key(
+            stage="clip",
+            source=source_hash,
+            python_version=python_version,
+            uv_version=uv_version(uv_path),
+            prune=[self.prune, self.prune_include, self.prune_exclude],
+            trace=None if self.trace_file is None else hash_files([self.trace_file], self.trace_file.parent),
+            dependencies=dependencies,
+            bytecode=[self.compile_bytecode, self.drop_sources],
+            zip_packages=[self.zip_packages, self.zip_exclude],
+        )
+        # the .clip's members are stamped with SOURCE_DATE_EPOCH
+        keys["clip_file"] = get_build_key(
+            stage="clip_file", clip=keys["clip"], compression_level=self.clip_compression_level, format=[self.clip_format, self.clip_dictionary], source_date_epoch=get_source_date_epoch()
+        )
+        keys["installer"] = get_build_key(stage="installer", launcher=keys["launcher"], clip=keys["clip"], signing=signing, output=installer_file_name(target_app_info.name, "exe"))
+        store_assets = None
+        if self.store_assets_dir is not None and self.store_assets_dir.is_dir():
+            store_assets = hash_files([p for p in self.store_assets_dir.iterdir() if p.is_file()], self.store_assets_dir)
+        keys["msix"] = get_build_key(stage="msix", installer=keys["installer"], publisher=self.msix_publisher, store_assets=store_assets, signing=signing)
+        return keys
+
+    def _ship_stages(
+        self, target_app_info: AppInfo, app_dir: Path, cache_dir: Path, signing_config: SigningConfig, build_cache: Union[BuildCache, None] = None, source_hash: Union[str, None] = None
+    ) -> List[Stage]:
+        """
+        Build the stage graph that :meth:`ship` runs.
+
+        The launcher and the CLIP are built concurrently. NSIS needs both, MSIX runs after
+        NSIS (it adds files to app_dir that must not end up in the installer), and the
+        ``.clip`` is written outside app_dir so it can be zipped while NSIS and MSIX run.
+        With cloud access, each artifact (installer, ``.clip``, CLIP manifest, patches and
+        MSIX) has its own upload stage, so they are uploaded concurrently and the upload
+        takes about as long as the largest artifact's rather than the sum of them all. The
+        version is then added to the app's release index (see :mod:`pyship.release_index`).
+
+        :param target_app_info: target app info
+        :param app_dir: app dir (the launcher and CLIP are built here)
+        :param cache_dir: pyship cache dir
+        :param signing_config: resolved signing configuration
+        :param build_cache: build cache to restore unchanged stage outputs from (None to always build)
+        :param source_hash: hash of the target app's project files and sources (required with build_cache)
+        :return: list of stages
+        """
+        assert isinstance(target_app_info.name, str)
+        assert isinstance(target_app_info.version, VersionInfo)
+        target_app_name = target_app_info.name
+        target_app_version = target_app_info.version
+        clip_dir = get_clip_dir(target_app_info, app_dir)
+        installers_dir = get_installers_dir(target_app_info.project_dir)
+
+        lock_path = self._lock_path() if self.offline else None
+        wheelhouse_dir = require_wheelhouse(cache_dir, self._lock_path()) if self.offline else None
+
+        keys = {}
+        if build_cache is not None:
+            assert source_hash is not None
+            keys = self._stage_keys(target_app_info, cache_dir, source_hash)
+
+        def cached(stage_name: str, outputs: List[Path], function: Callable[..., Union[Path, None]]) -> Callable[..., Union[Path, None]]:
+            return function if build_cache is None or stage_name not in keys else build_cache.cached(stage_name, keys[stage_name], outputs, function)
+
+        cloud_access = None
+        if not self.upload:
+            pyship_print("no upload requested")
+        else:
+            cloud_access = self._connect_cloud(target_app_info)
+
+        # The .clip (zipped CLIP update payload) is only needed for upload. It is written to app_dir's
+        # parent - inside app_dir it would get packed into the NSIS installer (doubling its size) and the MSIX.
+        clip_file_path = Path(app_dir.parent, f"{clip_dir.name}.{CLIP_EXT}")
+        stream_clip_file = cloud_access is not None and self.clip_streaming
+        if stream_clip_file and self.clip_format != CLIP_FORMAT_ZIP:
+            log.warning(f"clip_streaming only supports the zip .clip format - not streaming format {self.clip_format}")
+            stream_clip_file = False
+        streamed_clip_files: List[Path] = []  # written by the clip stage
+
+        def launcher() -> Union[Path, None]:
+            launcher_exe_path = create_pyship_launcher(target_app_info, app_dir)
+            if self.code_sign:
+                self._sign_or_raise(launcher_exe_path, signing_config)
+            return launcher_exe_path
+
+        def clip() -> Path:
+            clip_stream = None
+            if stream_clip_file:
+                level = DEFAULT_COMPRESSION_LEVEL if self.clip_compression_level is None else self.clip_compression_level
+                clip_stream = StreamingClipArchiveWriter(clip_dir, clip_file_path, level=level)
+            try:
+                create_clip(
+                    target_app_info,
+                    app_dir,
+                    Path(self.project_dir, self.dist_dir),
+                    cache_dir,
+                    python_version=self.python_version,
+                    prune_profile=self.prune,
+                    prune_include=self.prune_include,
+                    prune_exclude=self.prune_exclude,
+                    lock_path=lock_path,
+                    wheelhouse_dir=wheelhouse_dir,
+                    manifest=False,
+                    clip_stream=clip_stream,
+                )
+                if self.trace_file is not None:
+                    shake_clip(clip_dir, self.trace_file, self.prune_include)
+                if self.compile_bytecode or self.drop_sources:
+                    compile_clip(Path(clip_dir, "python.exe"), clip_dir, self.drop_sources)
+                if self.zip_packages:
+                    pack_site_packages(clip_dir, self.zip_exclude)
+                create_clip_manifest(clip_dir, target_app_name, target_app_version)  # after the last change to the CLIP
+            except Exception:
+                if clip_stream is not None:
+                    clip_stream.abort()
+                raise
+            if clip_stream is not None:
+                # only the files changed since they were fed are compressed now
+                streamed_clip_files.append(create_clip_file(clip_dir, clip_file_path.parent, self.clip_compression_level, clip_stream=clip_stream))
+            return clip_dir
+
+        def installer(launcher: Union[Path, None], clip: Path) -> Union[Path, None]:
+            installer_exe_path = run_nsis(target_app_info, target_app_version, app_dir)
+            if installer_exe_path is not None and self.code_sign:
+                self._sign_or_raise(installer_exe_path, signing_config)
+            return installer_exe_path
+
+        stages = [
+            Stage("launcher", cached("launcher", [Path(app_dir, target_app_name), Path(app_dir, f"{target_app_name}_metadata.json")], launcher)),
+            Stage("clip", cached("clip", [clip_dir], clip)),
+            # only the NSIS installer - a whole installers dir restored from the cache could bring back an older MSIX
+            Stage("installer", cached("installer", [Path(installers_dir, installer_file_name(target_app_name, "exe"))], installer), ("launcher", "clip")),
+        ]
+
+        if self.msix:
+            if self.msix_publisher is None:
+                log.error("msix=True but msix_publisher is not set; skipping MSIX creation")
+            else:
+                msix_publisher = self.msix_publisher
+
+                def msix(installer: Union[Path, None]) -> Union[Path, None]:
+                    msix_path = create_msix(target_app_info, app_dir, msix_publisher, self.store_assets_dir, self.makeappx_path)
+                    if msix_path is not None and self.code_sign:
+                        self._sign_or_raise(msix_path, signing_config)
+                    return msix_path
+
+                stages.append(Stage("msix", cached("msix", [Path(installers_dir, installer_file_name(target_app_name, "msix"))], msix), ("installer",)))
+
+        if cloud_access is not None:
+
+            def clip_file(clip: Path) -> Path:
+                if clip_file_path in streamed_clip_files:
+                    return clip_file_path
+                return create_clip_file(clip, clip_file_path.parent, self.clip_compression_level, self.clip_format, self.clip_dictionary)
+
+            def clip_patches(clip: Path) -> List[Path]:
+                return create_clip_patches(cloud_access, target_app_version, clip, app_dir.parent, self.clip_patches)
+
+            def clip_manifest(clip: Path) -> Path:
+                # uploaded next to the .clip, so the CLIP's inventory can be read without downloading it
+                manifest_path = Path(clip, CLIP_MANIFEST_NAME)
+                if not manifest_path.exists():
+                    manifest_path = create_clip_manifest(clip, target_app_name, target_app_version)  # a CLIP restored from an older build cache
+                return Path(shutil.copy2(manifest_path, Path(app_dir.parent, get_clip_manifest_name(target_app_name, target_app_version))))
+
+            def clip_chunks(clip_file: Path) -> Path:
+                return create_chunk_manifest(clip_file, target_app_name, target_app_version)
+
+            # Each artifact is uploaded as soon as it (and the installer) is ready, all at the same time through
+            # cloud_access's one uploader. Nothing is uploaded without an installer (e.g. NSIS not available).
+            def upload_files(installer: Union[Path, None], file_paths: List[Union[Path, None]]) -> List[str]:
+                urls = []
+                if installer is not None:
+                    for file_path in file_paths:
+                        if file_path is not None:
+                            urls.append(url := cloud_access.upload(file_path))
+                            pyship_print(f'uploaded "{file_path}" to {url}')
+                return urls
+
+            def upload_installer(installer: Union[Path, None]) -> List[str]:
+                if installer is None:
+                    pyship_print("installer not created (NSIS not available) - skipping upload")
+                return upload_files(installer, [installer])
+
+            def upload_clip(installer: Union[Path, None], clip_file: Path, clip_chunks: Union[Path, None] = None) -> List[str]:
+                if installer is None or clip_chunks is None:
+                    return upload_files(installer, [clip_file])
+                url = cloud_access.upload_chunked(clip_file, clip_chunks)
+                pyship_print(f'uploaded "{clip_file}" chunks, manifest at {url}')
+                return [url]
+
+            def upload(**uploads: List[str]) -> List[str]:
+                urls = [url for stage_urls in uploads.values() for url in stage_urls]
+                log.info(f"uploaded {len(urls)} files : {urls}")
+                return urls
+
+            def release(
+                upload: List[str], installer: Union[Path, None], clip_file: Path, clip_chunks: Union[Path, None] = None, clip_patches: Union[List[Path], None] = None
+            ) -> Union[str, None]:
+                # added to the release index only once all of the version's files are uploaded
+                if installer is None:
+                    return None
+                s3_key = clip_file.name if clip_chunks is None else clip_chunks.name
+                delta_keys = None if clip_patches is None else [clip_patch.name for clip_patch in clip_patches]
+                return cloud_access.publish_release(create_release(target_app_version, clip_file, s3_key, delta_keys, installer.name))
+
+            stages.append(Stage("clip_file", cached("clip_file", [clip_file_path], clip_file), ("clip",)))
+            stages.append(Stage("clip_manifest", clip_manifest, ("clip",)))
+            stages.append(Stage("upload_installer", upload_installer, ("installer",)))
+            stages.append(Stage("upload_clip_manifest", lambda installer, clip_manifest: upload_files(installer, [clip_manifest]), ("installer", "clip_manifest")))
+            if self.clip_chunks:
+                stages.append(Stage("clip_chunks", clip_chunks, ("clip_file",)))
+                stages.append(Stage("upload_clip", upload_clip, ("installer", "clip_file", "clip_chunks")))
+            else:
+                stages.append(Stage("upload_clip", upload_clip, ("installer", "clip_file")))
+            if self.clip_patches > 0:
+                # made from the earlier versions in the bucket, so never cached
+                stages.append(Stage("clip_patches", clip_patches, ("clip",)))
+                stages.append(Stage("upload_clip_patches", lambda installer, clip_patches: upload_files(installer, clip_patches), ("installer", "clip_patches")))
+            if any(stage.name == "msix" for stage in stages):
+                stages.append(Stage("upload_msix", lambda installer, msix: upload_files(installer, [msix]), ("installer", "msix")))
+            stages.append(Stage("upload", upload, tuple(stage.name for stage in stages if stage.name.startswith("upload_"))))
+            release_inputs = ["upload", "installer", "clip_file"] + [stage.name for stage in stages if stage.name in ("clip_chunks", "clip_patches")]
+            stages.append(Stage("release", release, tuple(release_inputs)))
+
+        return stages
+
+    def _prepare_target_app(self, cache_dir: Path) -> Tuple[AppInfo, Union[BuildCache, None], Union[str, None]]:
+        """
+        Build (or restore from the build cache) the target app's wheel and get the target app info.
+
+        :param cache_dir: pyship cache dir
+        :return: target app info, build cache (None if disabled) and source hash (None without a build cache)
+        """
+        # Clean dist directory to avoid stale wheels (multiple wheels cause metadata extraction to fail)
+        dist_dir = Path(self.project_dir, self.dist_dir)
+        if dist_dir.exists():
+            mkdirs(dist_dir, remove_first=True)
+
+        build_cache = None
+        source_hash = None
+        wheel_key = None
+        wheel_restored = False
+        if self.build_cache:
+            # the wheel is restored into the (now empty) dist dir before get_app_info(), which only builds a wheel if there isn't one
+            app_name = get_app_info_py_project(AppInfo(), self.project_dir).name
+            if app_name is not None:
+                build_cache = BuildCache(cache_dir, app_name)
+                source_hash = get_source_hash(self.project_dir, app_name)
+                wheel_key = get_build_key(stage="wheel", source=source_hash)
+                if wheel_restored := build_cache.restore("wheel", wheel_key, [dist_dir]):
+                    pyship_print(f"wheel restored from build cache ({wheel_key[:12]})")
+
+        target_app_info = get_app_info(self.project_dir, dist_dir, cache_dir, offline=self.offline)
+
+        if build_cache is not None and wheel_key is not None and not wheel_restored and len(list(dist_dir.glob("*.whl"))) > 0:
+            build_cache.store("wheel", wheel_key, [dist_dir])
+
+        if target_app_info.name is None:
+            raise PyshipNoAppName
+        return target_app_info, build_cache, source_hash
+
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
@@ -141,11 +538,6 @@ class PyShip:
         start_time = datetime.now()
         pyship_print(f"{pyship_application_name} starting (pyship={str(pyship_version)},pyshipupdate={str(pyshipupdate_version)},upload={self.upload},public_readable={self.public_readable})")
 
-        # Clean dist directory to avoid stale wheels (multiple wheels cause metadata extraction to fail)
-        dist_dir = Path(self.project_dir, self.dist_dir)
-        if dist_dir.exists():
-            mkdirs(dist_dir, remove_first=True)
-
         cache_dir = Path(platformdirs.user_cache_dir(pyship_application_name, pyship_author))
 
         signing_config = self._signing_config()
@@ -160,71 +552,142 @@ class PyShip:
             if not check_signing_available(signing_config):
                 raise PyshipSigningUnavailable("code_sign is True but signing infrastructure is not available")
 
-        target_app_info = get_app_info(self.project_dir, Path(self.project_dir, self.dist_dir), cache_dir)
+        target_app_info, build_cache, source_hash = self._prepare_target_app(cache_dir)
 
-        if target_app_info.name is None:
-            raise PyshipNoAppName
-        else:
-            app_dir = Path(self.project_dir, APP_DIR_NAME, target_app_info.name).absolute()
+        assert isinstance(target_app_info.name, str)
+        app_dir = Path(self.project_dir, APP_DIR_NAME, target_app_info.name).absolute()
 
-            mkdirs(app_dir, remove_first=True)
+        mkdirs(app_dir, remove_first=True)
 
-            launcher_exe_path = create_pyship_launcher(target_app_info, app_dir)
-            if self.code_sign:
-                self._sign_or_raise(launcher_exe_path, signing_config)
+        self.cloud_access = None  # set by _ship_stages if uploading
+        try:
+            outputs = run_stages(self._ship_stages(target_app_info, app_dir, cache_dir, signing_config, build_cache, source_hash))
+        finally:
+            if self.cloud_access is not None:
+                self.cloud_access.close()  # stop its upload threads
+        installer_exe_path = outputs["installer"]
 
-            clip_dir = create_clip(target_app_info, app_dir, Path(self.project_dir, self.dist_dir), cache_dir, python_version=self.python_version)
+        elapsed_time = datetime.now() - start_time
+        pyship_print(f"{pyship_application_name} done (elapsed_time={str(elapsed_time)})")
 
-            assert isinstance(target_app_info.version, VersionInfo)
-            installer_exe_path = run_nsis(target_app_info, target_app_info.version, app_dir)
-            if installer_exe_path is not None and self.code_sign:
-                self._sign_or_raise(installer_exe_path, signing_config)
+        return installer_exe_path
 
-            if self.msix:
-                if self.msix_publisher is None:
-                    log.error("msix=True but msix_publisher is not set; skipping MSIX creation")
-                else:
-                    msix_path = create_msix(target_app_info, app_dir, self.msix_publisher, self.store_assets_dir, self.makeappx_path)
-                    if msix_path is not None and self.code_sign:
-                        self._sign_or_raise(msix_path, signing_config)
+    @typechecked
+    def trace(self, smoke_script: Union[Path, None] = None) -> Path:
+        """
+        Build the CLIP and run the app in it under the import and file-open tracer, recording every CLIP file it touches.
+        Set ``trace_file`` to the result to ship a CLIP of only the traced files (plus the ``prune_include`` allow-list).
 
-            if self.upload and installer_exe_path is not None:
-                if self.cloud_profile is None and self.cloud_id is None:
-                    pyship_print("no cloud access provided - will not attempt upload")
-                else:
-                    assert isinstance(target_app_info.name, str)
-                    assert isinstance(target_app_info.author, str)
-                    bucket = create_bucket_name(target_app_info.name, target_app_info.author) if self.cloud_bucket is None else self.cloud_bucket
-
-                    if self.cloud_profile is None:
-                        if self.cloud_secret is None:
-                            log.error(f"{self.cloud_secret=}")
-                            s3_access = None
-                        else:
-                            s3_access = S3Access(bucket, aws_access_key_id=self.cloud_id, aws_secret_access_key=self.cloud_secret)
-                    else:
-                        s3_access = S3Access(bucket, profile_name=self.cloud_profile)
-
-                    if s3_access is not None:
-                        s3_access.public_readable = self.public_readable
-                        self.cloud_access = PyShipCloud(target_app_info.name, s3_access)
-
-                        installer_url = self.cloud_access.upload(installer_exe_path)
-                        pyship_print(f'uploaded "{installer_exe_path}" to {installer_url}')
-
-                        # The .clip (zipped CLIP update payload) is only needed for upload, so it is
-                        # created here rather than unconditionally — it would otherwise sit inside
-                        # app_dir and get packed into the NSIS installer, doubling its size.
-                        clip_file_path = create_clip_file(clip_dir)
-                        clip_url = self.cloud_access.upload(clip_file_path)
-                        pyship_print(f'uploaded "{clip_file_path}" to {clip_url}')
-
-            elif not self.upload:
-                pyship_print("no upload requested")
-            else:
-                pyship_print("installer not created (NSIS not available) - skipping upload")
+        :param smoke_script: script that exercises the app, run with the CLIP's interpreter (None to run the app module as the launcher does)
+        :return: path to the trace file (``trace_file``, or pyship_trace.json in the project dir)
+        """
+        cache_dir = Path(platformdirs.user_cache_dir(pyship_application_name, pyship_author))
+        target_app_info, _, _ = self._prepare_target_app(cache_dir)
+        assert isinstance(target_app_info.name, str)
+        app_dir = Path(self.project_dir, APP_DIR_NAME, target_app_info.name).absolute()
+        mkdirs(app_dir, remove_first=True)
+
+        clip_dir = create_clip(
+            target_app_info,
+            app_dir,
+            Path(self.project_dir, self.dist_dir),
+            cache_dir,
+            python_version=self.python_version,
+            prune_profile=self.prune,
+            prune_include=self.prune_include,
+            prune_exclude=self.prune_exclude,
+            lock_path=self._lock_path() if self.offline else None,
+            wheelhouse_dir=require_wheelhouse(cache_dir, self._lock_path()) if self.offline else None,
+        )
+        trace_path = Path(self.project_dir, TRACE_FILE_NAME) if self.trace_file is None else self.trace_file
+        run_trace(Path(clip_dir, "python.exe"), clip_dir, target_app_info.name, trace_path, smoke_script)
+        return trace_path
 
-            elapsed_time = datetime.now() - start_time
-            pyship_print(f"{pyship_application_name} done (elapsed_time={str(elapsed_time)})")
+    @typechecked
+    def publish(self, resume: bool = False) -> List[str]:
+        """
+        Upload the newest version built by :meth:`ship` (its installers, .clip, CLIP manifest and .clippatch files in the
+        project's app and installers dirs) without building anything - e.g. after an interrupted upload - and add it to
+        the release index. Files S3 already has are not uploaded again.
 
-        return installer_exe_path
+        :param resume: resume interrupted multipart uploads (only their missing parts are uploaded) rather than start them over
+        :return: URLs of the uploaded files
+        """
+        target_app_info = get_app_info_py_project(AppInfo(), self.project_dir)
+        if (target_app_name := target_app_info.name) is None:
+            raise PyshipNoAppName
+        app_parent_dir = Path(self.project_dir, APP_DIR_NAME)
+        clip_files = {version_from_artifact_name(target_app_name, clip_path.name): clip_path for clip_path in app_parent_dir.glob(f"{target_app_name}_*.{CLIP_EXT}")}
+        clip_files.pop(None, None)
+        if len(clip_files) == 0:
+            pyship_print(f'no {target_app_name} .clip in "{app_parent_dir}" - nothing to publish')
+            return []
+        if (cloud_access := self._connect_cloud(target_app_info)) is None:
+            return []
+        with cloud_access:  # stops its upload threads when done
+            version = max(clip_files)
+            clip_file = clip_files[version]
+            installers_dir = get_installers_dir(self.project_dir)
+            installer = Path(installers_dir, installer_file_name(target_app_name, "exe"))
+            clip_chunks = Path(app_parent_dir, get_chunk_manifest_name(target_app_name, version))
+            clip_patches = sorted(app_parent_dir.glob(f"{target_app_name}_*_to_{version}.{CLIP_PATCH_EXT}"))
+            file_paths = [installer, Path(installers_dir, installer_file_name(target_app_name, "msix")), Path(app_parent_dir, get_clip_manifest_name(target_app_name, version)), *clip_patches]
+            if not clip_chunks.exists():
+                file_paths.append(clip_file)
+            pyship_print(f"publishing {target_app_name} {version}")
+
+            # concurrently, as ship() uploads
+            stages = [Stage(f"upload_{file_path.name}", partial(cloud_access.upload, file_path, resume=resume)) for file_path in file_paths if file_path.exists()]
+            if clip_chunks.exists():
+                stages.append(Stage(f"upload_{clip_chunks.name}", partial(cloud_access.upload_chunked, clip_file, clip_chunks)))
+            urls = list(run_stages(stages).values())
+            s3_key = clip_chunks.name if clip_chunks.exists() else clip_file.name
+            release = create_release(version, clip_file, s3_key, [clip_patch.name for clip_patch in clip_patches], installer.name if installer.exists() else None)
+            cloud_access.publish_release(release)
+            return urls
+
+    @typechecked
+    def prune_releases(self, dry_run: bool = False) -> Tuple[RetentionReport, Union[RetentionReport, None]]:
+        """
+        Delete the published versions that the retention policy (``keep_versions``, ``keep_days`` and ``pinned_versions``)
+        does not keep from the cloud, and their CLIP dirs and version files from the project's app dir.
+
+        :param dry_run: only report what would be deleted
+        :return: local and cloud retention reports (the cloud report is None without cloud access)
+        """
+        target_app_info = get_app_info_py_project(AppInfo(), self.project_dir)
+        if target_app_info.name is None:
+            raise PyshipNoAppName
+        app_dir = Path(self.project_dir, APP_DIR_NAME, target_app_info.name).absolute()
+        local_report = prune_local(app_dir, target_app_info.name, self.keep_versions, self.keep_days, self.pinned_versions, dry_run)
+        pyship_print(str(local_report))
+        cloud_report = None
+        if (cloud_access := self._connect_cloud(target_app_info)) is not None:
+            with cloud_access:
+                cloud_report = prune_cloud(cloud_access, self.keep_versions, self.keep_days, self.pinned_versions, dry_run)
+            pyship_print(str(cloud_report))
+        return local_report, cloud_report
+
+    @typechecked
+    def lock(self) -> Path:
+        """
+        Resolve the target app's full dependency closure for the CLIP's platform and Python version, and write it
+        (with hashes) to the lock file.
+
+        :return: path to the lock file (``lock_file``, or pyship-lock.txt in the project dir)
+        """
+        cache_dir = Path(platformdirs.user_cache_dir(pyship_application_name, pyship_author))
+        return uv_lock(find_or_bootstrap_uv(cache_dir), self.project_dir, resolve_python_version(self.python_version), self._lock_path())
+
+    @typechecked
+    def wheelhouse(self) -> Path:
+        """
+        Download the locked wheels into the content-addressed wheelhouse in the pyship cache dir, so that
+        ``offline`` builds need no index or network access. Writes the lock file first if there isn't one.
+
+        :return: the lock's wheelhouse dir
+        """
+        cache_dir = Path(platformdirs.user_cache_dir(pyship_application_name, pyship_author))
+        if not self._lock_path().exists():
+            self.lock()
+        return build_wheelhouse(find_or_bootstrap_uv(cache_dir), self._lock_path(), cache_dir, resolve_python_version(self.python_version))
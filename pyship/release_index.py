@@ -0,0 +1,140 @@
+"""
+Versioned release index - ``<app>_releases.json`` in the app's bucket.
+
+Updaters used to find the newest version by listing the bucket and parsing the
+object names, which gets slower (and costs more requests) as releases pile up.
+The release index lists every published version with its update payload's S3 key,
+size and SHA-256, its publish time and the keys of the ``.clippatch`` deltas to
+it, plus the latest version, so the latest release is resolved with one small GET.
+
+The index is only updated after all of a version's artifacts are uploaded, with a
+conditional put (see :meth:`pyship.cloud.PyShipCloud.publish_release`), so
+concurrent publishers never overwrite each other's releases and clients never
+see a release whose files are missing.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Union
+
+from semver import VersionInfo
+from typeguard import typechecked
+
+from pyship.clip_archive import READ_CHUNK_SIZE
+
+RELEASE_INDEX_FORMAT_VERSION = 1
+
+
+@typechecked
+def get_release_index_name(app_name: str) -> str:
+    """
+    :param app_name: target app name
+    :return: release index's S3 key
+    """
+    return f"{app_name}_releases.json"
+
+
+@typechecked
+def create_release(
+    version: Union[VersionInfo, str], clip_path: Path, s3_key: str, delta_keys: Union[List[str], None] = None, installer_key: Union[str, None] = None, published: Union[datetime, None] = None
+) -> dict:
+    """
+    Create a release index entry.
+
+    :param version: released version
+    :param clip_path: the version's .clip file
+    :param s3_key: S3 key of the update payload (the .clip, or its chunk manifest if uploaded chunked)
+    :param delta_keys: S3 keys of the .clippatch files to this version
+    :param installer_key: S3 key of the installer
+    :param published: publish time (default now)
+    :return: release index entry
+    """
+    clip_hash = hashlib.sha256()
+    with open(clip_path, "rb") as f:
+        while len(buffer := f.read(READ_CHUNK_SIZE)) > 0:
+            clip_hash.update(buffer)
+    published = datetime.now(timezone.utc) if published is None else published
+    release = {
+        "version": str(version),
+        "key": s3_key,
+        "size": clip_path.stat().st_size,
+        "sha256": clip_hash.hexdigest(),
+        "published": published.isoformat(timespec="seconds"),
+        "delta_keys": sorted(delta_keys or []),
+    }
+    if installer_key is not None:
+        release["installer_key"] = installer_key
+    return release
+
+
+@typechecked
+def add_release(release_index: Union[dict, None], app_name: str, release: dict) -> dict:
+    """
+    Add a release to a release index (replacing a release of the same version).
+
+    :param release_index: release index (None for a new one)
+    :param app_name: target app name
+    :param release: release index entry (see create_release)
+    :return: the updated release index
+    """
+    releases: Dict[VersionInfo, dict] = {}
+    if release_index is not None:
+        check_release_index(release_index, app_name)
+        releases = {VersionInfo.parse(r["version"]): r for r in release_index["releases"]}
+    releases[VersionInfo.parse(release["version"])] = release
+    versions = sorted(releases)
+    return {"format": RELEASE_INDEX_FORMAT_VERSION, "app": app_name, "latest": str(versions[-1]), "releases": [releases[version] for version in versions]}
+
+
+@typechecked
+def remove_releases(release_index: dict, app_name: str, versions: List[VersionInfo]) -> dict:
+    """
+    Remove releases from a release index.
+
+    :param release_index: release index
+    :param app_name: target app name
+    :param versions: versions to remove
+    :return: the updated release index (its latest version is None if no releases are left)
+    """
+    check_release_index(release_index, app_name)
+    removed = {str(version) for version in versions}
+    releases = [release for release in release_index["releases"] if release["version"] not in removed]
+    latest = str(max(VersionInfo.parse(release["version"]) for release in releases)) if len(releases) > 0 else None
+    return {"format": RELEASE_INDEX_FORMAT_VERSION, "app": app_name, "latest": latest, "releases": releases}
+
+
+@typechecked
+def check_release_index(release_index: dict, app_name: str):
+    """
+    :param release_index: release index
+    :param app_name: target app name the release index must be for
+    """
+    if release_index.get("format") != RELEASE_INDEX_FORMAT_VERSION:
+        raise ValueError(f"unsupported release index format ({release_index.get('format')})")
+    if release_index.get("app") != app_name:
+        raise ValueError(f"release index is for {release_index.get('app')}, not {app_name}")
+
+
+@typechecked
+def parse_release_index(release_index_bytes: bytes, app_name: str) -> dict:
+    """
+    :param release_index_bytes: release index (JSON)
+    :param app_name: target app name the release index must be for
+    :return: release index
+    """
+    release_index = json.loads(release_index_bytes)
+    check_release_index(release_index, app_name)
+    return release_index
+
+
+@typechecked
+def get_latest_release(release_index: Union[dict, None]) -> Union[dict, None]:
+    """
+    :param release_index: release index (None if there isn't one)
+    :return: the latest release's entry, or None if nothing has been released
+    """
+    if release_index is None:
+        return None
+    return next((release for release in release_index["releases"] if release["version"] == release_index["latest"]), None)
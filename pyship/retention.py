@@ -0,0 +1,260 @@
+"""
+Retention of published versions - ``pyship prune-releases``.
+
+Every ``ship()`` uploads a ``.clip`` (or a chunk manifest and its new chunks), a
+CLIP manifest and possibly ``.clippatch`` deltas, and they accumulate in the
+bucket forever, slowing down listing-based discovery and costing storage. The
+installer has the same key for every version, so it is replaced rather than
+accumulated.
+
+A version is kept if it is one of the newest ``keep_versions`` versions, was
+published in the last ``keep_days`` days, or is pinned; every other version
+expires. :func:`prune_cloud` removes the expired versions from the release index
+and then deletes their objects (the ``.clippatch`` files *to* them - patches from
+them to kept versions still update installs of them) plus the chunks no kept
+chunk manifest references, in batches of up to 1000 keys per request.
+
+Chunks are shared, so a chunk is only deleted if it is older than the grace period
+and no kept chunk manifest, nor one written in the grace period, references it, and
+right before deleting, the release index and chunk manifests are read again to spare
+whatever was published in the meantime. A chunked publish still reuses chunks that
+exist when it starts, before it writes its chunk manifest, so pruning must not run
+at the same time as a chunked publish.
+:func:`prune_local` applies the same policy to the CLIP dirs (``<name>_<version>``)
+in an app dir and the version files next to it. Both can report what they would
+delete without deleting anything (dry run).
+"""
+
+import json
+import shutil
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Set, Tuple, Union
+
+from semver import VersionInfo
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, CLIP_EXT
+from pyship.chunk_store import CHUNK_MANIFEST_EXT, CHUNK_PREFIX, get_chunk_key
+from pyship.clip_manifest import CLIP_MANIFEST_NAME
+from pyship.clip_patch import CLIP_PATCH_EXT
+from pyship.cloud import PyShipCloud
+
+log = get_logger(__application_name__)
+
+DEFAULT_KEEP_VERSIONS = 5
+DEFAULT_KEEP_DAYS = 30
+CHUNK_GRACE_PERIOD = timedelta(days=1)  # unreferenced chunks this new may belong to a chunked upload in progress
+
+
+@dataclass
+class RetentionReport:
+    """Versions kept and expired, and the files deleted (or, on a dry run, that would be deleted)."""
+
+    location: str
+    dry_run: bool = False
+    kept: List[VersionInfo] = field(default_factory=list)
+    expired: List[VersionInfo] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)  # S3 keys or local paths
+    deleted_bytes: int = 0
+    failed: List[str] = field(default_factory=list)  # could not be deleted
+
+    def __str__(self) -> str:
+        deleted = "would delete" if self.dry_run else "deleted"
+        expired = ",".join(str(version) for version in self.expired)
+        text = f"{self.location} : kept {len(self.kept)} versions, {deleted} {len(self.expired)} versions ({expired}) - {len(self.deleted)} files, {self.deleted_bytes / 1e6:.1f} MB"
+        if len(self.failed) > 0:
+            text += f" ({len(self.failed)} could not be deleted)"
+        return text
+
+
+@typechecked
+def version_from_artifact_name(app_name: str, name: str) -> Union[VersionInfo, None]:
+    """
+    :param app_name: target app name
+    :param name: S3 key or file (or dir) name
+    :return: the version that name is the .clip, chunk manifest, CLIP manifest, CLIP dir or a .clippatch to, otherwise None
+    """
+    prefix = f"{app_name}_"
+    if not name.startswith(prefix):
+        return None
+    name = name[len(prefix) :]
+    for suffix in (f".{CLIP_EXT}", f".{CHUNK_MANIFEST_EXT}", f"_{CLIP_MANIFEST_NAME}", f".{CLIP_PATCH_EXT}", ""):
+        if name.endswith(suffix):
+            version_string = name[: len(name) - len(suffix)]
+            if suffix == f".{CLIP_PATCH_EXT}":
+                version_string = version_string.partition("_to_")[2]
+            try:
+                return VersionInfo.parse(version_string)
+            except ValueError:
+                pass
+    return None
+
+
+@typechecked
+def get_expired_versions(
+    published: Dict[VersionInfo, datetime], keep_versions: int, keep_days: int, pinned: Union[List[str], None] = None, now: Union[datetime, None] = None
+) -> List[VersionInfo]:
+    """
+    Apply the retention policy.
+
+    :param published: version to publish time
+    :param keep_versions: keep this many of the newest versions (at least 1, so the latest version is never expired)
+    :param keep_days: keep the versions published in the last keep_days days
+    :param pinned: versions to keep regardless
+    :param now: current time (default now)
+    :return: sorted list of the versions that are not kept
+    """
+    if keep_versions < 1:
+        raise ValueError(f"keep_versions must be at least 1 ({keep_versions=})")
+    if keep_days < 0:
+        raise ValueError(f"keep_days can not be negative ({keep_days=})")
+    cutoff = (datetime.now(timezone.utc) if now is None else now) - timedelta(days=keep_days)
+    kept = set(sorted(published)[-keep_versions:]) | {VersionInfo.parse(version) for version in pinned or []}
+    return sorted(version for version, published_time in published.items() if version not in kept and published_time < cutoff)
+
+
+@typechecked
+def prune_cloud(
+    cloud_access: PyShipCloud,
+    keep_versions: int = DEFAULT_KEEP_VERSIONS,
+    keep_days: int = DEFAULT_KEEP_DAYS,
+    pinned: Union[List[str], None] = None,
+    dry_run: bool = False,
+    now: Union[datetime, None] = None,
+) -> RetentionReport:
+    """
+    Delete the expired versions' objects from the bucket.
+
+    :param cloud_access: cloud access
+    :param keep_versions: keep this many of the newest versions
+    :param keep_days: keep the versions published in the last keep_days days
+    :param pinned: versions to keep regardless
+    :param dry_run: only report what would be deleted
+    :param now: current time (default now)
+    :return: retention report
+    """
+    now = datetime.now(timezone.utc) if now is None else now
+    objects = cloud_access.list_objects()  # one listing, with the sizes and times
+    release_index, _ = cloud_access.get_release_index()
+
+    version_keys: Dict[VersionInfo, List[str]] = defaultdict(list)
+    published: Dict[VersionInfo, datetime] = {}
+    for s3_key, (_, last_modified) in objects.items():
+        if (version := version_from_artifact_name(cloud_access.app_name, s3_key)) is not None:
+            version_keys[version].append(s3_key)
+            published[version] = min(published.get(version, last_modified), last_modified)
+    for release in [] if release_index is None else release_index["releases"]:
+        if (version := VersionInfo.parse(release["version"])) in published:
+            published[version] = datetime.fromisoformat(release["published"])
+
+    expired = get_expired_versions(published, keep_versions, keep_days, pinned, now)
+    kept = sorted(set(published) - set(expired))
+    delete_keys = [s3_key for version in expired for s3_key in version_keys[version]]
+
+    # chunks are shared between versions, so only the ones no kept (or recently written) chunk manifest uses are deleted
+    if any(s3_key.startswith(CHUNK_PREFIX) for s3_key in objects):
+        grace_cutoff = now - CHUNK_GRACE_PERIOD
+        live_manifest_keys = [s3_key for version in kept for s3_key in version_keys[version] if s3_key.endswith(f".{CHUNK_MANIFEST_EXT}")]
+        live_manifest_keys.extend(s3_key for s3_key in _get_chunk_manifest_keys(cloud_access, objects) if objects[s3_key][1] >= grace_cutoff)
+        referenced = set().union(*[_read_chunk_keys(cloud_access, s3_key) for s3_key in set(live_manifest_keys)])
+        chunk_cutoff = now - max(timedelta(days=keep_days), CHUNK_GRACE_PERIOD)
+        delete_keys.extend(s3_key for s3_key, (_, last_modified) in objects.items() if s3_key.startswith(CHUNK_PREFIX) and s3_key not in referenced and last_modified < chunk_cutoff)
+
+    if not dry_run and len(delete_keys) > 0:
+        if len(expired) > 0:
+            cloud_access.unpublish_releases(expired)  # first, so clients are never pointed at deleted files
+        delete_keys = _recheck_delete_keys(cloud_access, objects, delete_keys)
+    report = RetentionReport(f"s3://{cloud_access.s3_access.bucket_name}", dry_run, kept, expired, sorted(delete_keys), sum(objects[s3_key][0] for s3_key in delete_keys))
+    if not dry_run and len(delete_keys) > 0:
+        report.failed = cloud_access.delete(report.deleted)
+    log.info(f"{report} : {report.deleted}")
+    return report
+
+
+def _get_chunk_manifest_keys(cloud_access: PyShipCloud, objects: Dict[str, Tuple[int, datetime]]) -> List[str]:
+    return [s3_key for s3_key in objects if s3_key.startswith(f"{cloud_access.app_name}_") and s3_key.endswith(f".{CHUNK_MANIFEST_EXT}")]
+
+
+def _read_chunk_keys(cloud_access: PyShipCloud, manifest_key: str) -> Set[str]:
+    response = cloud_access.s3_access.client.get_object(Bucket=cloud_access.s3_access.bucket_name, Key=manifest_key)
+    return {get_chunk_key(chunk["sha256"]) for chunk in json.loads(response["Body"].read())["chunks"]}
+
+
+def _recheck_delete_keys(cloud_access: PyShipCloud, objects: Dict[str, Tuple[int, datetime]], delete_keys: List[str]) -> List[str]:
+    """
+    Right before deleting, spare what a publisher that ran since the bucket was listed uses: the files of versions it
+    (re)published to the release index, and the chunks of chunk manifests it wrote.
+    """
+    release_index, _ = cloud_access.get_release_index()
+    published = {VersionInfo.parse(release["version"]) for release in ([] if release_index is None else release_index["releases"])}
+    current_objects = cloud_access.list_objects(f"{cloud_access.app_name}_")
+    spared = {s3_key for s3_key in delete_keys if version_from_artifact_name(cloud_access.app_name, s3_key) in published}
+    spared.update(s3_key for s3_key in delete_keys if s3_key in current_objects and current_objects[s3_key][1] != objects[s3_key][1])  # rewritten
+    for manifest_key in _get_chunk_manifest_keys(cloud_access, current_objects):
+        if manifest_key not in objects or current_objects[manifest_key][1] != objects[manifest_key][1]:
+            spared.update(_read_chunk_keys(cloud_access, manifest_key))
+    if len(spared & set(delete_keys)) > 0:
+        log.info(f"not deleting what was published while pruning : {sorted(spared & set(delete_keys))}")
+    return [s3_key for s3_key in delete_keys if s3_key not in spared]
+
+
+def _get_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(file_path.stat().st_size for file_path in path.rglob("*") if file_path.is_file())
+    return path.stat().st_size
+
+
+@typechecked
+def prune_local(
+    app_dir: Path,
+    app_name: str,
+    keep_versions: int = DEFAULT_KEEP_VERSIONS,
+    keep_days: int = DEFAULT_KEEP_DAYS,
+    pinned: Union[List[str], None] = None,
+    dry_run: bool = False,
+    now: Union[datetime, None] = None,
+) -> RetentionReport:
+    """
+    Delete the expired versions' CLIP dirs in an app dir, and their .clip, CLIP manifest, chunk manifest and .clippatch files in its parent.
+
+    :param app_dir: app dir (e.g. app/<name> in the project dir); the version files are in its parent
+    :param app_name: target app name
+    :param keep_versions: keep this many of the newest versions
+    :param keep_days: keep the versions modified in the last keep_days days
+    :param pinned: versions to keep regardless
+    :param dry_run: only report what would be deleted
+    :param now: current time (default now)
+    :return: retention report
+    """
+    version_paths: Dict[VersionInfo, List[Path]] = defaultdict(list)
+    published: Dict[VersionInfo, datetime] = {}
+    candidates = []
+    if app_dir.exists():
+        candidates.extend(path for path in app_dir.iterdir() if path.is_dir())
+    if app_dir.parent.exists():
+        candidates.extend(path for path in app_dir.parent.iterdir() if path.is_file())
+    for path in candidates:
+        if (version := version_from_artifact_name(app_name, path.name)) is not None:
+            version_paths[version].append(path)
+            modified = datetime.fromtimestamp(path.stat().st_mtime, timezone.utc)
+            published[version] = min(published.get(version, modified), modified)
+
+    expired = get_expired_versions(published, keep_versions, keep_days, pinned, now)
+    delete_paths = sorted(path for version in expired for path in version_paths[version])
+    report = RetentionReport(str(app_dir), dry_run, sorted(set(published) - set(expired)), expired, [str(path) for path in delete_paths], sum(_get_size(path) for path in delete_paths))
+    if not dry_run:
+        for path in delete_paths:
+            try:
+                if path.is_dir():
+                    shutil.rmtree(path)
+                else:
+                    path.unlink()
+            except OSError as e:
+                log.warning(f'could not delete "{path}" : {e}')
+                report.failed.append(str(path))
+    log.info(f"{report} : {report.deleted}")
+    return report
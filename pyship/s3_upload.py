@@ -0,0 +1,327 @@
+"""
+Parallel multipart S3 upload engine.
+
+Installers and ``.clip`` files are typically 50-150 MB and often go up over a
+slow uplink. :class:`S3Uploader` uploads files larger than a part as S3
+multipart uploads, with the parts sent concurrently, and reports the achieved
+throughput. One uploader (one client, so one connection pool, and one
+:class:`~pyship.upload_scheduler.UploadScheduler` - the concurrency, priorities and
+bandwidth cap apply over everything it uploads) is meant to be used for all of a
+session's artifacts, and it only makes sure the bucket exists once.
+
+Objects are uploaded with the file's SHA-256 in their metadata
+(:data:`SHA256_METADATA_KEY`). Before uploading, the object is looked up (a HEAD
+request) and the upload is skipped if it already has the same contents - by that
+SHA-256 or, for objects uploaded by other tools in one part, by the MD5 ETag - so
+re-running a publish, or several pipelines publishing the same artifact, costs no
+bandwidth.
+
+Given a state dir (pyship uses ``uploads`` in its cache dir), multipart uploads
+are resumable: the upload ID and the completed parts' ETags are saved in a small
+state file as the parts complete, a failed upload is left in S3 rather than
+aborted, and uploading the same file to the same key again (e.g. re-running
+``ship()`` or ``pyship publish --resume`` after a network failure) only uploads
+the missing parts. The saved parts are checked against S3's list of the upload's
+parts, so an upload that was aborted or expired in the meantime starts over.
+
+It only uses the S3 API through awsimple's client, so it works against moto (as
+the tests do) or any S3 compatible stand-in.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Union
+
+from typeguard import typechecked
+from awsimple import S3Access
+from botocore.exceptions import ClientError
+from balsa import get_logger
+
+from pyship import __application_name__
+from pyship.upload_scheduler import UploadScheduler, get_upload_priority
+
+log = get_logger(__application_name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3's minimum (except for the last part)
+MAX_PARTS = 10000  # S3's maximum
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+DEFAULT_UPLOAD_CONCURRENCY = 8  # within botocore's default connection pool (10)
+SHA256_METADATA_KEY = "sha256"  # S3 object (user) metadata with the object's SHA-256
+HASH_READ_SIZE = 1024 * 1024
+UPLOAD_STATE_DIR_NAME = "uploads"  # resumable upload state, in the pyship cache dir
+UPLOAD_STATE_FORMAT_VERSION = 1
+
+
+@dataclass
+class UploadStats:
+    """An uploaded file and how long it took."""
+
+    s3_key: str
+    bytes: int = 0
+    parts: int = 0
+    seconds: float = 0.0
+    skipped: bool = False  # the object already had the file's contents
+    resumed_parts: int = 0  # parts already uploaded by an interrupted upload
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        if self.skipped:
+            return f"{self.s3_key} : {self.bytes / 1e6:.1f} MB already up to date"
+        resumed = f" ({self.resumed_parts} resumed)" if self.resumed_parts > 0 else ""
+        return f"{self.s3_key} : {self.bytes / 1e6:.1f} MB in {self.parts} parts{resumed} in {self.seconds:.2f}s ({self.bytes_per_second / 1e6:.1f} MB/s)"
+
+
+def _hash_file(file_path: Path, algorithm: str) -> str:
+    file_hash = hashlib.new(algorithm)
+    with open(file_path, "rb") as f:
+        while len(buffer := f.read(HASH_READ_SIZE)) > 0:
+            file_hash.update(buffer)
+    return file_hash.hexdigest()
+
+
+def _read_part(file_path: Path, offset: int, size: int) -> bytes:
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def _write_state(state_path: Path, state: Dict[str, Any]):
+    temp_path = Path(f"{state_path}.tmp")
+    temp_path.write_text(json.dumps(state, indent=2))
+    temp_path.replace(state_path)  # never a partially written state file
+
+
+class S3Uploader:
+    """
+    Uploads files to an S3 bucket, as concurrent multipart uploads if they are larger than a part.
+    Its upload threads run until it is closed (use it as a context manager, or call close()).
+    """
+
+    @typechecked
+    def __init__(
+        self,
+        s3_access: S3Access,
+        part_size: int = DEFAULT_PART_SIZE,
+        concurrency: int = DEFAULT_UPLOAD_CONCURRENCY,
+        state_dir: Union[Path, None] = None,
+        bytes_per_second: Union[int, None] = None,
+        adaptive_concurrency: bool = True,
+    ):
+        """
+        :param s3_access: S3 access (its client is used for every upload)
+        :param part_size: multipart upload part size (at least MIN_PART_SIZE - larger for files that would need more than MAX_PARTS parts)
+        :param concurrency: most parts (or small files) uploaded at the same time (over all files)
+        :param state_dir: directory for the resumable upload state files (None for uploads that are aborted on failure)
+        :param bytes_per_second: bandwidth cap over all uploads (None for no cap)
+        :param adaptive_concurrency: adapt the number of parts uploaded at the same time (up to concurrency) to the observed throughput
+        """
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part size must be at least {MIN_PART_SIZE} ({part_size=})")
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1 ({concurrency=})")
+        self.s3_access = s3_access
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.state_dir = state_dir
+        self._bucket_lock = threading.Lock()
+        self._bucket_ready = False
+        self.scheduler = UploadScheduler(concurrency, bytes_per_second, adaptive_concurrency)
+
+    def close(self):
+        """Stop the upload threads."""
+        self.scheduler.shutdown()
+
+    def __enter__(self) -> "S3Uploader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def ensure_bucket(self):
+        """Create the bucket if it doesn't exist (only checked once per uploader)."""
+        with self._bucket_lock:
+            if not self._bucket_ready:
+                # Note: AWS S3 now defaults to BucketOwnerEnforced which disables ACLs
+                # Use bucket policies or pre-signed URLs for access control instead
+                self.s3_access.create_bucket()
+                self._bucket_ready = True
+
+    def _extra_args(self, sha256: str) -> Dict[str, Any]:
+        extra_args: Dict[str, Any] = {"Metadata": {SHA256_METADATA_KEY: sha256}}
+        if self.s3_access.public_readable:
+            extra_args["ACL"] = "public-read"
+        return extra_args
+
+    def _get_state_path(self, s3_key: str) -> Union[Path, None]:
+        if self.state_dir is None:
+            return None
+        return Path(self.state_dir, f"{hashlib.sha256(f'{self.s3_access.bucket_name}/{s3_key}'.encode()).hexdigest()[:32]}.json")
+
+    def _get_uploaded_parts(self, s3_key: str, upload_id: str) -> Union[Dict[int, Dict[str, Any]], None]:
+        # S3's list of the upload's parts, or None if the upload no longer exists (completed, aborted or expired)
+        parts = {}
+        try:
+            for page in self.s3_access.client.get_paginator("list_parts").paginate(Bucket=self.s3_access.bucket_name, Key=s3_key, UploadId=upload_id):
+                for part in page.get("Parts", []):
+                    parts[part["PartNumber"]] = part
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchUpload", "404"):
+                return None
+            raise
+        return parts
+
+    def _resume(self, state_path: Path, s3_key: str, size: int, sha256: str, part_size: int, resume: bool) -> Union[Dict[str, Any], None]:
+        # the state of an interrupted upload of this file to s3_key, with the parts S3 has
+        try:
+            state = json.loads(state_path.read_text())
+        except (OSError, ValueError):
+            return None
+        upload = (state.get("format"), state.get("bucket"), state.get("key"), state.get("size"), state.get("sha256"), state.get("part_size"))
+        if resume and upload == (UPLOAD_STATE_FORMAT_VERSION, self.s3_access.bucket_name, s3_key, size, sha256, part_size):
+            if (uploaded_parts := self._get_uploaded_parts(s3_key, state["upload_id"])) is not None:
+                # the parts S3 has, if they are the ones that were saved (a part that completed after the last save is uploaded again)
+                saved_parts = state["parts"]
+                state["parts"] = {
+                    str(n): part["ETag"] for n, part in uploaded_parts.items() if saved_parts.get(str(n)) == part["ETag"] and part["Size"] == min(part_size, size - (n - 1) * part_size)
+                }
+                return state
+        elif state.get("bucket") == self.s3_access.bucket_name and state.get("key") == s3_key and "upload_id" in state:
+            # an upload of other contents (or not to be resumed) - don't leave its parts in S3
+            try:
+                self.s3_access.client.abort_multipart_upload(Bucket=self.s3_access.bucket_name, Key=s3_key, UploadId=state["upload_id"])
+            except ClientError as e:
+                log.info(f"could not abort earlier upload of {s3_key} ({e})")
+        state_path.unlink(missing_ok=True)
+        return None
+
+    @typechecked
+    def is_up_to_date(self, file_path: Path, s3_key: str, sha256: Union[str, None] = None) -> bool:
+        """
+        Determine if an S3 object already has a file's contents (with one HEAD request).
+
+        :param file_path: local file
+        :param s3_key: S3 key
+        :param sha256: the file's SHA-256, if already known
+        :return: True if the object exists with the same contents
+        """
+        try:
+            head = self.s3_access.client.head_object(Bucket=self.s3_access.bucket_name, Key=s3_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        if head["ContentLength"] != os.path.getsize(file_path):
+            return False
+        if (remote_sha256 := head.get("Metadata", {}).get(SHA256_METADATA_KEY)) is not None:
+            return remote_sha256 == (_hash_file(file_path, "sha256") if sha256 is None else sha256)
+        etag = head.get("ETag", "").strip('"')
+        if len(etag) == 32 and "-" not in etag:
+            # uploaded in one part (without SSE-KMS), so the ETag is the MD5
+            return etag == _hash_file(file_path, "md5")
+        return False  # a multipart ETag depends on the (unknown) part size
+
+    @typechecked
+    def upload_file(
+        self,
+        file_path: Path,
+        s3_key: str,
+        progress: Union[Callable[[int, int], None], None] = None,
+        force: bool = False,
+        resume: bool = True,
+        priority: Union[int, None] = None,
+    ) -> UploadStats:
+        """
+        Upload a file, unless the S3 object already has the same contents.
+
+        :param file_path: file to upload
+        :param s3_key: S3 key
+        :param progress: called with the bytes uploaded so far and the file size as parts complete
+        :param force: upload even if the object is up to date
+        :param resume: resume an interrupted upload of the file to s3_key (with a state dir) - otherwise start it over
+        :param priority: scheduling priority of the file's parts, lower first (default by the file type, see get_upload_priority)
+        :return: upload statistics
+        """
+        self.ensure_bucket()
+        start = time.monotonic()
+        size = os.path.getsize(file_path)
+        client = self.s3_access.client
+        bucket = self.s3_access.bucket_name
+        stats = UploadStats(s3_key, size)
+        sha256 = _hash_file(file_path, "sha256")
+        priority = get_upload_priority(file_path.name) if priority is None else priority
+        if not force and self.is_up_to_date(file_path, s3_key, sha256):
+            stats.skipped = True
+        elif size <= self.part_size:
+
+            def put():
+                client.put_object(Bucket=bucket, Key=s3_key, Body=self.scheduler.throttled(file_path.read_bytes()), **self._extra_args(sha256))
+                self.scheduler.record(size)
+
+            self.scheduler.submit(priority, put).result()
+            stats.parts = 1
+        else:
+            part_size = max(self.part_size, math.ceil(size / MAX_PARTS))
+            offsets = list(range(0, size, part_size))
+            stats.parts = len(offsets)
+            state_path = self._get_state_path(s3_key)
+            state = None if state_path is None else self._resume(state_path, s3_key, size, sha256, part_size, resume)
+            if state is None:
+                upload_id = client.create_multipart_upload(Bucket=bucket, Key=s3_key, **self._extra_args(sha256))["UploadId"]
+                state = {"format": UPLOAD_STATE_FORMAT_VERSION, "bucket": bucket, "key": s3_key, "size": size, "sha256": sha256, "part_size": part_size, "upload_id": upload_id, "parts": {}}
+            else:
+                upload_id = state["upload_id"]
+                stats.resumed_parts = len(state["parts"])
+                log.info(f"resuming upload of {s3_key} ({stats.resumed_parts} of {len(offsets)} parts already uploaded)")
+            if state_path is not None:
+                state_path.parent.mkdir(parents=True, exist_ok=True)
+                _write_state(state_path, state)
+            completed_parts: Dict[int, str] = {int(part_number): etag for part_number, etag in state["parts"].items()}
+            uploaded = sum(min(part_size, size - offsets[part_number - 1]) for part_number in completed_parts)
+            uploaded_lock = threading.Lock()
+
+            def upload_part(part_number: int, offset: int) -> Dict[str, Union[str, int]]:
+                nonlocal uploaded
+                part_bytes = _read_part(file_path, offset, part_size)
+                response = client.upload_part(Bucket=bucket, Key=s3_key, UploadId=upload_id, PartNumber=part_number, Body=self.scheduler.throttled(part_bytes))
+                self.scheduler.record(len(part_bytes))
+                with uploaded_lock:
+                    uploaded += len(part_bytes)
+                    uploaded_so_far = uploaded
+                    if state_path is not None:
+                        state["parts"][str(part_number)] = response["ETag"]
+                        _write_state(state_path, state)
+                log.debug(f"{s3_key} : part {part_number}/{len(offsets)}, {uploaded_so_far / 1e6:.1f}/{size / 1e6:.1f} MB ({uploaded_so_far / 1e6 / (time.monotonic() - start):.1f} MB/s)")
+                if progress is not None:
+                    progress(uploaded_so_far, size)
+                return {"ETag": response["ETag"], "PartNumber": part_number}
+
+            futures = [self.scheduler.submit(priority, upload_part, part_number, offset) for part_number, offset in enumerate(offsets, start=1) if part_number not in completed_parts]
+            try:
+                parts: List[Dict[str, Union[str, int]]] = [{"ETag": etag, "PartNumber": part_number} for part_number, etag in completed_parts.items()]
+                parts.extend(future.result() for future in futures)
+                parts.sort(key=lambda part: part["PartNumber"])
+                client.complete_multipart_upload(Bucket=bucket, Key=s3_key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                wait(futures)  # for the parts already being uploaded
+                if state_path is None:
+                    client.abort_multipart_upload(Bucket=bucket, Key=s3_key, UploadId=upload_id)
+                else:
+                    log.warning(f"upload of {s3_key} failed - {len(state['parts'])} of {len(offsets)} parts uploaded, the rest will be uploaded when it is resumed")
+                raise
+            if state_path is not None:
+                state_path.unlink(missing_ok=True)
+        stats.seconds = time.monotonic() - start
+        log.info(f"uploaded {stats}")
+        return stats
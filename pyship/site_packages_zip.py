@@ -0,0 +1,179 @@
+"""
+Pack pure-Python distributions from a CLIP's site-packages into a zip on sys.path.
+
+A CLIP is thousands of small files, which dominates NSIS install time, antivirus
+scan time and ``.clip`` zipping time. :func:`pack_site_packages` moves every
+distribution without native extensions (per its ``RECORD``) into a single
+stored (uncompressed) zip, :data:`SITE_PACKAGES_ZIP_NAME`, that Python imports
+from with zipimport, and adds the zip to the CLIP's ``._pth`` file. The
+``.dist-info`` directories go into the zip too, so ``importlib.metadata`` still
+finds them.
+
+zipimport can't write ``.pyc`` files, so each module's ``__pycache__`` bytecode
+(see :mod:`pyship.bytecode`) is packed as a legacy ``.pyc`` next to its source.
+Without it, modules are compiled from source on every launch.
+
+Code that reads its data files with ``open()`` relative to ``__file__`` does not
+work from a zip (``importlib.resources`` does) - exclude such distributions.
+"""
+
+import csv
+import fnmatch
+import os
+import re
+import sys
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Union
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, pyship_print
+
+log = get_logger(__application_name__)
+
+SITE_PACKAGES_ZIP_NAME = "site-packages.zip"  # in the CLIP's Lib dir, next to site-packages
+NATIVE_SUFFIXES = (".pyd", ".dll", ".so", ".dylib")
+DEFAULT_ZIP_EXCLUDE = ("pip", "setuptools")  # use __file__ relative paths
+
+_NOT_PACKED_SUFFIXES = (".pth",)  # only processed in site-packages directories
+
+
+@dataclass
+class Distribution:
+    """An installed distribution and its files in site-packages (POSIX style paths relative to site-packages)."""
+
+    name: str
+    dist_info_dir: Path
+    files: List[str] = field(default_factory=list)
+
+    @property
+    def is_pure(self) -> bool:
+        return not any(file.lower().endswith(NATIVE_SUFFIXES) for file in self.files)
+
+
+@dataclass
+class PackStats:
+    """Distributions and files moved into the site-packages zip."""
+
+    distributions: int = 0
+    files: int = 0
+    bytes: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.distributions} distributions ({self.files} files, {self.bytes / 1e6:.1f} MB)"
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+def _clip_cache_tag(clip_dir: Path) -> str:
+    """The CLIP interpreter's bytecode cache tag (e.g. cpython-312), from its DLL's name."""
+    for python_dll in clip_dir.glob("python3*.dll"):
+        if python_dll.stem != "python3":
+            return f"c{python_dll.stem[:6]}-{python_dll.stem[6:]}"
+    return sys.implementation.cache_tag
+
+
+@typechecked
+def get_distributions(site_packages_dir: Path) -> List[Distribution]:
+    """
+    Get the distributions installed in a site-packages dir, from their ``.dist-info/RECORD`` files.
+
+    :param site_packages_dir: site-packages dir
+    :return: distributions (those without a RECORD are left out)
+    """
+    distributions = []
+    for dist_info_dir in sorted(site_packages_dir.glob("*.dist-info")):
+        record_path = Path(dist_info_dir, "RECORD")
+        if not record_path.is_file():
+            log.info(f"{dist_info_dir} has no RECORD")
+            continue
+        with record_path.open(newline="", encoding="utf-8") as record_file:
+            files = [row[0].replace("\\", "/") for row in csv.reader(record_file) if len(row) > 0]
+        # files outside site-packages (e.g. ../../Scripts/x.exe) are not packed
+        files = [file for file in files if not file.startswith("../")]
+        # sources replaced by sourceless .pyc files (see pyship.bytecode)
+        files = [f"{file[:-3]}.pyc" if file.endswith(".py") and not Path(site_packages_dir, file).exists() else file for file in files]
+        files = [file for file in files if Path(site_packages_dir, file).is_file()]
+        distributions.append(Distribution(dist_info_dir.name.split("-")[0], dist_info_dir, files))
+    return distributions
+
+
+@typechecked
+def add_pth_entry(clip_dir: Path, entry: str, after: str = "Lib\\site-packages"):
+    """
+    Add a sys.path entry to a CLIP's ``._pth`` file (if it isn't there already).
+
+    :param clip_dir: CLIP dir
+    :param entry: entry to add (relative to the CLIP dir, Windows style)
+    :param after: existing entry to add it after (appended if not found)
+    """
+    for pth_path in clip_dir.glob("*._pth"):
+        entries = pth_path.read_text(encoding="utf-8").splitlines()
+        if entry not in entries:
+            entries.insert(entries.index(after) + 1 if after in entries else len(entries), entry)
+            pth_path.write_text("\n".join(entries) + "\n", encoding="utf-8")
+            log.info(f"added {entry} to {pth_path}")
+
+
+@typechecked
+def pack_site_packages(clip_dir: Path, exclude: Union[List[str], None] = None) -> PackStats:
+    """
+    Move the pure-Python distributions in a CLIP's site-packages into a stored zip on sys.path.
+
+    :param clip_dir: CLIP dir
+    :param exclude: distribution name globs to leave in site-packages (in addition to DEFAULT_ZIP_EXCLUDE)
+    :return: what was packed
+    """
+    site_packages_dir = Path(clip_dir, "Lib", "site-packages")
+    zip_path = Path(clip_dir, "Lib", SITE_PACKAGES_ZIP_NAME)
+    excludes = [_normalize(name) for name in [*DEFAULT_ZIP_EXCLUDE, *([] if exclude is None else exclude)]]
+    cache_tag = _clip_cache_tag(clip_dir)
+
+    pack_stats = PackStats()
+    packed = []
+    stale = set()  # __pycache__ files of packed modules
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zip_file:
+        for distribution in get_distributions(site_packages_dir):
+            if not distribution.is_pure or any(fnmatch.fnmatch(_normalize(distribution.name), name) for name in excludes):
+                log.info(f"not packing {distribution.name} ({distribution.is_pure=})")
+                continue
+            pack_stats.distributions += 1
+            for file in sorted(distribution.files):
+                file_path = Path(site_packages_dir, file)
+                if file_path.suffix in _NOT_PACKED_SUFFIXES:
+                    continue
+                if "__pycache__" in file_path.parts:
+                    stale.add(file_path)
+                    continue
+                zip_file.write(file_path, file)
+                packed.append(file_path)
+                if file_path.suffix == ".py":
+                    pyc_path = Path(file_path.parent, "__pycache__", f"{file_path.stem}.{cache_tag}.pyc")
+                    if pyc_path.is_file():
+                        zip_file.write(pyc_path, f"{file[:-3]}.pyc")  # legacy location - zipimport ignores __pycache__
+                        stale.add(pyc_path)
+
+    if pack_stats.distributions == 0:
+        zip_path.unlink()
+        return pack_stats
+
+    for file_path in packed:
+        pack_stats.bytes += file_path.stat().st_size
+        pack_stats.files += 1
+        file_path.unlink()
+    for file_path in stale:
+        file_path.unlink(missing_ok=True)
+    # remove the directories left empty
+    for dir_path, _, _ in sorted(os.walk(site_packages_dir), key=lambda walked: len(walked[0]), reverse=True):
+        if dir_path != str(site_packages_dir) and len(os.listdir(dir_path)) == 0:
+            os.rmdir(dir_path)
+
+    add_pth_entry(clip_dir, f"Lib\\{SITE_PACKAGES_ZIP_NAME}")
+    log.info(f"packed {pack_stats} into {zip_path}")
+    pyship_print(f"packed {pack_stats} from site-packages into {SITE_PACKAGES_ZIP_NAME}")
+    return pack_stats
@@ -0,0 +1,117 @@
+"""
+Stage graph scheduler used by :meth:`PyShip.ship`.
+
+Each :class:`Stage` declares the stages whose outputs it consumes (its inputs) and
+produces one output (its return value). :func:`run_stages` runs every stage on a
+worker pool as soon as all of its inputs are available, so independent stages
+(e.g. the launcher build and the CLIP creation) overlap and a ship run takes
+roughly as long as its longest branch.
+
+The first stage to fail aborts the run: no further stages are started, stages
+that are already running are allowed to finish, and the failure is re-raised.
+"""
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__
+
+log = get_logger(__application_name__)
+
+
+@dataclass
+class Stage:
+    """
+    One node of the stage graph.
+
+    ``function`` is called with the outputs of the ``inputs`` stages as keyword
+    arguments (keyed by stage name), and its return value is this stage's output.
+    """
+
+    name: str
+    function: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+
+
+@typechecked
+def check_stage_graph(stages: List[Stage]):
+    """
+    Validate a stage graph: unique names, known inputs and no cycles.
+
+    :param stages: stages to validate
+    :raises ValueError: if the graph is malformed
+    """
+    names = [stage.name for stage in stages]
+    if len(names) != len(set(names)):
+        raise ValueError(f"duplicate stage names: {names}")
+    for stage in stages:
+        for input_name in stage.inputs:
+            if input_name not in names:
+                raise ValueError(f'stage "{stage.name}" has unknown input "{input_name}"')
+
+    # Kahn's algorithm - any stage never reaching zero unresolved inputs is on a cycle
+    resolved = set()
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(input_name in resolved for input_name in stage.inputs)]
+        if len(ready) == 0:
+            raise ValueError(f"stage graph has a cycle: {[stage.name for stage in remaining]}")
+        resolved.update(stage.name for stage in ready)
+        remaining = [stage for stage in remaining if stage.name not in resolved]
+
+
+def _timed(stage: Stage, kwargs: Dict[str, Any]) -> Any:
+    start = time.monotonic()
+    log.info(f'stage "{stage.name}" starting')
+    output = stage.function(**kwargs)
+    log.info(f'stage "{stage.name}" done ({time.monotonic() - start:.1f}s)')
+    return output
+
+
+@typechecked
+def run_stages(stages: List[Stage], max_workers: Union[int, None] = None) -> Dict[str, Any]:
+    """
+    Run a stage graph, starting each stage as soon as its inputs are available.
+
+    :param stages: stages to run
+    :param max_workers: maximum number of concurrently running stages (None for the executor default)
+    :return: dict of stage name to stage output
+    :raises Exception: the first exception raised by any stage
+    """
+    check_stage_graph(stages)
+
+    pending = {stage.name: stage for stage in stages}
+    outputs: Dict[str, Any] = {}
+    failure: Union[Exception, None] = None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pyship_stage") as executor:
+        running: Dict[Future, Stage] = {}
+        while len(pending) > 0 or len(running) > 0:
+            if failure is None:
+                for stage in [stage for stage in pending.values() if all(input_name in outputs for input_name in stage.inputs)]:
+                    del pending[stage.name]
+                    kwargs = {input_name: outputs[input_name] for input_name in stage.inputs}
+                    running[executor.submit(_timed, stage, kwargs)] = stage
+            elif len(pending) > 0:
+                log.info(f"not starting stages {list(pending)} due to earlier failure")
+                pending.clear()
+
+            if len(running) > 0:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        outputs[stage.name] = future.result()
+                    except Exception as e:
+                        log.error(f'stage "{stage.name}" failed: {e}')
+                        if failure is None:
+                            failure = e
+
+    if failure is not None:
+        raise failure
+    return outputs
@@ -0,0 +1,119 @@
+"""
+Import-trace-driven CLIP tree shaking.
+
+``pyship trace`` runs the target app inside its built CLIP under an import and
+file-open tracer (:mod:`pyship.trace_runner`), optionally exercised by a
+user-supplied smoke script, and records every CLIP file it touched in a trace
+file (:data:`TRACE_FILE_NAME` in the project dir, meant to be checked in).
+
+With ``trace_file`` set, ``ship()`` then shakes the CLIP down to the traced
+closure: every file that was not touched is removed, except the interpreter
+itself (:data:`SHAKE_KEEP`) and paths matching the allow-list (the
+``prune_include`` globs) - e.g. plugins or data files the smoke script did not
+exercise.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import List, Set, Union
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, pyship_print, subprocess_run, PyshipTraceFailed
+from pyship.clip_prune import PruneStats, path_matches
+
+log = get_logger(__application_name__)
+
+TRACE_FILE_NAME = "pyship_trace.json"
+TRACE_RUNNER_PATH = Path(Path(__file__).parent, "trace_runner.py")
+
+#: CLIP paths kept regardless of the trace (files at the CLIP's top level - the interpreter, ._pth etc. - are always kept too)
+SHAKE_KEEP = (
+    "*.dll",  # loaded by the OS loader, which the tracer does not see
+    "*.dist-info",  # package metadata (importlib.metadata, entry points)
+    "Lib/site-packages/*.pth",
+    "Lib/encodings",  # codecs are looked up lazily
+)
+
+
+@typechecked
+def run_trace(python_exe: Path, clip_dir: Path, app_module: str, trace_path: Path, smoke_script: Union[Path, None] = None) -> List[str]:
+    """
+    Run the app in a CLIP under the tracer and write the CLIP files it touched to a trace file.
+
+    :param python_exe: the CLIP's Python interpreter
+    :param clip_dir: CLIP dir
+    :param app_module: target app module (run as ``python -m <app_module>`` if there is no smoke script)
+    :param trace_path: trace file to write
+    :param smoke_script: script that exercises the app (run as ``__main__``), or None to run the app module
+    :return: POSIX style paths relative to the CLIP dir of the traced files
+    """
+    raw_trace_path = trace_path.with_name(f"{trace_path.name}.raw")
+    raw_trace_path.unlink(missing_ok=True)
+    cmd = [str(python_exe), str(TRACE_RUNNER_PATH), str(raw_trace_path), app_module]
+    if smoke_script is not None:
+        cmd.append(str(smoke_script.absolute()))
+    pyship_print(f"tracing {app_module} in {clip_dir.name}" + ("" if smoke_script is None else f' with "{smoke_script}"'))
+    return_code, _, _ = subprocess_run(cmd, cwd=clip_dir, mute_output=False)
+    if not raw_trace_path.exists():
+        raise PyshipTraceFailed(f"trace of {app_module} produced no trace file ({return_code=})")
+    if return_code != 0:
+        log.warning(f"traced run of {app_module} exited with {return_code=}")
+
+    raw_trace = json.loads(raw_trace_path.read_text(encoding="utf-8"))
+    raw_trace_path.unlink()
+    clip_root = os.path.normcase(os.path.abspath(clip_dir))
+    traced = set()
+    for file_path in raw_trace["files"]:
+        normalized = os.path.normcase(os.path.abspath(file_path))
+        if normalized.startswith(clip_root + os.sep) and os.path.isfile(file_path):
+            traced.add(Path(os.path.relpath(file_path, clip_dir)).as_posix())
+    files = sorted(traced)
+    trace_path.write_text(json.dumps({"app": app_module, "files": files}, indent=2), encoding="utf-8")
+    pyship_print(f'traced {len(files)} CLIP files to "{trace_path}"')
+    return files
+
+
+@typechecked
+def read_trace(trace_path: Path) -> Set[str]:
+    """
+    Read a trace file written by :func:`run_trace`.
+
+    :param trace_path: trace file
+    :return: traced paths, lower case (CLIP paths are case-insensitive)
+    """
+    return {file_path.lower() for file_path in json.loads(trace_path.read_text(encoding="utf-8"))["files"]}
+
+
+@typechecked
+def shake_clip(clip_dir: Path, trace_path: Path, allow: Union[List[str], None] = None) -> PruneStats:
+    """
+    Remove every CLIP file the trace did not touch.
+
+    :param clip_dir: CLIP dir
+    :param trace_path: trace file written by ``pyship trace``
+    :param allow: globs of CLIP paths to keep even if not traced
+    :return: what was removed
+    """
+    traced = read_trace(trace_path)
+    keep = [*SHAKE_KEEP, *([] if allow is None else allow)]
+    prune_stats = PruneStats()
+    for dir_path, dir_names, file_names in os.walk(clip_dir, topdown=False):
+        relative_dir = Path(dir_path).relative_to(clip_dir).as_posix()
+        if relative_dir == ".":
+            continue  # top level files are the interpreter itself
+        for file_name in file_names:
+            relative_path = f"{relative_dir}/{file_name}"
+            if relative_path.lower() not in traced and not path_matches(relative_path, keep):
+                file_path = Path(dir_path, file_name)
+                prune_stats.bytes += file_path.stat().st_size
+                prune_stats.files += 1
+                file_path.unlink()
+        if len(os.listdir(dir_path)) == 0:
+            os.rmdir(dir_path)
+
+    log.info(f"shook {clip_dir} with {trace_path} ({allow=}) : {prune_stats}")
+    pyship_print(f"tree shaking removed {prune_stats} from {clip_dir.name}")
+    return prune_stats
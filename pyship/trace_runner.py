@@ -0,0 +1,59 @@
+"""
+Run by ``pyship trace`` with a CLIP's own interpreter: runs the target app (or a
+smoke script that exercises it) under an audit hook that records every module
+imported and every file opened, and writes the list of touched files as JSON on
+exit.
+
+This file is run as a script, not imported - it must only use the stdlib.
+
+usage: python trace_runner.py <trace output path> <app module> [<smoke script> [args ...]]
+"""
+
+import atexit
+import json
+import os
+import runpy
+import sys
+
+_touched = set()
+
+
+def _record(path):
+    if isinstance(path, bytes):
+        path = os.fsdecode(path)
+    if isinstance(path, str) and len(path) > 0:  # skip file descriptors
+        _touched.add(os.path.abspath(path))
+
+
+def _audit_hook(event, args):
+    if event == "open" or event == "ctypes.dlopen":
+        _record(args[0])
+    elif event == "import" and len(args) > 1:
+        _record(args[1])  # module file name, when the importer provides it
+
+
+def _write_trace(trace_path, app_module):
+    # modules imported before the hook was installed (site, encodings, ...) and extension modules
+    for module in list(sys.modules.values()):
+        _record(getattr(module, "__file__", None))
+    trace = {"app": app_module, "executable": sys.executable, "files": sorted(_touched)}
+    with open(trace_path, "w", encoding="utf-8") as trace_file:
+        json.dump(trace, trace_file, indent=2)
+
+
+def main():
+    trace_path, app_module = sys.argv[1], sys.argv[2]
+    trace_path = os.path.abspath(trace_path)
+    atexit.register(_write_trace, trace_path, app_module)
+    sys.addaudithook(_audit_hook)
+    if len(sys.argv) > 3:
+        smoke_script = sys.argv[3]
+        sys.argv = sys.argv[3:]
+        runpy.run_path(smoke_script, run_name="__main__")
+    else:
+        sys.argv = [app_module]
+        runpy.run_module(app_module, run_name="__main__", alter_sys=True)  # as the launcher does with python -m <app>
+
+
+if __name__ == "__main__":
+    main()
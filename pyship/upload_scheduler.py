@@ -0,0 +1,245 @@
+"""
+Bandwidth-shaped, prioritised scheduling of upload work.
+
+Build agents often share their uplink with other jobs. :class:`UploadScheduler`
+runs the upload work (multipart upload parts) of all of a session's uploads:
+
+- by priority, then in submission order - the ``.clip`` (and its patches and
+  chunk manifest), which updaters download, goes first and the installer second
+  (see :func:`get_upload_priority`)
+- within an optional global bytes per second cap, shared by everything it
+  uploads - the request bodies are read through a token bucket, so the cap holds
+  for the bytes actually sent, not just on average per part
+- with adaptive concurrency: every :data:`ADAPT_INTERVAL` seconds the throughput
+  of the last interval is compared with the one before, and the number of work
+  items running at the same time (between 1 and the maximum) is changed again in
+  the same direction if the last change improved it, lowered if it made no
+  difference and changed back if it made it worse. Under a bandwidth cap, or when
+  the uplink is saturated, concurrency settles around the lowest level that gets
+  the throughput, rather than opening more connections.
+
+The throughput and concurrency changes are logged.
+"""
+
+import heapq
+import io
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, List, Tuple, Union
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, CLIP_EXT
+
+log = get_logger(__application_name__)
+
+PRIORITY_CLIP = 0  # .clip, .clippatch and .clipchunks - what updaters download
+PRIORITY_INSTALLER = 1
+PRIORITY_OTHER = 2
+
+ADAPT_INTERVAL = 2.0  # seconds of throughput per concurrency adjustment
+ADAPT_IMPROVEMENT = 1.1  # throughput ratio that counts as an improvement
+THROTTLE_READ_SIZE = 256 * 1024  # bytes sent per token bucket check
+
+
+@typechecked
+def get_upload_priority(file_name: str) -> int:
+    """
+    :param file_name: uploaded file name (or S3 key)
+    :return: upload priority - lower goes first
+    """
+    suffix = Path(file_name).suffix.lower()
+    if suffix.startswith(f".{CLIP_EXT}"):
+        return PRIORITY_CLIP
+    if suffix in (".exe", ".msix"):
+        return PRIORITY_INSTALLER
+    return PRIORITY_OTHER
+
+
+class TokenBucket:
+    """
+    Limits a rate (e.g. bytes per second), shared between threads.
+    """
+
+    def __init__(self, rate: float, burst: Union[float, None] = None):
+        """
+        :param rate: tokens per second
+        :param burst: most tokens that can be saved up while idle (default one second's worth)
+        """
+        if rate <= 0:
+            raise ValueError(f"rate must be positive ({rate=})")
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float):
+        """
+        Take tokens, waiting for as long as taking them puts the bucket in debt.
+
+        :param tokens: number of tokens
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            delay = -self._tokens / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _ThrottledReader(io.RawIOBase):
+    # a request body whose reads are paced by a token bucket (seekable, so botocore can size and retry it)
+
+    def __init__(self, data: bytes, token_bucket: TokenBucket):
+        super().__init__()
+        self._data = io.BytesIO(data)
+        self._token_bucket = token_bucket
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._data.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._data.tell()
+
+    def read(self, size: Union[int, None] = -1) -> bytes:
+        size = THROTTLE_READ_SIZE if size is None or size < 0 else min(size, THROTTLE_READ_SIZE)
+        data = self._data.read(size)
+        self._token_bucket.acquire(len(data))
+        return data
+
+    def readinto(self, buffer: Any) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+class UploadScheduler:
+    """
+    Runs upload work on a pool of threads, by priority, within a bandwidth cap and with adaptive concurrency.
+    """
+
+    @typechecked
+    def __init__(self, max_concurrency: int, bytes_per_second: Union[int, None] = None, adaptive: bool = True):
+        """
+        :param max_concurrency: most work items run at the same time
+        :param bytes_per_second: bandwidth cap over everything uploaded (None for no cap)
+        :param adaptive: adapt the concurrency (up to max_concurrency) to the observed throughput - otherwise always max_concurrency
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1 ({max_concurrency=})")
+        if bytes_per_second is not None and bytes_per_second < 1:
+            raise ValueError(f"bandwidth must be at least 1 byte per second ({bytes_per_second=})")
+        self.max_concurrency = max_concurrency
+        self.adaptive = adaptive
+        self.concurrency = max(1, max_concurrency // 2) if adaptive else max_concurrency  # room to probe both ways
+        self.token_bucket = None if bytes_per_second is None else TokenBucket(bytes_per_second, max(bytes_per_second, THROTTLE_READ_SIZE))
+        self.concurrency_history: List[Tuple[int, float]] = []  # concurrency and the throughput (bytes/s) that made it change
+        self._queue: List[Tuple[int, int, Future, Callable[..., Any], Tuple[Any, ...]]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = 0
+        self._shutdown = False
+        self._interval_start = time.monotonic()
+        self._interval_bytes = 0
+        self._previous_throughput: Union[float, None] = None
+        self._direction = 1
+        self._threads = [threading.Thread(target=self._work, name=f"pyship_upload_{index}", daemon=True) for index in range(max_concurrency)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, priority: int, function: Callable[..., Any], *args: Any) -> Future:
+        """
+        Schedule work.
+
+        :param priority: priority - lower runs first (see get_upload_priority)
+        :param function: work
+        :param args: work's arguments
+        :return: future of the work's result
+        """
+        future: Future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("upload scheduler is shut down")
+            heapq.heappush(self._queue, (priority, next(self._sequence), future, function, args))
+            self._condition.notify()
+        return future
+
+    def throttled(self, data: bytes) -> Union[bytes, io.RawIOBase]:
+        """
+        :param data: request body
+        :return: the body, read within the bandwidth cap
+        """
+        return data if self.token_bucket is None else _ThrottledReader(data, self.token_bucket)
+
+    def record(self, byte_count: int):
+        """
+        Record uploaded bytes, for the throughput that the concurrency adapts to.
+
+        :param byte_count: bytes uploaded
+        """
+        with self._condition:
+            self._interval_bytes += byte_count
+            now = time.monotonic()
+            if (elapsed := now - self._interval_start) < ADAPT_INTERVAL:
+                return
+            throughput = self._interval_bytes / elapsed
+            self._interval_start = now
+            self._interval_bytes = 0
+            if self.adaptive:
+                # hill climbing - keep going while the throughput improves, and prefer fewer connections for the same throughput
+                if self._previous_throughput is None or throughput > self._previous_throughput * ADAPT_IMPROVEMENT:
+                    pass
+                elif throughput * ADAPT_IMPROVEMENT < self._previous_throughput:
+                    self._direction = -self._direction  # worse - undo the last change
+                else:
+                    self._direction = -1
+                concurrency = min(self.max_concurrency, max(1, self.concurrency + self._direction))
+                if concurrency != self.concurrency:
+                    log.info(f"upload concurrency {self.concurrency} -> {concurrency} ({throughput / 1e6:.1f} MB/s)")
+                    self.concurrency_history.append((self.concurrency, throughput))
+                    self.concurrency = concurrency
+                    self._condition.notify_all()
+            else:
+                log.info(f"upload throughput {throughput / 1e6:.1f} MB/s")
+            self._previous_throughput = throughput
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not (self._shutdown and len(self._queue) == 0) and (len(self._queue) == 0 or self._running >= self.concurrency):
+                    self._condition.wait()
+                if len(self._queue) == 0:
+                    return  # shut down
+                _, _, future, function, args = heapq.heappop(self._queue)
+                self._running += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(function(*args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._condition:
+                    self._running -= 1
+                    self._condition.notify_all()
+
+    def shutdown(self):
+        """Run the scheduled work and stop the threads."""
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
@@ -3,17 +3,23 @@ uv helpers: bootstrap the uv binary, install/copy standalone Python,
 install packages with ``uv pip``, and build wheels with ``uv build``.
 """
 
+import hashlib
+import json
+import os
 import platform
 import shutil
 import subprocess
 import time
 import zipfile
 from pathlib import Path
+from typing import Dict, List, Union
 
 from typeguard import typechecked
 from balsa import get_logger
 
 from pyship import __application_name__, pyship_print
+from pyship.copy_engine import copy_tree
+from pyship.clip_template import get_clip_template, materialise_clip_template, patch_standalone_python, write_pyvenv_cfg
 
 log = get_logger(__application_name__)
 
@@ -87,108 +93,185 @@ def find_or_bootstrap_uv(cache_dir: Path) -> Path:
     return uv_exe
 
 
+VERIFIED_PYTHONS_FILE_NAME = "verified_pythons.json"  # in the cache dir
+
+_uv_versions: Dict[Path, str] = {}  # memoized per uv binary
+_uv_python_dirs: Dict[Path, Path] = {}  # memoized per uv binary
+
+
+@typechecked
+def uv_version(uv_path: Path) -> str:
+    """
+    Get the version of a uv binary (e.g. "uv 0.9.2"). Memoized per process.
+    :param uv_path: path to uv executable
+    :return: uv version string
+    """
+    if (version := _uv_versions.get(uv_path)) is None:
+        result = subprocess.run([str(uv_path), "--version"], check=True, capture_output=True, text=True)
+        version = result.stdout.strip()
+        log.info(f"{version=}")
+        _uv_versions[uv_path] = version
+    return version
+
+
+@typechecked
+def uv_python_dir(uv_path: Path) -> Path:
+    """
+    Get the directory uv keeps its managed Python installations in. Memoized per process.
+    Uses uv python dir to locate the managed installations directly,
+    avoiding uv python find which may return a venv Python when running inside a venv.
+    :param uv_path: path to uv executable
+    :return: uv's managed Python directory (may not exist yet)
+    """
+    if (python_dir := _uv_python_dirs.get(uv_path)) is None:
+        result = subprocess.run([str(uv_path), "python", "dir"], check=True, capture_output=True, text=True)
+        python_dir = Path(result.stdout.strip())
+        log.info(f"uv python dir -> {python_dir}")
+        _uv_python_dirs[uv_path] = python_dir
+    return python_dir
+
+
+@typechecked
+def find_managed_python(managed_python_dir: Path, python_version: str) -> Union[Path, None]:
+    """
+    Find a uv-managed Python installation matching a version.
+    :param managed_python_dir: uv's managed Python directory (see uv_python_dir())
+    :param python_version: Python version string (e.g. "3.12" or "3.12.4")
+    :return: path to the installation's python.exe, or None if there is no match
+    """
+    # Look for a directory matching the requested version (e.g. cpython-3.14* or cpython-3.14.2*)
+    if managed_python_dir.is_dir():
+        for candidate in sorted(managed_python_dir.iterdir(), reverse=True):
+            if candidate.is_dir() and candidate.name.startswith(f"cpython-{python_version}"):
+                python_exe = Path(candidate, "python.exe")
+                if python_exe.exists():
+                    return python_exe
+    return None
+
+
 @typechecked
 def uv_python_install(uv_path: Path, python_version: str) -> Path:
     """
-    Install a Python version via uv and return its path.
-    Uses uv python dir to locate the managed installation directly,
-    avoiding uv python find which may return a venv Python.
+    Install a Python version via uv (unless a matching managed installation already exists) and return its path.
     :param uv_path: path to uv executable
     :param python_version: Python version string (e.g. "3.12.4")
     :return: path to the installed Python interpreter
     """
-    pyship_print(f"installing Python {python_version} via uv")
-    subprocess.run([str(uv_path), "python", "install", python_version], check=True, capture_output=True, text=True)
+    managed_python_dir = uv_python_dir(uv_path)
+    if (python_exe := find_managed_python(managed_python_dir, python_version)) is None:
+        pyship_print(f"installing Python {python_version} via uv")
+        subprocess.run([str(uv_path), "python", "install", python_version], check=True, capture_output=True, text=True)
+        if (python_exe := find_managed_python(managed_python_dir, python_version)) is None:
+            raise FileNotFoundError(f"no managed Python {python_version} found in {managed_python_dir}")
 
-    # Use uv python dir to find managed installations directly.
-    # uv python find can return a venv Python when running inside a venv.
-    result = subprocess.run([str(uv_path), "python", "dir"], check=True, capture_output=True, text=True)
-    uv_python_dir = Path(result.stdout.strip())
-    log.info(f"uv python dir -> {uv_python_dir}")
+    log.info(f"found managed Python {python_version} -> {python_exe}")
+    return python_exe
 
-    # Look for a directory matching the requested version (e.g. cpython-3.14* or cpython-3.14.2*)
-    best_match = None
-    for candidate in sorted(uv_python_dir.iterdir(), reverse=True):
-        if candidate.is_dir() and candidate.name.startswith(f"cpython-{python_version}"):
-            python_exe = Path(candidate, "python.exe")
-            if python_exe.exists():
-                best_match = python_exe
-                break
 
-    if best_match is None:
-        raise FileNotFoundError(f"no managed Python {python_version} found in {uv_python_dir}")
+@typechecked
+def get_dir_listing_hash(dir_path: Path) -> str:
+    """
+    Hash a directory's listing (relative paths, sizes and modification times) - a cheap stand-in for a content hash
+    that changes whenever a file is added, removed or rewritten.
+    :param dir_path: directory to hash
+    :return: SHA-256 hex digest
+    """
+    hash_object = hashlib.sha256()
+    for file_path in sorted(p for p in dir_path.rglob("*") if p.is_file()):
+        stat = file_path.stat()
+        hash_object.update(f"{file_path.relative_to(dir_path).as_posix()}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return hash_object.hexdigest()
+
+
+def _load_verified_pythons(cache_dir: Path) -> Dict[str, str]:
+    verified_path = Path(cache_dir, VERIFIED_PYTHONS_FILE_NAME)
+    try:
+        return json.loads(verified_path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
 
-    log.info(f"found managed Python {python_version} -> {best_match}")
-    return best_match
+def _store_verified_python(cache_dir: Path, verification_key: str, python_version_string: str):
+    verified_pythons = _load_verified_pythons(cache_dir)
+    verified_pythons[verification_key] = python_version_string
+    verified_path = Path(cache_dir, VERIFIED_PYTHONS_FILE_NAME)
+    temp_path = verified_path.with_suffix(f".{os.getpid()}.tmp")
+    temp_path.write_text(json.dumps(verified_pythons, indent=4))
+    temp_path.replace(verified_path)
 
 
 @typechecked
-def copy_standalone_python(uv_path: Path, python_version: str, dest_dir: Path) -> Path:
+def copy_standalone_python(uv_path: Path, python_version: str, dest_dir: Path, cache_dir: Union[Path, None] = None) -> Path:
     """
     Copy a full standalone Python installation into dest_dir.
     Uses uv python install to ensure the Python is available, then copies the
     entire installation directory so the CLIP has no dependency on the base Python path.
+    With a cache_dir, the copy is materialised (mostly via hardlinks) from a patched
+    base CLIP template kept in the cache dir instead of a full copy of the install.
     :param uv_path: path to uv executable
     :param python_version: Python version string (e.g. "3.12")
     :param dest_dir: destination directory to copy the Python installation into
+    :param cache_dir: pyship cache dir holding the base CLIP templates (None to copy the install directly)
     :return: path to python.exe inside dest_dir
     """
     python_path = uv_python_install(uv_path, python_version)
     python_install_dir = python_path.parent  # standalone Python has python.exe at root
 
-    pyship_print(f'copying standalone Python from "{python_install_dir}" to "{dest_dir}"')
-    if dest_dir.exists():
-        shutil.rmtree(dest_dir)
-    shutil.copytree(str(python_install_dir), str(dest_dir))
-
-    # Remove EXTERNALLY-MANAGED marker so uv pip install works
-    externally_managed = Path(dest_dir, "Lib", "EXTERNALLY-MANAGED")
-    if externally_managed.exists():
-        externally_managed.unlink()
-        log.info(f"removed {externally_managed}")
+    if cache_dir is None:
+        pyship_print(f'copying standalone Python from "{python_install_dir}" to "{dest_dir}"')
+        if dest_dir.exists():
+            shutil.rmtree(dest_dir)
+        copy_stats = copy_tree(python_install_dir, dest_dir)
+        patch_standalone_python(dest_dir)
+    else:
+        template_dir = get_clip_template(python_install_dir, cache_dir)
+        pyship_print(f'materialising standalone Python from "{template_dir}" to "{dest_dir}"')
+        copy_stats = materialise_clip_template(template_dir, dest_dir)
+    pyship_print(f"standalone Python: {copy_stats}")
 
     dest_python = Path(dest_dir, "python.exe")
     if not dest_python.exists():
         raise FileNotFoundError(f"python.exe not found at {dest_python} after copying standalone Python")
 
-    # Create pyvenv.cfg so the interpreter can locate its environment.
-    # Python 3.14+ may fail with "failed to locate pyvenv.cfg" (exit 106) without this.
-    pyvenv_cfg = Path(dest_dir, "pyvenv.cfg")
-    if not pyvenv_cfg.exists():
-        abs_dest = str(dest_dir.resolve())
-        pyvenv_cfg.write_text(f"home = {abs_dest}\ninclude-system-site-packages = false\n", encoding="utf-8")
-        log.info(f"created {pyvenv_cfg}")
-
-    # Create a ._pth file so Python uses isolated path mode.
-    # This takes precedence over pyvenv.cfg during initialization, setting up
-    # sys.path directly and skipping site.py (which would emit RuntimeWarnings
-    # about unexpected sys.prefix when pyvenv.cfg is present).
-    pth_pattern = "python3*._pth"
-    existing_pth = list(dest_dir.glob(pth_pattern))
-    if not existing_pth:
-        python_dlls = list(dest_dir.glob("python3*.dll"))
-        python_dlls = [d for d in python_dlls if d.stem != "python3"]  # exclude python3.dll
-        if python_dlls:
-            pth_name = python_dlls[0].stem + "._pth"
-        else:
-            pth_name = "python._pth"
-        pth_path = Path(dest_dir, pth_name)
-        pth_path.write_text(".\nLib\nLib\\site-packages\nDLLs\n", encoding="utf-8")
-        log.info(f"created {pth_path}")
-
-    # Verify the copied Python interpreter actually works
-    verify_result = subprocess.run([str(dest_python), "-c", "import sys; print(sys.version)"], capture_output=True, text=True, timeout=30)
-    if verify_result.returncode != 0:
-        log.error(f'copied Python at "{dest_python}" failed verification (exit {verify_result.returncode}): {verify_result.stderr}')
-        raise RuntimeError(f"copied Python interpreter at {dest_python} does not work (exit code {verify_result.returncode}): {verify_result.stderr}")
-    log.info(f"copied Python verified: {verify_result.stdout.strip()}")
+    write_pyvenv_cfg(dest_dir)
+
+    # A CLIP materialised from a template that has already produced a working interpreter (with the same uv) is trusted
+    # until the template's contents change, which saves spawning (and cold starting) the interpreter on every build.
+    verified = False
+    verification_key = None
+    if cache_dir is not None:
+        verification_key = f"{get_dir_listing_hash(template_dir)}:{uv_version(uv_path)}"
+        if (verified_version := _load_verified_pythons(cache_dir).get(verification_key)) is not None:
+            log.info(f"copied Python previously verified: {verified_version}")
+            verified = True
+
+    if not verified:
+        # Verify the copied Python interpreter actually works
+        verify_result = subprocess.run([str(dest_python), "-c", "import sys; print(sys.version)"], capture_output=True, text=True, timeout=30)
+        if verify_result.returncode != 0:
+            log.error(f'copied Python at "{dest_python}" failed verification (exit {verify_result.returncode}): {verify_result.stderr}')
+            raise RuntimeError(f"copied Python interpreter at {dest_python} does not work (exit code {verify_result.returncode}): {verify_result.stderr}")
+        log.info(f"copied Python verified: {verify_result.stdout.strip()}")
+        if cache_dir is not None and verification_key is not None:
+            _store_verified_python(cache_dir, verification_key, verify_result.stdout.strip())
 
     log.info(f"standalone Python copied to {dest_dir}")
     return dest_python
 
 
 @typechecked
-def uv_pip_install(uv_path: Path, target_python: Path, packages: list, dist_dir: Path, upgrade: bool = True, system: bool = False) -> None:
+def uv_pip_install(
+    uv_path: Path,
+    target_python: Path,
+    packages: list,
+    dist_dir: Path,
+    upgrade: bool = True,
+    system: bool = False,
+    requirements_file: Union[Path, None] = None,
+    find_links: Union[List[Path], None] = None,
+    offline: bool = False,
+    no_deps: bool = False,
+) -> None:
     """
     Install packages into a Python environment using uv pip.
     :param uv_path: path to uv executable
@@ -197,15 +280,26 @@ def uv_pip_install(uv_path: Path, target_python: Path, packages: list, dist_dir:
     :param dist_dir: directory containing wheels to pass as --find-links
     :param upgrade: whether to pass -U flag
     :param system: whether to pass --system flag (required for non-venv Python installations)
+    :param requirements_file: requirements (e.g. lock) file to install from (-r)
+    :param find_links: additional directories of wheels to pass as --find-links (e.g. a wheelhouse)
+    :param offline: install from the find-links directories only - no index or network access (--no-index --offline)
+    :param no_deps: do not install dependencies (--no-deps)
     """
     cmd = [str(uv_path), "pip", "install", "--python", str(target_python)]
     if system:
         cmd.append("--system")
     if upgrade:
         cmd.append("-U")
+    if offline:
+        cmd.extend(["--no-index", "--offline"])
+    if no_deps:
+        cmd.append("--no-deps")
+    if requirements_file is not None:
+        cmd.extend(["-r", str(requirements_file)])
     cmd.extend(packages)
-    if dist_dir.exists():
-        cmd.extend(["-f", str(dist_dir)])
+    for find_links_dir in [dist_dir, *([] if find_links is None else find_links)]:
+        if find_links_dir.exists():
+            cmd.extend(["-f", str(find_links_dir)])
     log.info(f"uv pip install cmd: {cmd}")
     pyship_print(" ".join(cmd))
     result = subprocess.run(cmd, capture_output=True, text=True)
@@ -221,17 +315,20 @@ def uv_pip_install(uv_path: Path, target_python: Path, packages: list, dist_dir:
 
 
 @typechecked
-def uv_build(uv_path: Path, project_dir: Path, output_dir: Path) -> Path:
+def uv_build(uv_path: Path, project_dir: Path, output_dir: Path, offline: bool = False) -> Path:
     """
     Build a wheel using uv build.
     :param uv_path: path to uv executable
     :param project_dir: project directory containing pyproject.toml
     :param output_dir: directory for the built wheel
+    :param offline: no network access - the build backend must be in uv's cache (--offline)
     :return: path to the built wheel
     """
     pyship_print(f'building wheel via uv in "{project_dir}"')
     output_dir.mkdir(parents=True, exist_ok=True)
     cmd = [str(uv_path), "build", "--wheel", "--out-dir", str(output_dir)]
+    if offline:
+        cmd.append("--offline")
     log.info(f"uv build cmd: {cmd}")
     pyship_print(" ".join(cmd))
     try:
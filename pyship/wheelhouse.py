@@ -0,0 +1,172 @@
+"""
+Lock files and an offline wheelhouse for hermetic, network-free CLIP builds.
+
+``pyship lock`` resolves the target app's full dependency closure once (for the
+CLIP's Windows platform and Python version) with ``uv pip compile`` and writes it,
+with hashes, to a lock file (:data:`LOCK_FILE_NAME`, meant to be checked in).
+
+``pyship wheelhouse`` downloads the locked wheels into a content-addressed store
+in the pyship cache dir (``<cache_dir>/wheelhouse/<sha256>/<wheel>``) and links
+them into a flat per-lock directory (``<cache_dir>/wheelhouse/locks/<lock sha256>/``)
+that uv can use as ``--find-links``. Wheels shared by several locks (or apps)
+are stored once.
+
+With ``offline`` set, CLIP builds install the locked dependencies from the
+wheelhouse with ``--no-index --offline`` and then the app's own wheel without
+dependencies: no network access at all, and the same CLIP every time.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from typeguard import typechecked
+from balsa import get_logger
+
+from pyship import __application_name__, pyship_print, PyshipWheelhouseMissing
+from pyship.launcher import get_file_sha256
+from pyship.copy_engine import copy_file
+
+log = get_logger(__application_name__)
+
+LOCK_FILE_NAME = "pyship-lock.txt"  # in the project dir
+WHEELHOUSE_DIR_NAME = "wheelhouse"  # in the cache dir
+CLIP_PYTHON_PLATFORM = "x86_64-pc-windows-msvc"  # uv's name for the CLIP's platform
+CLIP_WHEEL_PLATFORM = "win_amd64"  # pip's name for it
+
+_WHEELHOUSE_MANIFEST_NAME = "wheelhouse.json"  # written last in a lock's wheelhouse dir - it is incomplete without it
+
+
+@typechecked
+def uv_lock(uv_path: Path, project_dir: Path, python_version: str, lock_path: Path) -> Path:
+    """
+    Resolve the target app's dependency closure for the CLIP's platform and write it, with hashes, to a lock file.
+
+    :param uv_path: path to uv executable
+    :param project_dir: target app project dir (with pyproject.toml)
+    :param python_version: the CLIP's Python version (e.g. "3.12")
+    :param lock_path: lock file to write
+    :return: lock file path
+    """
+    cmd = [str(uv_path), "pip", "compile", "pyproject.toml", "--python-version", python_version, "--python-platform", CLIP_PYTHON_PLATFORM, "--generate-hashes", "--quiet"]
+    cmd.extend(["-o", str(lock_path.absolute())])
+    log.info(f"uv pip compile cmd: {cmd}")
+    pyship_print(" ".join(cmd))
+    subprocess.run(cmd, cwd=str(project_dir), check=True, capture_output=True, text=True)
+    pyship_print(f'wrote "{lock_path}"')
+    return lock_path
+
+
+@typechecked
+def get_requirements_hash(uv_path: Path, project_dir: Path, python_version: str) -> str:
+    """
+    Resolve the target app's dependency closure for the CLIP's platform (as an online CLIP build would now) and hash it.
+
+    :param uv_path: path to uv executable
+    :param project_dir: target app project dir (with pyproject.toml)
+    :param python_version: the CLIP's Python version (e.g. "3.12")
+    :return: SHA-256 of the resolved requirements
+    """
+    cmd = [str(uv_path), "pip", "compile", "pyproject.toml", "--python-version", python_version, "--python-platform", CLIP_PYTHON_PLATFORM, "--no-header", "--quiet"]
+    log.info(f"uv pip compile cmd: {cmd}")
+    result = subprocess.run(cmd, cwd=str(project_dir), check=True, capture_output=True, text=True)
+    return hashlib.sha256(result.stdout.encode()).hexdigest()
+
+
+@typechecked
+def get_wheelhouse_dir(cache_dir: Path, lock_path: Path) -> Path:
+    """
+    Get the wheelhouse dir (a flat directory of wheels, for --find-links) for a lock file.
+
+    :param cache_dir: pyship cache dir
+    :param lock_path: lock file
+    :return: wheelhouse dir (which may not exist yet)
+    """
+    return Path(cache_dir, WHEELHOUSE_DIR_NAME, "locks", get_file_sha256(lock_path))
+
+
+@typechecked
+def is_wheelhouse_complete(wheelhouse_dir: Path) -> bool:
+    """
+    :param wheelhouse_dir: a lock's wheelhouse dir
+    :return: True if all the lock's wheels have been stored in it
+    """
+    return Path(wheelhouse_dir, _WHEELHOUSE_MANIFEST_NAME).exists()
+
+
+@typechecked
+def require_wheelhouse(cache_dir: Path, lock_path: Path) -> Path:
+    """
+    Get the complete wheelhouse dir for a lock file, for an offline build.
+
+    :param cache_dir: pyship cache dir
+    :param lock_path: lock file
+    :return: wheelhouse dir
+    :raises PyshipWheelhouseMissing: if there is no lock file or its wheelhouse hasn't been built
+    """
+    if not lock_path.is_file():
+        raise PyshipWheelhouseMissing(f'no lock file at "{lock_path}" - run "pyship lock" and "pyship wheelhouse" first')
+    wheelhouse_dir = get_wheelhouse_dir(cache_dir, lock_path)
+    if not is_wheelhouse_complete(wheelhouse_dir):
+        raise PyshipWheelhouseMissing(f'no wheelhouse for "{lock_path}" - run "pyship wheelhouse" first')
+    return wheelhouse_dir
+
+
+def _store_wheel(wheelhouse_root: Path, wheel_path: Path) -> Path:
+    """Move a wheel into the content-addressed store (unless it is already there). :return: stored wheel"""
+    sha256 = get_file_sha256(wheel_path)
+    stored_path = Path(wheelhouse_root, sha256, wheel_path.name)
+    if not stored_path.exists():
+        stored_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(wheel_path), str(stored_path))
+    return stored_path
+
+
+@typechecked
+def build_wheelhouse(uv_path: Path, lock_path: Path, cache_dir: Path, python_version: str) -> Path:
+    """
+    Download the locked wheels for the CLIP's platform into the content-addressed wheelhouse.
+
+    :param uv_path: path to uv executable (runs pip download with ``uv tool run``)
+    :param lock_path: lock file written by :func:`uv_lock`
+    :param cache_dir: pyship cache dir
+    :param python_version: the CLIP's Python version (e.g. "3.12")
+    :return: the lock's wheelhouse dir
+    """
+    wheelhouse_dir = get_wheelhouse_dir(cache_dir, lock_path)
+    if is_wheelhouse_complete(wheelhouse_dir):
+        pyship_print(f'wheelhouse for "{lock_path}" is up to date ({wheelhouse_dir})')
+        return wheelhouse_dir
+
+    wheelhouse_root = Path(cache_dir, WHEELHOUSE_DIR_NAME)
+    wheelhouse_root.mkdir(parents=True, exist_ok=True)
+    python_tag = python_version.replace(".", "")
+    with tempfile.TemporaryDirectory(dir=wheelhouse_root) as download_dir:
+        cmd = [str(uv_path), "tool", "run", "pip", "download", "-r", str(lock_path.absolute()), "--require-hashes", "--no-deps", "--only-binary", ":all:"]
+        cmd.extend(["--platform", CLIP_WHEEL_PLATFORM, "--python-version", python_version, "--implementation", "cp"])
+        cmd.extend(["--abi", f"cp{python_tag}", "--abi", "abi3", "--abi", "none", "-d", download_dir])
+        log.info(f"pip download cmd: {cmd}")
+        pyship_print(" ".join(cmd))
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+
+        # link the stored wheels into the lock's (flat) wheelhouse dir
+        wheels: Dict[str, str] = {}
+        if wheelhouse_dir.exists():
+            shutil.rmtree(wheelhouse_dir)  # incomplete
+        wheelhouse_dir.mkdir(parents=True)
+        for wheel_path in sorted(Path(download_dir).glob("*.whl")):
+            stored_path = _store_wheel(wheelhouse_root, wheel_path)
+            try:
+                os.link(stored_path, Path(wheelhouse_dir, stored_path.name))
+            except OSError:
+                copy_file(stored_path, Path(wheelhouse_dir, stored_path.name))
+            wheels[stored_path.name] = stored_path.parent.name
+
+    Path(wheelhouse_dir, _WHEELHOUSE_MANIFEST_NAME).write_text(json.dumps({"lock": str(lock_path.absolute()), "wheels": wheels}, indent=2))
+    pyship_print(f"wheelhouse: {len(wheels)} wheels in {wheelhouse_dir}")
+    return wheelhouse_dir
@@ -1,9 +1,10 @@
+import hashlib
 import logging
 import os
 
 import pytest
 
-from awsimple import use_moto_mock_env_var
+from awsimple import S3Access, use_moto_mock_env_var
 
 
 class TestPyshipLoggingHandler(logging.Handler):
@@ -19,3 +20,10 @@ def session_init():
     # update check will find an empty bucket and return "no update available"
     if os.environ.get(use_moto_mock_env_var) is None:
         os.environ[use_moto_mock_env_var] = "1"  # Enabled
+
+
+@pytest.fixture()
+def moto_s3_access(request, monkeypatch) -> S3Access:
+    # a bucket of its own for each test, in moto's mock S3 (see session_init) - which needs a region other than us-east-1 to create buckets
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-2")
+    return S3Access(f"pyship-test-{hashlib.sha256(request.node.nodeid.encode()).hexdigest()[:16]}")
@@ -0,0 +1,134 @@
+from pathlib import Path
+
+import pytest
+
+from pyship.build_cache import BuildCache, get_build_key, get_source_hash, hash_files, BUILD_CACHE_MAX_ENTRIES
+
+
+def _make_project(project_dir: Path) -> Path:
+    package_dir = Path(project_dir, "myapp")
+    package_dir.mkdir(parents=True)
+    Path(project_dir, "pyproject.toml").write_text('[project]\nname = "myapp"\n')
+    Path(package_dir, "__init__.py").write_text('__version__ = "0.0.1"\n')
+    Path(package_dir, "__main__.py").write_text("print('hello')\n")
+    return package_dir
+
+
+# --- keys ---
+
+
+def test_source_hash_changes_with_sources(tmp_path):
+    package_dir = _make_project(tmp_path)
+    before = get_source_hash(tmp_path, "myapp")
+    assert get_source_hash(tmp_path, "myapp") == before
+    Path(package_dir, "__main__.py").write_text("print('goodbye')\n")
+    assert get_source_hash(tmp_path, "myapp") != before
+
+
+def test_source_hash_changes_with_pyproject(tmp_path):
+    _make_project(tmp_path)
+    before = get_source_hash(tmp_path, "myapp")
+    Path(tmp_path, "pyproject.toml").write_text('[project]\nname = "myapp"\nversion = "0.0.2"\n')
+    assert get_source_hash(tmp_path, "myapp") != before
+
+
+def test_source_hash_ignores_bytecode_and_unrelated_files(tmp_path):
+    package_dir = _make_project(tmp_path)
+    before = get_source_hash(tmp_path, "myapp")
+    Path(package_dir, "__pycache__").mkdir()
+    Path(package_dir, "__pycache__", "__main__.cpython-312.pyc").write_bytes(b"\x00")
+    Path(tmp_path, "dist").mkdir()
+    Path(tmp_path, "dist", "myapp-0.0.1-py3-none-any.whl").write_bytes(b"\x00")
+    assert get_source_hash(tmp_path, "myapp") == before
+
+
+def test_hash_files_includes_relative_path(tmp_path):
+    Path(tmp_path, "a").write_text("same")
+    Path(tmp_path, "b").write_text("same")
+    assert hash_files([Path(tmp_path, "a")], tmp_path) != hash_files([Path(tmp_path, "b")], tmp_path)
+
+
+def test_build_key_deterministic_and_input_sensitive():
+    assert get_build_key(stage="clip", python_version="3.12") == get_build_key(python_version="3.12", stage="clip")
+    assert get_build_key(stage="clip", python_version="3.12") != get_build_key(stage="clip", python_version="3.13")
+
+
+# --- store / restore ---
+
+
+def test_store_restore_directory(tmp_path):
+    output_dir = Path(tmp_path, "out")
+    Path(output_dir, "sub").mkdir(parents=True)
+    Path(output_dir, "sub", "f.txt").write_text("data")
+    build_cache = BuildCache(Path(tmp_path, "cache"), "myapp")
+
+    assert not build_cache.restore("clip", "k", [output_dir])
+    build_cache.store("clip", "k", [output_dir], Path(output_dir, "sub", "f.txt"))
+
+    Path(output_dir, "sub", "f.txt").write_text("changed")
+    Path(output_dir, "stale.txt").write_text("stale")
+    assert build_cache.restore("clip", "k", [output_dir])
+    assert Path(output_dir, "sub", "f.txt").read_text() == "data"
+    assert not Path(output_dir, "stale.txt").exists()
+    assert build_cache.load_result("clip", "k", [output_dir]) == Path(output_dir, "sub", "f.txt")
+
+
+def test_store_restore_file(tmp_path):
+    output_file = Path(tmp_path, "installer.exe")
+    output_file.write_bytes(b"exe")
+    build_cache = BuildCache(Path(tmp_path, "cache"), "myapp")
+    build_cache.store("installer", "k", [output_file], output_file)
+    output_file.unlink()
+    assert build_cache.restore("installer", "k", [output_file])
+    assert output_file.read_bytes() == b"exe"
+    assert build_cache.load_result("installer", "k", [output_file]) == output_file
+
+
+def test_store_result_must_be_an_output(tmp_path):
+    output_file = Path(tmp_path, "out.txt")
+    output_file.write_text("x")
+    build_cache = BuildCache(Path(tmp_path, "cache"), "myapp")
+    with pytest.raises(ValueError):
+        build_cache.store("stage", "k", [output_file], Path(tmp_path, "elsewhere.txt"))
+
+
+def test_cached_skips_work_on_hit(tmp_path):
+    output_file = Path(tmp_path, "out.txt")
+    build_cache = BuildCache(Path(tmp_path, "cache"), "myapp")
+    calls = []
+
+    def build(**_) -> Path:
+        calls.append(1)
+        output_file.write_text("built")
+        return output_file
+
+    assert build_cache.cached("stage", "k", [output_file], build)() == output_file
+    output_file.unlink()
+    assert build_cache.cached("stage", "k", [output_file], build)() == output_file
+    assert output_file.read_text() == "built"
+    assert len(calls) == 1
+    build_cache.cached("stage", "other_key", [output_file], build)()
+    assert len(calls) == 2
+
+
+def test_cached_does_not_store_none(tmp_path):
+    build_cache = BuildCache(Path(tmp_path, "cache"), "myapp")
+    calls = []
+
+    def build() -> None:
+        calls.append(1)
+        return None
+
+    build_cache.cached("stage", "k", [Path(tmp_path, "out")], build)()
+    build_cache.cached("stage", "k", [Path(tmp_path, "out")], build)()
+    assert len(calls) == 2
+
+
+def test_eviction_keeps_most_recent(tmp_path):
+    output_file = Path(tmp_path, "out.txt")
+    output_file.write_text("x")
+    build_cache = BuildCache(Path(tmp_path, "cache"), "myapp")
+    for index in range(BUILD_CACHE_MAX_ENTRIES + 2):
+        build_cache.store("stage", f"k{index}", [output_file], output_file)
+    entries = list(Path(tmp_path, "cache", "build", "myapp", "stage").iterdir())
+    assert len(entries) == BUILD_CACHE_MAX_ENTRIES
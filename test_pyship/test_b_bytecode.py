@@ -0,0 +1,49 @@
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+
+from pyship.bytecode import compile_clip
+
+
+def _make_clip(clip_dir: Path) -> Path:
+    for relative_path, content in [
+        ("Lib/os_like.py", "X = 1\n"),
+        ("Lib/site-packages/tapp/__init__.py", "from tapp.core import VALUE\n"),
+        ("Lib/site-packages/tapp/core.py", "VALUE = 42\n"),
+        ("Lib/site-packages/dep/__init__.py", "Y = 2\n"),
+        ("Lib/site-packages/dep/broken.py", "def (:\n"),  # syntax error
+    ]:
+        file_path = Path(clip_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+    return clip_dir
+
+
+def test_compile_clip(tmp_path):
+    clip_dir = _make_clip(tmp_path)
+    compile_stats = compile_clip(Path(sys.executable), clip_dir, workers=2)
+
+    assert compile_stats.files == 4
+    assert compile_stats.failed == 1
+    assert compile_stats.sources_dropped == 0
+    pyc_path = Path(importlib.util.cache_from_source(str(Path(clip_dir, "Lib", "site-packages", "tapp", "core.py"))))
+    flags = int.from_bytes(pyc_path.read_bytes()[4:8], "little")
+    assert flags == 0b01  # hash based, unchecked (PEP 552)
+    assert Path(clip_dir, "Lib", "site-packages", "tapp", "core.py").exists()
+
+
+def test_compile_clip_drop_sources(tmp_path):
+    clip_dir = _make_clip(tmp_path)
+    compile_stats = compile_clip(Path(sys.executable), clip_dir, drop_sources=["Lib/site-packages/tapp", "Lib/site-packages/dep/broken.py"])
+
+    assert compile_stats.sources_dropped == 2
+    assert not Path(clip_dir, "Lib", "site-packages", "tapp", "core.py").exists()
+    assert Path(clip_dir, "Lib", "site-packages", "tapp", "core.pyc").exists()
+    assert Path(clip_dir, "Lib", "site-packages", "dep", "broken.py").exists()  # failed to compile - source kept
+    assert Path(clip_dir, "Lib", "site-packages", "dep", "__init__.py").exists()
+
+    # the sourceless package is importable
+    site_packages = Path(clip_dir, "Lib", "site-packages")
+    result = subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {str(site_packages)!r}); import tapp; print(tapp.VALUE)"], capture_output=True, text=True)
+    assert result.stdout.strip() == "42"
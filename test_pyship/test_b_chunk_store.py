@@ -0,0 +1,99 @@
+import random
+from pathlib import Path
+
+import pytest
+from semver import VersionInfo
+
+from pyship import PyShipCloud, create_clip_file
+from pyship.chunk_store import split_clip, create_chunk_manifest, read_chunk_manifest, assemble_clip, get_missing_chunks, version_from_chunk_manifest, get_chunk_key, CHUNK_PREFIX
+
+_RANDOM = random.Random(42)  # the same chunk boundaries every run
+_RUNTIME = {f"Lib/runtime/{index}.bin": _RANDOM.randbytes(100_000) for index in range(40)}  # the same in every version
+
+
+def _make_clip(clip_dir: Path, version: int):
+    contents = dict(_RUNTIME)
+    contents["Lib/site-packages/tapp/__init__.py"] = f"VERSION = {version}\n".encode()
+    contents["Lib/site-packages/tapp/data.bin"] = random.Random(version).randbytes(50_000)
+    for relative_path, content in contents.items():
+        file_path = Path(clip_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+
+
+def test_split_clip(tmp_path):
+    clip_paths = []
+    for version in (1, 2):
+        clip_dir = Path(tmp_path, f"tapp_0.0.{version}")
+        _make_clip(clip_dir, version)
+        clip_paths.append(create_clip_file(clip_dir))
+    old_chunks = split_clip(clip_paths[0], min_size=200_000, max_size=1_000_000)
+    new_chunks = split_clip(clip_paths[1], min_size=200_000, max_size=1_000_000)
+    for chunks, clip_path in zip((old_chunks, new_chunks), clip_paths):
+        assert sum(chunk.size for chunk in chunks) == clip_path.stat().st_size
+        assert all(chunk.size <= 1_000_000 for chunk in chunks)
+        assert all(chunk.size >= 200_000 for chunk in chunks[:-1])
+    # the runtime's chunks are shared
+    new_sha256s = {chunk.sha256 for chunk in new_chunks}
+    shared_bytes = sum(chunk.size for chunk in old_chunks if chunk.sha256 in new_sha256s)
+    assert shared_bytes > clip_paths[1].stat().st_size // 2
+
+    Path(tmp_path, "empty.clip").write_bytes(b"")
+    assert split_clip(Path(tmp_path, "empty.clip")) == []
+    with pytest.raises(ValueError):
+        split_clip(clip_paths[0], min_size=2, max_size=1)
+
+
+def test_assemble_clip(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    _make_clip(clip_dir, 1)
+    clip_path = create_clip_file(clip_dir)
+    manifest_path = create_chunk_manifest(clip_path, "tapp", "0.0.1")
+    assert manifest_path.name == "tapp_0.0.1.clipchunks"
+    assert version_from_chunk_manifest("tapp", manifest_path.name) == VersionInfo.parse("0.0.1")
+    assert version_from_chunk_manifest("tapp", "tapp_0.0.1.clip") is None
+    manifest = read_chunk_manifest(manifest_path)
+
+    chunks_dir = Path(tmp_path, "chunks")
+    chunks_dir.mkdir()
+    assert len(get_missing_chunks(manifest_path, chunks_dir)) == len({chunk["sha256"] for chunk in manifest["chunks"]})
+    with open(clip_path, "rb") as clip_file:
+        for chunk in manifest["chunks"]:
+            Path(chunks_dir, chunk["sha256"]).write_bytes(clip_file.read(chunk["size"]))
+    assert get_missing_chunks(manifest_path, chunks_dir) == []
+    assembled_path = assemble_clip(manifest_path, chunks_dir, Path(tmp_path, "assembled.clip"))
+    assert assembled_path.read_bytes() == clip_path.read_bytes()
+
+    Path(chunks_dir, manifest["chunks"][0]["sha256"]).write_bytes(b"corrupt")
+    with pytest.raises(ValueError):
+        assemble_clip(manifest_path, chunks_dir, Path(tmp_path, "corrupt.clip"))
+    assert not Path(tmp_path, "corrupt.clip").exists()
+
+
+def test_upload_chunked(tmp_path, moto_s3_access, monkeypatch):
+    cloud_access = PyShipCloud("tapp", moto_s3_access)
+    scheduler = cloud_access.uploader.scheduler
+    submit = scheduler.submit
+    submitted_args = []
+    monkeypatch.setattr(scheduler, "submit", lambda priority, function, *args: submitted_args.extend(args) or submit(priority, function, *args))
+    clip_paths = []
+    chunk_counts = []
+    for version in (1, 2):
+        clip_dir = Path(tmp_path, f"tapp_0.0.{version}")
+        _make_clip(clip_dir, version)
+        clip_path = create_clip_file(clip_dir)
+        cloud_access.upload_chunked(clip_path, create_chunk_manifest(clip_path, "tapp", f"0.0.{version}"))
+        clip_paths.append(clip_path)
+        chunk_counts.append(len(cloud_access.s3_access.keys(CHUNK_PREFIX)))
+    assert 0 < chunk_counts[1] - chunk_counts[0] < chunk_counts[0]  # only the changed chunks were added
+    assert len(submitted_args) > 0 and not any(isinstance(arg, bytes) for arg in submitted_args)  # chunks are read when uploaded, not all up front
+    assert not cloud_access.s3_access.object_exists("tapp_0.0.2.clip")
+    assert cloud_access.get_clip_versions() == [VersionInfo.parse("0.0.1"), VersionInfo.parse("0.0.2")]
+
+    chunks_dir = Path(tmp_path, "chunks")
+    downloaded_path = Path(tmp_path, "downloads", clip_paths[1].name)
+    downloaded_path.parent.mkdir()
+    cloud_access.download_clip(downloaded_path, chunks_dir)
+    assert downloaded_path.read_bytes() == clip_paths[1].read_bytes()
+    manifest = read_chunk_manifest(Path(chunks_dir, "tapp_0.0.2.clipchunks"))
+    assert cloud_access.s3_access.object_exists(get_chunk_key(manifest["chunks"][0]["sha256"]))
@@ -0,0 +1,170 @@
+import os
+import shutil
+import time
+import zipfile
+from pathlib import Path
+
+import pytest
+
+import pyship.clip_archive
+from pyship import create_clip_file, CLIP_EXT
+from pyship.clip_archive import (
+    write_clip_archive,
+    DEFAULT_SOURCE_DATE_EPOCH,
+    REPRODUCIBLE_FILE_MODE,
+    get_compression_method,
+    get_file_class,
+    ClipArchiveWriter,
+    SPOOL_MAX_SIZE,
+    ENTROPY_SAMPLED_SIZE,
+)
+
+
+def _make_clip(clip_dir: Path) -> dict:
+    contents = {
+        "python.exe": b"MZ" + os.urandom(1000),  # incompressible - stored
+        "python312._pth": b".\nLib\nLib\\site-packages\n",
+        "Lib/site-packages/tapp/__init__.py": b"VALUE = 42\n" * 1000,
+        "Lib/site-packages/tapp/data/big.bin": bytes(range(256)) * (SPOOL_MAX_SIZE // 64),  # spooled to a temporary file
+        "Lib/site-packages/tapp/data/empty.txt": b"",
+        "Lib/site-packages/tapp/data/café.txt": b"utf-8 name",
+    }
+    contents.update({f"Lib/many/{index}.py": f"# {index}\n".encode() for index in range(300)})  # more than are in flight at once
+    for relative_path, content in contents.items():
+        file_path = Path(clip_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+    Path(clip_dir, "Lib", "empty_dir").mkdir()
+    return contents
+
+
+def test_write_clip_archive(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    contents = _make_clip(clip_dir)
+    archive_path = Path(tmp_path, "tapp_0.0.1.clip")
+    archive_stats = write_clip_archive(clip_dir, archive_path, workers=4)
+    assert archive_stats.files == len(contents)
+    assert archive_stats.bytes == sum(len(content) for content in contents.values())
+    assert archive_stats.compressed_bytes < archive_stats.bytes
+
+    with zipfile.ZipFile(archive_path) as zip_file:
+        assert zip_file.testzip() is None
+        names = zip_file.namelist()
+        for relative_path, content in contents.items():
+            assert zip_file.read(relative_path) == content
+        assert "Lib/empty_dir/" in names
+        assert zip_file.getinfo("python.exe").compress_type == zipfile.ZIP_STORED
+        assert zip_file.getinfo("Lib/site-packages/tapp/__init__.py").compress_type == zipfile.ZIP_DEFLATED
+
+        # extracts like a make_archive zip
+        zip_file.extractall(Path(tmp_path, "extracted"))
+    assert Path(tmp_path, "extracted", "Lib", "empty_dir").is_dir()
+    assert Path(tmp_path, "extracted", "Lib", "site-packages", "tapp", "data", "café.txt").read_bytes() == b"utf-8 name"
+
+
+def test_write_clip_archive_zip64(tmp_path, monkeypatch):
+    # force the zip64 records (real zip64 archives are too big for a test)
+    monkeypatch.setattr(pyship.clip_archive, "ZIP64_LIMIT", 100)
+    monkeypatch.setattr(pyship.clip_archive, "ZIP64_COUNT_LIMIT", 10)
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    contents = _make_clip(clip_dir)
+    archive_path = Path(tmp_path, "tapp_0.0.1.clip")
+    write_clip_archive(clip_dir, archive_path)
+    assert b"PK\x06\x06" in archive_path.read_bytes()[-1000:]
+    with zipfile.ZipFile(archive_path) as zip_file:
+        assert zip_file.testzip() is None
+        for relative_path, content in contents.items():
+            assert zip_file.read(relative_path) == content
+
+
+def test_clip_archive_writer_abort(tmp_path):
+    archive_path = Path(tmp_path, "aborted.clip")
+    with pytest.raises(FileNotFoundError):
+        with ClipArchiveWriter(archive_path) as writer:
+            writer.add_file(Path(tmp_path, "missing.txt"), "missing.txt")
+            writer.close()
+    assert not archive_path.exists()
+
+
+def test_get_compression_method(tmp_path):
+    paths = {
+        "wheel.whl": b"x" * 1000,  # by extension
+        "random.dll": os.urandom(ENTROPY_SAMPLED_SIZE),  # by sampling
+        "code.pyd": b"\x00\x01 machine code " * (ENTROPY_SAMPLED_SIZE // 10),
+        "small_random.dll": os.urandom(1000),  # too small to sample - deflated (and stored if that doesn't help)
+    }
+    for name, content in paths.items():
+        Path(tmp_path, name).write_bytes(content)
+    methods = {name: get_compression_method(Path(tmp_path, name), len(content)) for name, content in paths.items()}
+    assert methods == {"wheel.whl": zipfile.ZIP_STORED, "random.dll": zipfile.ZIP_STORED, "code.pyd": zipfile.ZIP_DEFLATED, "small_random.dll": zipfile.ZIP_DEFLATED}
+    assert get_compression_method(Path(tmp_path, "code.pyd"), len(paths["code.pyd"]), level=0) == zipfile.ZIP_STORED
+    assert get_compression_method(Path(tmp_path, "wheel.whl"), 1000, stored_suffixes=()) == zipfile.ZIP_DEFLATED
+
+
+def test_write_clip_archive_class_report(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    _make_clip(clip_dir)
+    Path(clip_dir, "tapp-0.0.1-py3-none-any.whl").write_bytes(b"wheel " * 1000)
+    archive_stats = write_clip_archive(clip_dir, Path(tmp_path, "tapp_0.0.1.clip"))
+    assert archive_stats.classes[".whl"].stored == 1
+    assert archive_stats.classes[".whl"].ratio == 1.0
+    assert archive_stats.classes[".py"].files == 301
+    assert archive_stats.classes[".py"].stored == 300  # the tiny ones - deflate makes them bigger
+    assert archive_stats.classes[".py"].ratio < 0.5
+    assert get_file_class("Lib/site-packages/tapp/DATA.BIN") == ".bin"
+    assert get_file_class("Lib/site-packages/tapp/LICENSE") == "(none)"
+    report = archive_stats.class_report(top=2).splitlines()
+    assert len(report) == 2
+    assert report[0].strip().startswith(".bin")  # the largest class
+
+    # level 0 stores everything
+    stored_stats = write_clip_archive(clip_dir, Path(tmp_path, "stored.clip"), level=0)
+    assert stored_stats.compressed_bytes == stored_stats.bytes
+    with pytest.raises(ValueError):
+        write_clip_archive(clip_dir, Path(tmp_path, "invalid.clip"), level=10)
+
+
+def test_write_clip_archive_reproducible(tmp_path, monkeypatch):
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    clip_dir = Path(tmp_path, "a", "tapp_0.0.1")
+    _make_clip(clip_dir)
+    other_clip_dir = Path(tmp_path, "b", "tapp_0.0.1")
+    shutil.copytree(clip_dir, other_clip_dir)
+    for file_path in other_clip_dir.rglob("*"):
+        os.utime(file_path, (1234567890, 1234567890))
+    os.chmod(Path(other_clip_dir, "python.exe"), 0o755)
+
+    archive_path = Path(tmp_path, "a.clip")
+    other_archive_path = Path(tmp_path, "b.clip")
+    write_clip_archive(clip_dir, archive_path, workers=1)
+    write_clip_archive(other_clip_dir, other_archive_path, workers=8)
+    assert archive_path.read_bytes() == other_archive_path.read_bytes()
+    with zipfile.ZipFile(archive_path) as zip_file:
+        info = zip_file.getinfo("python.exe")
+        assert info.date_time == time.gmtime(DEFAULT_SOURCE_DATE_EPOCH)[:6]
+        assert info.external_attr >> 16 == REPRODUCIBLE_FILE_MODE
+
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    write_clip_archive(clip_dir, other_archive_path)
+    with zipfile.ZipFile(other_archive_path) as zip_file:
+        assert zip_file.getinfo("python.exe").date_time == time.gmtime(1700000000)[:6]
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "yesterday")
+    with pytest.raises(ValueError):
+        write_clip_archive(clip_dir, other_archive_path)
+
+    # the files' own timestamps
+    write_clip_archive(other_clip_dir, other_archive_path, reproducible=False)
+    with zipfile.ZipFile(other_archive_path) as zip_file:
+        assert zip_file.getinfo("python.exe").date_time == time.localtime(1234567890)[:6]
+
+
+def test_create_clip_file(tmp_path):
+    clip_dir = Path(tmp_path, "clips", "tapp_0.0.1")
+    contents = _make_clip(clip_dir)
+    output_dir = Path(tmp_path, "out")
+    output_dir.mkdir()
+    clip_path = create_clip_file(clip_dir, output_dir)
+    assert clip_path == Path(output_dir, f"tapp_0.0.1.{CLIP_EXT}")
+    with zipfile.ZipFile(clip_path) as zip_file:
+        assert set(contents) <= set(zip_file.namelist())
+    assert create_clip_file(clip_dir) == Path(tmp_path, "clips", f"tapp_0.0.1.{CLIP_EXT}")
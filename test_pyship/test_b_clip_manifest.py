@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from pyship import create_clip_file
+from pyship.clip_manifest import CLIP_MANIFEST_NAME, create_clip_manifest, read_clip_inventory, read_clip_manifest, verify_clip, hash_clip_tree, get_clip_manifest_name
+
+
+def _make_clip(clip_dir: Path) -> dict:
+    contents = {
+        "python.exe": os.urandom(1000),
+        "Lib/site-packages/tapp/__init__.py": b"VALUE = 42\n",
+        "Lib/site-packages/tapp/data/empty.txt": b"",
+    }
+    contents.update({f"Lib/many/{index}.py": f"# {index}\n".encode() for index in range(100)})
+    for relative_path, content in contents.items():
+        file_path = Path(clip_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+    Path(clip_dir, "Lib", "empty_dir").mkdir()
+    return contents
+
+
+def test_create_clip_manifest(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    contents = _make_clip(clip_dir)
+    manifest_path = create_clip_manifest(clip_dir, "tapp", "0.0.1", workers=4)
+    assert manifest_path == Path(clip_dir, CLIP_MANIFEST_NAME)
+    manifest = json.loads(manifest_path.read_text())
+    assert manifest["size"] == sum(len(content) for content in contents.values())
+    assert [entry["path"] for entry in manifest["files"]] == sorted(contents)  # not the manifest itself
+
+    infos = read_clip_manifest(manifest_path)
+    assert set(infos) == set(contents)
+    for relative_path, content in contents.items():
+        assert infos[relative_path].size == len(content)
+        assert infos[relative_path].sha256 == hashlib.sha256(content).hexdigest()
+        assert infos[relative_path].mode == os.stat(Path(clip_dir, relative_path)).st_mode & 0o7777
+
+    # written again (e.g. after the CLIP changes) it is the same
+    assert create_clip_manifest(clip_dir, "tapp", "0.0.1").read_text() == json.dumps(manifest, indent=1)
+    hashes, directories = hash_clip_tree(clip_dir)
+    assert CLIP_MANIFEST_NAME in hashes
+    assert "Lib/empty_dir" in directories
+
+    # embedded in the .clip
+    with zipfile.ZipFile(create_clip_file(clip_dir)) as zip_file:
+        assert json.loads(zip_file.read(CLIP_MANIFEST_NAME)) == manifest
+    assert get_clip_manifest_name("tapp", "0.0.1") == "tapp_0.0.1_clip_manifest.json"
+
+
+def test_verify_clip(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    _make_clip(clip_dir)
+    create_clip_manifest(clip_dir, "tapp", "0.0.1")
+    assert verify_clip(clip_dir) == []
+
+    Path(clip_dir, "Lib", "site-packages", "tapp", "__init__.py").write_bytes(b"VALUE = 43\n")
+    Path(clip_dir, "Lib", "many", "0.py").unlink()
+    Path(clip_dir, "added.txt").write_text("added")
+    assert verify_clip(clip_dir) == ["Lib/many/0.py", "Lib/site-packages/tapp/__init__.py", "added.txt"]
+
+    Path(clip_dir, CLIP_MANIFEST_NAME).write_text(json.dumps({"format": 99}))
+    with pytest.raises(ValueError):
+        verify_clip(clip_dir)
+
+
+def test_read_clip_inventory(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    _make_clip(clip_dir)
+    create_clip_manifest(clip_dir, "tapp", "0.0.1")
+    assert read_clip_inventory(clip_dir) == hash_clip_tree(clip_dir)
+
+    manifest_path = Path(clip_dir, CLIP_MANIFEST_NAME)
+    manifest = json.loads(manifest_path.read_text())
+    del manifest["directories"]
+    manifest_path.write_text(json.dumps(manifest))
+    with pytest.raises(ValueError):
+        read_clip_inventory(clip_dir)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import zipfile
+from pathlib import Path
+
+import pyship.clip_manifest
+
+import pytest
+from semver import VersionInfo
+
+from pyship import PyShipCloud, create_clip_file, CLIP_MANIFEST_NAME
+from pyship.clip_manifest import create_clip_manifest
+from pyship.clip_patch import PATCH_MANIFEST_NAME, create_clip_patch, apply_clip_patch, create_clip_patches, get_clip_patch_name
+from pyship.clip_v2 import is_zstd_available
+
+_RUNTIME = os.urandom(500_000)  # the same in every version
+
+
+def _make_clip(clip_dir: Path, version: int) -> dict:
+    contents = {
+        "python.exe": _RUNTIME,
+        "Lib/site-packages/tapp/__init__.py": f"VERSION = {version}\n".encode(),
+        "Lib/site-packages/tapp/big.bin": _RUNTIME[:200_000] + f"version {version}".encode() + _RUNTIME[200_000:],  # changed a little
+        f"Lib/site-packages/tapp/only_in_{version}.txt": f"{version}".encode(),  # added/removed
+    }
+    for relative_path, content in contents.items():
+        file_path = Path(clip_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+    Path(clip_dir, "Lib", f"empty_{version}").mkdir()
+    return contents
+
+
+def _check_clip(clip_dir: Path, contents: dict, version: int):
+    assert {p.relative_to(clip_dir).as_posix() for p in clip_dir.rglob("*") if p.is_file()} == set(contents)
+    for relative_path, content in contents.items():
+        assert Path(clip_dir, relative_path).read_bytes() == content
+    assert Path(clip_dir, "Lib", f"empty_{version}").is_dir()
+
+
+def test_clip_patch(tmp_path):
+    old_clip_dir = Path(tmp_path, "tapp_0.0.1")
+    new_clip_dir = Path(tmp_path, "tapp_0.0.2")
+    _make_clip(old_clip_dir, 1)
+    new_contents = _make_clip(new_clip_dir, 2)
+    patch_path = create_clip_patch("tapp", "0.0.1", "0.0.2", old_clip_dir, new_clip_dir, tmp_path)
+    assert patch_path.name == get_clip_patch_name("tapp", VersionInfo.parse("0.0.1"), VersionInfo.parse("0.0.2")) == "tapp_0.0.1_to_0.0.2.clippatch"
+    if is_zstd_available():
+        assert patch_path.stat().st_size < 10_000  # the runtime isn't in it, and big.bin is a delta
+
+    patched_clip_dir = Path(tmp_path, "patched")
+    assert apply_clip_patch(patch_path, old_clip_dir, patched_clip_dir) == len(new_contents)
+    _check_clip(patched_clip_dir, new_contents, 2)
+
+    # only applies to the old version
+    Path(old_clip_dir, "Lib", "site-packages", "tapp", "big.bin").write_bytes(b"something else")
+    Path(old_clip_dir, "python.exe").write_bytes(b"something else")
+    with pytest.raises(ValueError):
+        apply_clip_patch(patch_path, old_clip_dir, Path(tmp_path, "patched_again"))
+
+
+@pytest.mark.parametrize("bad_path", ["../outside.txt", "Lib/../../outside.txt", "/tmp/outside.txt"])
+def test_clip_patch_outside_clip(tmp_path, bad_path):
+    old_clip_dir = Path(tmp_path, "tapp_0.0.1")
+    new_clip_dir = Path(tmp_path, "tapp_0.0.2")
+    _make_clip(old_clip_dir, 1)
+    _make_clip(new_clip_dir, 2)
+    patch_path = create_clip_patch("tapp", "0.0.1", "0.0.2", old_clip_dir, new_clip_dir, tmp_path)
+
+    # a tampered patch that writes outside the new CLIP
+    with zipfile.ZipFile(patch_path) as patch_file:
+        members = {name: patch_file.read(name) for name in patch_file.namelist()}
+    manifest = json.loads(members[PATCH_MANIFEST_NAME])
+    manifest["files"][bad_path] = {"size": 3, "sha256": hashlib.sha256(b"bad").hexdigest(), "patch": "full"}
+    members[PATCH_MANIFEST_NAME] = json.dumps(manifest).encode()
+    members[f"files/{bad_path}"] = b"bad"
+    with zipfile.ZipFile(patch_path, "w") as patch_file:
+        for name, data in members.items():
+            patch_file.writestr(name, data)
+
+    patched_clip_dir = Path(tmp_path, "patched")
+    with pytest.raises(ValueError):
+        apply_clip_patch(patch_path, old_clip_dir, patched_clip_dir)
+    assert not Path(tmp_path, "outside.txt").exists()
+    assert not patched_clip_dir.exists()  # nothing written
+
+
+def test_clip_patch_from_manifests(tmp_path, monkeypatch):
+    old_clip_dir = Path(tmp_path, "tapp_0.0.1")
+    new_clip_dir = Path(tmp_path, "tapp_0.0.2")
+    _make_clip(old_clip_dir, 1)
+    new_contents = _make_clip(new_clip_dir, 2)
+    create_clip_manifest(old_clip_dir, "tapp", "0.0.1")
+    new_contents[CLIP_MANIFEST_NAME] = create_clip_manifest(new_clip_dir, "tapp", "0.0.2").read_bytes()
+
+    def hash_clip_tree(*args, **kwargs):
+        raise AssertionError("CLIP hashed rather than read from its manifest")
+
+    monkeypatch.setattr(pyship.clip_manifest, "hash_clip_tree", hash_clip_tree)
+    patch_path = create_clip_patch("tapp", "0.0.1", "0.0.2", old_clip_dir, new_clip_dir, tmp_path)
+    patched_clip_dir = Path(tmp_path, "patched")
+    assert apply_clip_patch(patch_path, old_clip_dir, patched_clip_dir) == len(new_contents)
+    _check_clip(patched_clip_dir, new_contents, 2)
+
+    # an old release without a manifest is hashed
+    Path(old_clip_dir, CLIP_MANIFEST_NAME).unlink()
+    with pytest.raises(AssertionError):
+        create_clip_patch("tapp", "0.0.1", "0.0.2", old_clip_dir, new_clip_dir, tmp_path)
+
+
+def test_create_clip_patches(tmp_path, moto_s3_access, monkeypatch):
+    cloud_access = PyShipCloud("tapp", moto_s3_access)
+    assert cloud_access.get_clip_versions() == []  # no bucket yet
+    monkeypatch.setattr(moto_s3_access, "dir", None)  # a request per object - the versions come from one listing
+    for version in (1, 2, 3):
+        clip_dir = Path(tmp_path, f"tapp_0.0.{version}")
+        _make_clip(clip_dir, version)
+        if version < 3:
+            cloud_access.upload(create_clip_file(clip_dir))
+    assert cloud_access.get_clip_versions() == [VersionInfo.parse("0.0.1"), VersionInfo.parse("0.0.2")]
+
+    output_dir = Path(tmp_path, "patches")
+    output_dir.mkdir()
+    new_clip_dir = Path(tmp_path, "tapp_0.0.3")
+    patch_paths = create_clip_patches(cloud_access, VersionInfo.parse("0.0.3"), new_clip_dir, output_dir, 1)
+    assert [p.name for p in patch_paths] == ["tapp_0.0.2_to_0.0.3.clippatch"]
+    patch_paths = create_clip_patches(cloud_access, VersionInfo.parse("0.0.3"), new_clip_dir, output_dir, 5)
+    assert [p.name for p in patch_paths] == ["tapp_0.0.1_to_0.0.3.clippatch", "tapp_0.0.2_to_0.0.3.clippatch"]
+    assert create_clip_patches(cloud_access, VersionInfo.parse("0.0.1"), Path(tmp_path, "tapp_0.0.1"), output_dir, 5) == []
@@ -0,0 +1,99 @@
+from pathlib import Path
+
+import pytest
+
+from pyship.clip_prune import prune_clip, get_prune_excludes, PRUNE_PROFILES
+
+
+def _make_clip(clip_dir: Path) -> Path:
+    """Create a fake CLIP."""
+    for relative_path in [
+        "python.exe",
+        "python312.dll",
+        "DLLs/_ssl.pyd",
+        "DLLs/_tkinter.pyd",
+        "DLLs/tcl86t.dll",
+        "Lib/os.py",
+        "Lib/__pycache__/os.cpython-312.pyc",
+        "Lib/test/test_os.py",
+        "Lib/idlelib/idle.py",
+        "Lib/ensurepip/__init__.py",
+        "Lib/tkinter/__init__.py",
+        "Lib/lib2to3/main.py",
+        "Lib/site-packages/myapp/__init__.py",
+        "Lib/site-packages/myapp/tests/test_myapp.py",
+        "Lib/site-packages/pip/__init__.py",
+        "Lib/site-packages/some_dep/sub/tests/test_sub.py",
+        "Lib/site-packages/some_dep/__init__.py",
+        "tcl/tk8.6/tk.tcl",
+    ]:
+        file_path = Path(clip_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text("x" * 10)
+    return clip_dir
+
+
+def _files(clip_dir: Path) -> set:
+    return {p.relative_to(clip_dir).as_posix() for p in clip_dir.rglob("*") if p.is_file()}
+
+
+def test_prune_gui(tmp_path):
+    clip_dir = _make_clip(tmp_path)
+    before = _files(clip_dir)
+    prune_stats = prune_clip(clip_dir, "gui")
+    after = _files(clip_dir)
+
+    for removed in (
+        "Lib/__pycache__/os.cpython-312.pyc",
+        "Lib/test/test_os.py",
+        "Lib/idlelib/idle.py",
+        "Lib/site-packages/myapp/tests/test_myapp.py",
+        "Lib/site-packages/some_dep/sub/tests/test_sub.py",
+    ):
+        assert removed not in after
+    assert {"Lib/tkinter/__init__.py", "DLLs/_tkinter.pyd", "Lib/site-packages/myapp/__init__.py", "Lib/os.py"} <= after
+    assert prune_stats.files == len(before) - len(after)
+    assert prune_stats.bytes == 10 * prune_stats.files
+    assert not Path(clip_dir, "Lib", "test").exists()  # emptied excluded directories are removed too
+
+
+def test_prune_cli_and_minimal(tmp_path):
+    cli_dir = _make_clip(Path(tmp_path, "cli"))
+    prune_clip(cli_dir, "cli")
+    cli_files = _files(cli_dir)
+    assert not any(f.startswith("Lib/tkinter/") or f.startswith("tcl/") for f in cli_files)
+    assert "DLLs/tcl86t.dll" not in cli_files
+    assert "Lib/site-packages/pip/__init__.py" in cli_files
+
+    minimal_dir = _make_clip(Path(tmp_path, "minimal"))
+    prune_clip(minimal_dir, "minimal")
+    minimal_files = _files(minimal_dir)
+    assert minimal_files < cli_files
+    assert "Lib/site-packages/pip/__init__.py" not in minimal_files
+    assert "Lib/lib2to3/main.py" not in minimal_files
+    assert {"python.exe", "Lib/os.py", "DLLs/_ssl.pyd", "Lib/site-packages/some_dep/__init__.py"} <= minimal_files
+
+
+def test_prune_include_overrides_exclude(tmp_path):
+    clip_dir = _make_clip(tmp_path)
+    prune_clip(clip_dir, "cli", include=["Lib/site-packages/myapp/tests/*.py", "lib/TKINTER"], exclude=["Lib/lib2to3"])
+    after = _files(clip_dir)
+    assert "Lib/site-packages/myapp/tests/test_myapp.py" in after
+    assert "Lib/tkinter/__init__.py" in after  # matched case-insensitively
+    assert "Lib/site-packages/some_dep/sub/tests/test_sub.py" not in after
+    assert "Lib/lib2to3/main.py" not in after
+
+
+def test_prune_nothing(tmp_path):
+    clip_dir = _make_clip(tmp_path)
+    before = _files(clip_dir)
+    prune_stats = prune_clip(clip_dir)
+    assert prune_stats.files == 0
+    assert _files(clip_dir) == before
+
+
+def test_prune_excludes():
+    assert get_prune_excludes(None, ["*.chm"]) == ["*.chm"]
+    assert get_prune_excludes("gui") == list(PRUNE_PROFILES["gui"])
+    with pytest.raises(ValueError):
+        get_prune_excludes("tiny")
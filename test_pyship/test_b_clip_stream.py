@@ -0,0 +1,80 @@
+import os
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from pyship import create_clip_file
+from pyship.clip_archive import write_clip_archive
+from pyship.clip_stream import StreamingClipArchiveWriter, PARTIAL_SUFFIX
+
+
+def _write(clip_dir: Path, relative_path: str, content: bytes):
+    file_path = Path(clip_dir, relative_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(content)
+
+
+def test_streaming_clip_archive(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    archive_path = Path(tmp_path, "tapp_0.0.1.clip")
+    writer = StreamingClipArchiveWriter(clip_dir, archive_path, workers=4)
+
+    # the base Python
+    _write(clip_dir, "python.exe", os.urandom(1000))
+    for index in range(100):
+        _write(clip_dir, f"Lib/{index}.py", f"# {index}\n".encode() * 100)
+    _write(clip_dir, "Lib/removed.py", b"removed later")
+    assert writer.feed() == 102
+    assert writer.feed() == 0  # nothing new
+
+    # installed packages, and changes
+    _write(clip_dir, "Lib/site-packages/tapp/__init__.py", b"VALUE = 42\n")
+    _write(clip_dir, "Lib/0.py", b"changed - a different size")
+    Path(clip_dir, "Lib", "removed.py").unlink()
+    assert writer.feed() == 2
+
+    # files created after the last feed (e.g. by the bytecode compilation)
+    _write(clip_dir, "Lib/__pycache__/1.cpython-312.pyc", b"bytecode")
+    Path(clip_dir, "empty_dir").mkdir()
+
+    stats = writer.finish()
+    assert stats.files == 103
+    assert writer.reused_files == 102
+    assert not Path(tmp_path, f"tapp_0.0.1.clip{PARTIAL_SUFFIX}").exists()
+
+    # the same archive as zipping the finished CLIP
+    write_clip_archive(clip_dir, Path(tmp_path, "zipped.clip"))
+    assert archive_path.read_bytes() == Path(tmp_path, "zipped.clip").read_bytes()
+    with zipfile.ZipFile(archive_path) as zip_file:
+        assert zip_file.testzip() is None
+        assert zip_file.read("Lib/0.py") == b"changed - a different size"
+        assert "Lib/removed.py" not in zip_file.namelist()
+
+
+def test_streaming_clip_archive_abort(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    _write(clip_dir, "python.exe", b"python")
+    archive_path = Path(tmp_path, "tapp_0.0.1.clip")
+    archive_path.write_bytes(b"an earlier .clip")
+    writer = StreamingClipArchiveWriter(clip_dir, archive_path)
+    writer.feed()
+    writer.abort()
+    assert not Path(tmp_path, f"tapp_0.0.1.clip{PARTIAL_SUFFIX}").exists()
+    assert archive_path.read_bytes() == b"an earlier .clip"  # only replaced by a complete archive
+
+
+def test_create_clip_file_streamed(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    _write(clip_dir, "python.exe", b"python")
+    writer = StreamingClipArchiveWriter(clip_dir, Path(tmp_path, "tapp_0.0.1.clip"))
+    writer.feed()
+    assert create_clip_file(clip_dir, clip_stream=writer) == Path(tmp_path, "tapp_0.0.1.clip")
+    with zipfile.ZipFile(Path(tmp_path, "tapp_0.0.1.clip")) as zip_file:
+        assert zip_file.read("python.exe") == b"python"
+
+    # for another .clip
+    writer = StreamingClipArchiveWriter(clip_dir, Path(tmp_path, "other.clip"))
+    with pytest.raises(ValueError):
+        create_clip_file(clip_dir, clip_stream=writer)
+    assert not Path(tmp_path, f"other.clip{PARTIAL_SUFFIX}").exists()
@@ -0,0 +1,125 @@
+import os
+from pathlib import Path
+
+import pyship.clip_template
+from pyship.clip_template import get_clip_template, materialise_clip_template, write_pyvenv_cfg, CLIP_TEMPLATE_DIR_NAME
+
+
+def _make_python_install(install_dir: Path) -> Path:
+    """Create a fake uv-managed standalone Python install."""
+    for relative_path, content in [
+        ("python.exe", "exe"),
+        ("python312.dll", "dll"),
+        ("python3.dll", "dll"),
+        ("Lib/os.py", "# os"),
+        ("Lib/EXTERNALLY-MANAGED", "[externally-managed]"),
+        ("Lib/site-packages/pip/__init__.py", "# pip"),
+        ("DLLs/_ssl.pyd", "pyd"),
+    ]:
+        file_path = Path(install_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+    return install_dir
+
+
+def test_get_clip_template_is_patched(tmp_path):
+    install_dir = _make_python_install(Path(tmp_path, "cpython-3.12.8-windows-x86_64-none"))
+    template_dir = get_clip_template(install_dir, Path(tmp_path, "cache"))
+
+    assert template_dir == Path(tmp_path, "cache", CLIP_TEMPLATE_DIR_NAME, install_dir.name)
+    assert not Path(template_dir, "Lib", "EXTERNALLY-MANAGED").exists()
+    assert Path(template_dir, "python312._pth").read_text(encoding="utf-8") == ".\nLib\nLib\\site-packages\nDLLs\n"
+    assert not Path(template_dir, "pyvenv.cfg").exists()  # per CLIP, never templated
+    assert Path(install_dir, "Lib", "EXTERNALLY-MANAGED").exists()  # the uv install itself is untouched
+
+
+def test_get_clip_template_reused(tmp_path, monkeypatch):
+    install_dir = _make_python_install(Path(tmp_path, "cpython-3.12.8-windows-x86_64-none"))
+    cache_dir = Path(tmp_path, "cache")
+    template_dir = get_clip_template(install_dir, cache_dir)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("template should not be copied again")
+
+    monkeypatch.setattr(pyship.clip_template, "copy_tree", fail)
+    assert get_clip_template(install_dir, cache_dir) == template_dir
+
+
+def test_get_clip_template_rebuilds_incomplete(tmp_path):
+    install_dir = _make_python_install(Path(tmp_path, "cpython-3.12.8-windows-x86_64-none"))
+    cache_dir = Path(tmp_path, "cache")
+    incomplete_dir = Path(cache_dir, CLIP_TEMPLATE_DIR_NAME, install_dir.name)
+    incomplete_dir.mkdir(parents=True)  # e.g. an interrupted build - no ready marker
+    template_dir = get_clip_template(install_dir, cache_dir)
+    assert Path(template_dir, "python.exe").exists()
+    assert sorted(path.name for path in Path(cache_dir, CLIP_TEMPLATE_DIR_NAME).iterdir()) == [install_dir.name]  # nothing left behind
+
+
+def test_get_clip_template_concurrent(tmp_path, monkeypatch):
+    install_dir = _make_python_install(Path(tmp_path, "cpython-3.12.8-windows-x86_64-none"))
+    cache_dir = Path(tmp_path, "cache")
+    copy_tree = pyship.clip_template.copy_tree
+    other_templates = []
+
+    def copy_tree_then_other_build(source_dir: Path, dest_dir: Path, **kwargs):
+        # another build publishes the same template while this one is building it
+        stats = copy_tree(source_dir, dest_dir, **kwargs)
+        if len(other_templates) == 0:
+            monkeypatch.setattr(pyship.clip_template, "copy_tree", copy_tree)
+            other_templates.append(get_clip_template(install_dir, cache_dir))
+            Path(other_templates[0], "in_use.txt").write_text("linked from by the other build")
+        return stats
+
+    monkeypatch.setattr(pyship.clip_template, "copy_tree", copy_tree_then_other_build)
+    template_dir = get_clip_template(install_dir, cache_dir)
+    assert template_dir == other_templates[0]
+    assert Path(template_dir, "in_use.txt").exists()  # the other build's template is used, not replaced
+    assert sorted(path.name for path in Path(cache_dir, CLIP_TEMPLATE_DIR_NAME).iterdir()) == [install_dir.name]
+
+
+def test_materialise_links_and_copies(tmp_path):
+    install_dir = _make_python_install(Path(tmp_path, "cpython-3.12.8-windows-x86_64-none"))
+    template_dir = get_clip_template(install_dir, Path(tmp_path, "cache"))
+    clip_dir = Path(tmp_path, "app", "myapp_0.0.1")
+
+    copy_stats = materialise_clip_template(template_dir, clip_dir)
+
+    assert copy_stats.files == 7
+    assert 0 < copy_stats.linked < 7
+    assert Path(clip_dir, "python.exe").read_text() == "exe"
+    # read-only files share the template's contents
+    assert os.path.samefile(Path(clip_dir, "Lib", "os.py"), Path(template_dir, "Lib", "os.py"))
+    # files that get modified later are private copies
+    for relative_path in ("Lib/site-packages/pip/__init__.py", "python312._pth"):
+        assert not os.path.samefile(Path(clip_dir, relative_path), Path(template_dir, relative_path))
+
+    Path(clip_dir, "Lib", "site-packages", "pip", "__init__.py").write_text("# upgraded")
+    assert Path(template_dir, "Lib", "site-packages", "pip", "__init__.py").read_text() == "# pip"
+
+
+def test_materialise_replaces_existing(tmp_path):
+    install_dir = _make_python_install(Path(tmp_path, "cpython-3.12.8-windows-x86_64-none"))
+    template_dir = get_clip_template(install_dir, Path(tmp_path, "cache"))
+    clip_dir = Path(tmp_path, "clip")
+    clip_dir.mkdir()
+    Path(clip_dir, "stale.txt").write_text("stale")
+    materialise_clip_template(template_dir, clip_dir)
+    assert not Path(clip_dir, "stale.txt").exists()
+
+
+def test_materialise_falls_back_to_copy(tmp_path, monkeypatch):
+    install_dir = _make_python_install(Path(tmp_path, "cpython-3.12.8-windows-x86_64-none"))
+    template_dir = get_clip_template(install_dir, Path(tmp_path, "cache"))
+
+    def no_link(source, dest):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(os, "link", no_link)
+    copy_stats = materialise_clip_template(template_dir, Path(tmp_path, "clip"))
+    assert copy_stats.linked == 0
+    assert copy_stats.files == 7
+
+
+def test_write_pyvenv_cfg(tmp_path):
+    write_pyvenv_cfg(tmp_path)
+    assert Path(tmp_path, "pyvenv.cfg").read_text(encoding="utf-8") == f"home = {tmp_path.resolve()}\ninclude-system-site-packages = false\n"
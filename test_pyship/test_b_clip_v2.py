@@ -0,0 +1,120 @@
+import os
+import shutil
+import struct
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from pyship import create_clip_file
+from pyship.clip_archive import write_clip_archive
+from pyship.clip_v2 import is_zstd_available, write_clip_v2_archive, read_clip_format, extract_clip, train_clip_dictionary, ClipV2ArchiveWriter, CLIP_V2_MAGIC, CLIP_FORMAT_ZIP, CLIP_FORMAT_V2
+
+pytestmark = pytest.mark.skipif(not is_zstd_available(), reason="zstd not available")
+
+
+def _make_clip(clip_dir: Path) -> dict:
+    contents = {
+        "python.exe": b"MZ" + os.urandom(1000),
+        "Lib/site-packages/tapp/data/icon.png": b"\x89PNG" + os.urandom(100),
+        "Lib/site-packages/tapp/data/big.bin": bytes(range(256)) * 4096,
+        "Lib/site-packages/tapp/data/empty.txt": b"",
+    }
+    # enough small .py files for a dictionary
+    contents.update(
+        {f"Lib/pkg{index}/module.py": f'"""module {index}"""\n\nimport os\n\n\ndef function_{index}(value: int) -> int:\n    return value * {index}\n'.encode() for index in range(200)}
+    )
+    for relative_path, content in contents.items():
+        file_path = Path(clip_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+    Path(clip_dir, "Lib", "empty_dir").mkdir()
+    return contents
+
+
+def _check_extracted(dest_dir: Path, contents: dict):
+    for relative_path, content in contents.items():
+        assert Path(dest_dir, relative_path).read_bytes() == content
+    assert Path(dest_dir, "Lib", "empty_dir").is_dir()
+
+
+def test_clip_v2_round_trip(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    contents = _make_clip(clip_dir)
+    zip_path = Path(tmp_path, "zip.clip")
+    v2_path = Path(tmp_path, "v2.clip")
+    write_clip_archive(clip_dir, zip_path)
+    archive_stats = write_clip_v2_archive(clip_dir, v2_path, workers=4)
+    assert archive_stats.files == len(contents)
+    assert archive_stats.classes[".png"].stored == 1
+    assert v2_path.read_bytes().startswith(CLIP_V2_MAGIC)
+    assert v2_path.stat().st_size < zip_path.stat().st_size
+
+    assert read_clip_format(zip_path) == CLIP_FORMAT_ZIP
+    assert read_clip_format(v2_path) == CLIP_FORMAT_V2
+    assert extract_clip(v2_path, Path(tmp_path, "v2")) == len(contents)
+    _check_extracted(Path(tmp_path, "v2"), contents)
+    assert extract_clip(zip_path, Path(tmp_path, "zip")) == len(contents)
+    _check_extracted(Path(tmp_path, "zip"), contents)
+
+
+def test_clip_v2_dictionary(tmp_path):
+    clip_dir = Path(tmp_path, "tapp_0.0.1")
+    contents = _make_clip(clip_dir)
+    assert train_clip_dictionary(clip_dir) is not None
+    with_dictionary = write_clip_v2_archive(clip_dir, Path(tmp_path, "with.clip"))
+    without_dictionary = write_clip_v2_archive(clip_dir, Path(tmp_path, "without.clip"), dictionary=False)
+    assert with_dictionary.classes[".py"].compressed_bytes < without_dictionary.classes[".py"].compressed_bytes
+    extract_clip(Path(tmp_path, "without.clip"), Path(tmp_path, "without"))
+    _check_extracted(Path(tmp_path, "without"), contents)
+
+    few_dir = Path(tmp_path, "few")
+    Path(few_dir, "a.py").parent.mkdir()
+    Path(few_dir, "a.py").write_text("a = 1\n")
+    assert train_clip_dictionary(few_dir) is None
+
+
+def test_clip_v2_reproducible(tmp_path):
+    clip_dir = Path(tmp_path, "a", "tapp_0.0.1")
+    _make_clip(clip_dir)
+    other_clip_dir = Path(tmp_path, "b", "tapp_0.0.1")
+    shutil.copytree(clip_dir, other_clip_dir)
+    for file_path in other_clip_dir.rglob("*"):
+        os.utime(file_path, (1234567890, 1234567890))
+    write_clip_v2_archive(clip_dir, Path(tmp_path, "a.clip"), workers=1)
+    write_clip_v2_archive(other_clip_dir, Path(tmp_path, "b.clip"), workers=8)
+    assert Path(tmp_path, "a.clip").read_bytes() == Path(tmp_path, "b.clip").read_bytes()
+
+
+def test_read_clip_format_invalid(tmp_path):
+    not_clip_path = Path(tmp_path, "not.clip")
+    not_clip_path.write_bytes(b"not a clip file")
+    with pytest.raises(ValueError):
+        read_clip_format(not_clip_path)
+
+    future_path = Path(tmp_path, "future.clip")
+    future_path.write_bytes(struct.pack("<10sHHI", CLIP_V2_MAGIC, 3, 0, 0))
+    assert read_clip_format(future_path) == 3
+    with pytest.raises(ValueError):
+        extract_clip(future_path, Path(tmp_path, "future"))
+
+
+def test_extract_clip_outside_dest(tmp_path):
+    Path(tmp_path, "evil.txt").write_text("evil")
+    archive_path = Path(tmp_path, "evil.clip")
+    with ClipV2ArchiveWriter(archive_path) as writer:
+        writer.add_file(Path(tmp_path, "evil.txt"), "../evil.txt")
+    with pytest.raises(ValueError):
+        extract_clip(archive_path, Path(tmp_path, "dest"))
+
+
+def test_create_clip_file_v2(tmp_path):
+    clip_dir = Path(tmp_path, "clips", "tapp_0.0.1")
+    contents = _make_clip(clip_dir)
+    clip_path = create_clip_file(clip_dir, clip_format=CLIP_FORMAT_V2)
+    assert read_clip_format(clip_path) == CLIP_FORMAT_V2
+    assert not zipfile.is_zipfile(clip_path)
+    extract_clip(clip_path, Path(tmp_path, "extracted"))
+    _check_extracted(Path(tmp_path, "extracted"), contents)
+    with pytest.raises(ValueError):
+        create_clip_file(clip_dir, clip_format=3)
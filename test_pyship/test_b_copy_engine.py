@@ -0,0 +1,127 @@
+import errno
+import os
+from pathlib import Path
+
+import pyship.copy_engine
+from pyship.copy_engine import copy_tree, copy_file, CopyStats, LARGE_FILE_SIZE
+
+
+def _make_tree(root: Path) -> dict:
+    contents = {
+        "a.txt": b"a",
+        "sub/b.txt": b"b" * 100,
+        "sub/deeper/c.bin": os.urandom(LARGE_FILE_SIZE + 12345),  # streamed
+        "empty.txt": b"",
+    }
+    contents.update({f"many/{index}.py": f"# {index}".encode() for index in range(200)})  # several small file batches
+    for relative_path, content in contents.items():
+        file_path = Path(root, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+    Path(root, "empty_dir").mkdir()
+    return contents
+
+
+def test_copy_tree(tmp_path):
+    source_dir = Path(tmp_path, "source")
+    contents = _make_tree(source_dir)
+    dest_dir = Path(tmp_path, "dest")
+
+    copy_stats = copy_tree(source_dir, dest_dir, workers=4)
+
+    for relative_path, content in contents.items():
+        assert Path(dest_dir, relative_path).read_bytes() == content
+    assert Path(dest_dir, "empty_dir").is_dir()
+    assert copy_stats.files == len(contents)
+    assert copy_stats.bytes == sum(len(content) for content in contents.values())
+    assert copy_stats.linked == 0
+    assert copy_stats.seconds > 0.0
+    assert "files/s" in str(copy_stats)
+
+
+def test_copy_tree_overwrites(tmp_path):
+    source_dir = Path(tmp_path, "source")
+    _make_tree(source_dir)
+    dest_dir = Path(tmp_path, "dest")
+    dest_dir.mkdir()
+    Path(dest_dir, "a.txt").write_text("old")
+    copy_tree(source_dir, dest_dir)
+    assert Path(dest_dir, "a.txt").read_text() == "a"
+
+
+def test_copy_tree_link_filter(tmp_path):
+    source_dir = Path(tmp_path, "source")
+    contents = _make_tree(source_dir)
+    dest_dir = Path(tmp_path, "dest")
+
+    copy_stats = copy_tree(source_dir, dest_dir, link_filter=lambda relative_path: relative_path.startswith("many/"))
+
+    assert copy_stats.linked == 200
+    assert copy_stats.files == len(contents)
+    assert os.path.samefile(Path(dest_dir, "many", "0.py"), Path(source_dir, "many", "0.py"))
+    assert not os.path.samefile(Path(dest_dir, "sub", "b.txt"), Path(source_dir, "sub", "b.txt"))
+
+
+def test_copy_tree_link_fallback(tmp_path, monkeypatch):
+    source_dir = Path(tmp_path, "source")
+    contents = _make_tree(source_dir)
+    link_attempts = []
+
+    def no_link(source, dest):
+        link_attempts.append(source)
+        raise OSError(errno.EXDEV, "cross-device link")
+
+    monkeypatch.setattr(os, "link", no_link)
+    copy_stats = copy_tree(source_dir, Path(tmp_path, "dest"), link_filter=lambda relative_path: True, workers=1)
+    assert copy_stats.linked == 0
+    assert copy_stats.files == len(contents)
+    assert len(link_attempts) == 1  # gives up on hardlinks after the first failure
+
+
+def test_copy_tree_link_file_failure(tmp_path, monkeypatch):
+    source_dir = Path(tmp_path, "source")
+    dest_dir = Path(tmp_path, "dest")
+    contents = _make_tree(source_dir)
+    link = os.link
+
+    def link_except_one(source, dest):
+        if Path(source).name == "b.txt":
+            raise PermissionError(errno.EACCES, "locked")  # one file that can't be linked (e.g. locked on Windows)
+        link(source, dest)
+
+    monkeypatch.setattr(os, "link", link_except_one)
+    copy_stats = copy_tree(source_dir, dest_dir, link_filter=lambda relative_path: True, workers=1)
+    assert copy_stats.files == len(contents)
+    assert copy_stats.linked == len(contents) - 1  # only that file is copied
+    assert Path(dest_dir, "sub", "b.txt").read_bytes() == contents["sub/b.txt"]
+
+
+def test_copy_file_large(tmp_path, monkeypatch):
+    source = Path(tmp_path, "large.bin")
+    content = os.urandom(3 * LARGE_FILE_SIZE + 1)
+    source.write_bytes(content)
+    os.utime(source, (1_000_000_000, 1_000_000_000))
+    monkeypatch.setattr(pyship.copy_engine, "STREAM_CHUNK_SIZE", LARGE_FILE_SIZE)  # several chunks
+
+    dest = Path(tmp_path, "copy.bin")
+    assert copy_file(source, dest) == len(content)
+    assert dest.read_bytes() == content
+    assert dest.stat().st_mtime == 1_000_000_000  # metadata copied like shutil.copy2
+
+
+def test_copy_file_user_space_fallback(tmp_path, monkeypatch):
+    source = Path(tmp_path, "large.bin")
+    content = os.urandom(LARGE_FILE_SIZE + 1)
+    source.write_bytes(content)
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    monkeypatch.delattr(os, "sendfile", raising=False)
+    dest = Path(tmp_path, "copy.bin")
+    copy_file(source, dest)
+    assert dest.read_bytes() == content
+
+
+def test_copy_stats_rates():
+    copy_stats = CopyStats(files=10, bytes=2_000_000, seconds=2.0)
+    assert copy_stats.files_per_second == 5.0
+    assert copy_stats.bytes_per_second == 1_000_000.0
+    assert CopyStats().bytes_per_second == 0.0
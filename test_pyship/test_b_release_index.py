@@ -0,0 +1,71 @@
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+from pyship import PyShipCloud, PyshipReleaseIndexConflict, create_release, add_release, get_latest_release, get_release_index_name
+
+
+def _release(tmp_path: Path, version: str, **kwargs) -> dict:
+    clip_path = Path(tmp_path, f"tapp_{version}.clip")
+    clip_path.write_bytes(f"clip {version}".encode())
+    return create_release(version, clip_path, clip_path.name, **kwargs)
+
+
+def test_release_index(tmp_path):
+    published = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    release = _release(tmp_path, "0.0.2", delta_keys=["tapp_0.0.1_to_0.0.2.clippatch"], installer_key="tapp_installer_win64.exe", published=published)
+    assert release["size"] == len(b"clip 0.0.2")
+    assert len(release["sha256"]) == 64
+    assert release["published"] == "2026-01-02T03:04:05+00:00"
+
+    release_index = add_release(None, "tapp", release)
+    release_index = add_release(release_index, "tapp", _release(tmp_path, "0.0.10"))
+    release_index = add_release(release_index, "tapp", _release(tmp_path, "0.0.1"))
+    assert [r["version"] for r in release_index["releases"]] == ["0.0.1", "0.0.2", "0.0.10"]  # by version, not name
+    assert get_latest_release(release_index)["version"] == "0.0.10"
+
+    release_index = add_release(release_index, "tapp", _release(tmp_path, "0.0.2"))  # republished
+    assert len(release_index["releases"]) == 3
+    assert get_latest_release(None) is None
+
+    with pytest.raises(ValueError):
+        add_release(release_index, "other_app", release)
+
+
+def test_publish_release(tmp_path, moto_s3_access):
+    cloud_access = PyShipCloud("tapp", moto_s3_access)
+    assert cloud_access.get_latest_release() is None  # no bucket yet
+    cloud_access.publish_release(_release(tmp_path, "0.0.1"))
+    cloud_access.publish_release(_release(tmp_path, "0.0.2"))
+    assert cloud_access.get_latest_release()["version"] == "0.0.2"
+
+
+def test_publish_release_concurrent(tmp_path, moto_s3_access, monkeypatch):
+    cloud_access = PyShipCloud("tapp", moto_s3_access)
+    cloud_access.publish_release(_release(tmp_path, "0.0.1"))
+    other_release = _release(tmp_path, "0.0.2")
+    get_release_index = cloud_access.get_release_index
+
+    def get_release_index_then_other_publisher():
+        # another publisher adds its release between this one's read and write
+        release_index, etag = get_release_index()
+        if other_release["version"] not in [r["version"] for r in release_index["releases"]]:
+            body = json.dumps(add_release(release_index, "tapp", other_release)).encode()
+            moto_s3_access.client.put_object(Bucket=moto_s3_access.bucket_name, Key=get_release_index_name("tapp"), Body=body)
+        return release_index, etag
+
+    monkeypatch.setattr(cloud_access, "get_release_index", get_release_index_then_other_publisher)
+    cloud_access.publish_release(_release(tmp_path, "0.0.3"))
+    release_index, _ = get_release_index()
+    assert [r["version"] for r in release_index["releases"]] == ["0.0.1", "0.0.2", "0.0.3"]  # nothing lost
+
+
+def test_publish_release_conflict(tmp_path, moto_s3_access, monkeypatch):
+    cloud_access = PyShipCloud("tapp", moto_s3_access)
+    cloud_access.publish_release(_release(tmp_path, "0.0.1"))
+    release_index, _ = cloud_access.get_release_index()
+    monkeypatch.setattr(cloud_access, "get_release_index", lambda: (release_index, '"stale"'))
+    with pytest.raises(PyshipReleaseIndexConflict):
+        cloud_access.publish_release(_release(tmp_path, "0.0.2"), attempts=2)
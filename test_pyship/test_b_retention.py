@@ -0,0 +1,159 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from semver import VersionInfo
+
+from pyship import PyShip, PyShipCloud, get_expired_versions, prune_cloud, prune_local, create_release
+from pyship.arguments import get_arguments
+from pyship.chunk_store import get_chunk_key
+from pyship.cloud import MAX_DELETE_KEYS
+from pyship.retention import version_from_artifact_name
+
+NOW = datetime(2026, 6, 1, tzinfo=timezone.utc)
+
+
+def test_version_from_artifact_name():
+    assert version_from_artifact_name("tapp", "tapp_0.0.2.clip") == VersionInfo.parse("0.0.2")
+    assert version_from_artifact_name("tapp", "tapp_0.0.2.clipchunks") == VersionInfo.parse("0.0.2")
+    assert version_from_artifact_name("tapp", "tapp_0.0.2_clip_manifest.json") == VersionInfo.parse("0.0.2")
+    assert version_from_artifact_name("tapp", "tapp_0.0.1_to_0.0.2.clippatch") == VersionInfo.parse("0.0.2")  # the version it patches to
+    assert version_from_artifact_name("tapp", "tapp_0.0.2") == VersionInfo.parse("0.0.2")  # CLIP dir
+    for name in ("tapp_installer_win64.exe", "tapp_releases.json", "other_0.0.2.clip", "chunks/abc"):
+        assert version_from_artifact_name("tapp", name) is None
+
+
+def test_get_expired_versions():
+    published = {VersionInfo.parse(f"0.0.{minor}"): NOW - timedelta(days=100 - minor) for minor in range(1, 11)}
+    # newest 3, plus anything from the last 94 days (0.0.6 on), plus pinned 0.0.2
+    assert get_expired_versions(published, 3, 94, ["0.0.2"], NOW) == [VersionInfo.parse(v) for v in ("0.0.1", "0.0.3", "0.0.4", "0.0.5")]
+    assert get_expired_versions(published, 20, 0, now=NOW) == []
+    assert get_expired_versions(published, 1, 0, now=NOW) == sorted(published)[:-1]  # the latest is always kept
+    with pytest.raises(ValueError):
+        get_expired_versions(published, 0, 0)
+
+
+def _write(file_path: Path, content: bytes = b"x"):
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_bytes(content)
+
+
+def test_prune_local(tmp_path):
+    app_dir = Path(tmp_path, "app", "tapp")
+    for minor in range(1, 5):
+        _write(Path(app_dir, f"tapp_0.0.{minor}", "python.exe"), b"python")
+        _write(Path(app_dir.parent, f"tapp_0.0.{minor}.clip"))
+    _write(Path(app_dir.parent, "tapp_0.0.1_to_0.0.2.clippatch"))
+    _write(Path(app_dir.parent, "other_file.txt"))
+
+    report = prune_local(app_dir, "tapp", keep_versions=2, keep_days=0, dry_run=True)
+    assert report.expired == [VersionInfo.parse("0.0.1"), VersionInfo.parse("0.0.2")]
+    assert len(report.deleted) == 5
+    assert Path(app_dir, "tapp_0.0.1").exists()  # dry run
+
+    report = prune_local(app_dir, "tapp", keep_versions=2, keep_days=0, pinned=["0.0.1"])
+    assert report.expired == [VersionInfo.parse("0.0.2")]
+    assert sorted(path.name for path in app_dir.iterdir()) == ["tapp_0.0.1", "tapp_0.0.3", "tapp_0.0.4"]
+    assert sorted(path.name for path in app_dir.parent.iterdir() if path.is_file()) == ["other_file.txt", "tapp_0.0.1.clip", "tapp_0.0.3.clip", "tapp_0.0.4.clip"]
+
+    assert prune_local(app_dir, "tapp", keep_days=0).expired == []  # within keep_versions
+    assert prune_local(Path(tmp_path, "missing", "tapp"), "tapp").kept == []
+
+
+def test_prune_cloud(tmp_path, moto_s3_access):
+    cloud_access = PyShipCloud("tapp", moto_s3_access)
+    for minor in range(1, 5):
+        clip_path = Path(tmp_path, f"tapp_0.0.{minor}.clip")
+        _write(clip_path, os.urandom(100))
+        cloud_access.upload(clip_path)
+        cloud_access.publish_release(create_release(f"0.0.{minor}", clip_path, clip_path.name, published=NOW - timedelta(days=10 - minor)))
+    patch_path = Path(tmp_path, "tapp_0.0.1_to_0.0.2.clippatch")
+    _write(patch_path)
+    cloud_access.upload(patch_path)
+
+    # a chunked version - one chunk shared with a kept version, one only its own
+    client = moto_s3_access.client
+    bucket = moto_s3_access.bucket_name
+    for sha256 in ("shared", "old", "unreferenced"):
+        client.put_object(Bucket=bucket, Key=get_chunk_key(sha256), Body=b"chunk")
+    client.put_object(Bucket=bucket, Key="tapp_0.0.1.clipchunks", Body=json.dumps({"chunks": [{"sha256": "shared"}, {"sha256": "old"}]}).encode())
+    client.put_object(Bucket=bucket, Key="tapp_0.0.4.clipchunks", Body=json.dumps({"chunks": [{"sha256": "shared"}]}).encode())
+
+    later = datetime.now(timezone.utc) + timedelta(days=2)  # the chunks are past their grace period
+    report = prune_cloud(cloud_access, keep_versions=2, keep_days=0, dry_run=True, now=later)
+    assert report.expired == [VersionInfo.parse("0.0.1"), VersionInfo.parse("0.0.2")]
+    assert moto_s3_access.object_exists("tapp_0.0.1.clip")  # dry run
+
+    report = prune_cloud(cloud_access, keep_versions=2, keep_days=0, now=later)
+    assert report.failed == []
+    remaining = set(cloud_access.list_objects())
+    assert "tapp_0.0.1.clip" not in remaining and "tapp_0.0.1_to_0.0.2.clippatch" not in remaining and "tapp_0.0.1.clipchunks" not in remaining
+    assert {"tapp_0.0.3.clip", "tapp_0.0.4.clip", "tapp_0.0.4.clipchunks", get_chunk_key("shared")} <= remaining
+    assert get_chunk_key("old") not in remaining and get_chunk_key("unreferenced") not in remaining
+    release_index, _ = cloud_access.get_release_index()
+    assert [release["version"] for release in release_index["releases"]] == ["0.0.3", "0.0.4"]
+    assert cloud_access.get_latest_release()["version"] == "0.0.4"
+
+
+def test_prune_cloud_concurrent_publish(tmp_path, moto_s3_access, monkeypatch):
+    cloud_access = PyShipCloud("tapp", moto_s3_access)
+    client = moto_s3_access.client
+    bucket = moto_s3_access.bucket_name
+    for minor in range(1, 4):
+        clip_path = Path(tmp_path, f"tapp_0.0.{minor}.clip")
+        _write(clip_path, os.urandom(100))
+        cloud_access.upload(clip_path)
+        cloud_access.publish_release(create_release(f"0.0.{minor}", clip_path, clip_path.name, published=NOW - timedelta(days=10 - minor)))
+    for sha256 in ("old", "unreferenced"):
+        client.put_object(Bucket=bucket, Key=get_chunk_key(sha256), Body=b"chunk")
+    client.put_object(Bucket=bucket, Key="tapp_0.0.1.clipchunks", Body=json.dumps({"chunks": [{"sha256": "old"}]}).encode())
+
+    # a chunked publish that found the "old" chunk already in the bucket writes its chunk manifest while pruning
+    unpublish_releases = cloud_access.unpublish_releases
+
+    def unpublish_releases_then_other_publisher(versions):
+        url = unpublish_releases(versions)
+        client.put_object(Bucket=bucket, Key="tapp_0.0.4.clipchunks", Body=json.dumps({"chunks": [{"sha256": "old"}]}).encode())
+        return url
+
+    monkeypatch.setattr(cloud_access, "unpublish_releases", unpublish_releases_then_other_publisher)
+    report = prune_cloud(cloud_access, keep_versions=1, keep_days=0, now=datetime.now(timezone.utc) + timedelta(days=2))
+    assert report.expired == [VersionInfo.parse("0.0.1"), VersionInfo.parse("0.0.2")]
+    remaining = set(cloud_access.list_objects())
+    assert get_chunk_key("old") in remaining and get_chunk_key("unreferenced") not in remaining
+    assert "tapp_0.0.1.clipchunks" not in remaining and "tapp_0.0.4.clipchunks" in remaining
+    assert get_chunk_key("old") not in report.deleted
+
+
+def test_delete_batches(moto_s3_access, monkeypatch):
+    cloud_access = PyShipCloud("tapp", moto_s3_access)
+    cloud_access.uploader.ensure_bucket()
+    client = moto_s3_access.client
+    s3_keys = [f"chunks/{index}" for index in range(MAX_DELETE_KEYS + 5)]
+    for s3_key in s3_keys:
+        client.put_object(Bucket=moto_s3_access.bucket_name, Key=s3_key, Body=b"")
+    batch_sizes = []
+    delete_objects = client.delete_objects
+    monkeypatch.setattr(client, "delete_objects", lambda **kwargs: batch_sizes.append(len(kwargs["Delete"]["Objects"])) or delete_objects(**kwargs))
+    assert cloud_access.delete(s3_keys) == []
+    assert batch_sizes == [MAX_DELETE_KEYS, 5]
+    assert cloud_access.list_objects() == {}
+
+
+def test_prune_releases_command(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["pyship", "prune-releases", "--keep-versions", "3", "--dry-run"])
+    args = get_arguments()
+    assert (args.command, args.keep_versions, args.dry_run) == ("prune-releases", 3, True)
+    monkeypatch.setattr("sys.argv", ["pyship", "prune"])  # not to be confused with --prune (the CLIP pruning profile)
+    with pytest.raises(SystemExit):
+        get_arguments()
+
+
+def test_prune_releases_local(tmp_path):
+    Path(tmp_path, "pyproject.toml").write_text('[project]\nname = "tapp"\nversion = "0.0.1"\nauthors = [{name = "Test Author"}]\n')
+    _write(Path(tmp_path, "app", "tapp", "tapp_0.0.1", "python.exe"))
+    local_report, cloud_report = PyShip(tmp_path, keep_days=0).prune_releases(dry_run=True)
+    assert local_report.kept == [VersionInfo.parse("0.0.1")]
+    assert cloud_report is None  # no cloud access
@@ -0,0 +1,201 @@
+import os
+import threading
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from pyship import PyShip, PyShipCloud, APP_DIR_NAME
+from pyship.s3_upload import S3Uploader, MIN_PART_SIZE
+
+
+def test_s3_uploader(tmp_path, moto_s3_access, monkeypatch):
+    create_bucket_calls = []
+    create_bucket = moto_s3_access.create_bucket
+    monkeypatch.setattr(moto_s3_access, "create_bucket", lambda: create_bucket_calls.append(1) or create_bucket())
+    uploader = S3Uploader(moto_s3_access, part_size=MIN_PART_SIZE, concurrency=4)
+
+    large_path = Path(tmp_path, "tapp_installer_win64.exe")
+    large_path.write_bytes(os.urandom(2 * MIN_PART_SIZE + 1000))
+    progress = []
+    stats = uploader.upload_file(large_path, large_path.name, lambda uploaded, size: progress.append((uploaded, size)))
+    assert stats.parts == 3
+    assert stats.bytes == large_path.stat().st_size
+    assert stats.bytes_per_second > 0
+    assert "MB/s" in str(stats)
+    assert sorted(progress)[-1] == (stats.bytes, stats.bytes)
+
+    small_path = Path(tmp_path, "tapp_0.0.1.clip")
+    small_path.write_bytes(b"small")
+    assert uploader.upload_file(small_path, small_path.name).parts == 1
+    assert len(create_bucket_calls) == 1  # once per uploader
+    uploader.close()
+
+    for file_path in (large_path, small_path):
+        download_path = Path(tmp_path, "downloads", file_path.name)
+        download_path.parent.mkdir(exist_ok=True)
+        moto_s3_access.download(file_path.name, download_path)
+        assert download_path.read_bytes() == file_path.read_bytes()
+
+
+def test_s3_uploader_failure(tmp_path, moto_s3_access, monkeypatch):
+    uploader = S3Uploader(moto_s3_access, part_size=MIN_PART_SIZE)
+    client = moto_s3_access.client
+    upload_part = client.upload_part
+
+    def failing_upload_part(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise ConnectionError("injected failure")
+        return upload_part(**kwargs)
+
+    monkeypatch.setattr(client, "upload_part", failing_upload_part)
+    file_path = Path(tmp_path, "tapp_installer_win64.exe")
+    file_path.write_bytes(os.urandom(2 * MIN_PART_SIZE))
+    with pytest.raises(ConnectionError):
+        uploader.upload_file(file_path, file_path.name)
+    assert client.list_multipart_uploads(Bucket=moto_s3_access.bucket_name).get("Uploads", []) == []  # aborted
+    assert not moto_s3_access.object_exists(file_path.name)
+
+    with pytest.raises(ValueError):
+        S3Uploader(moto_s3_access, part_size=MIN_PART_SIZE - 1)
+    with pytest.raises(ValueError):
+        S3Uploader(moto_s3_access, concurrency=0)
+
+
+def test_pyship_cloud_upload(tmp_path, moto_s3_access):
+    cloud_access = PyShipCloud("tapp", moto_s3_access, part_size=MIN_PART_SIZE)
+    file_path = Path(tmp_path, "tapp_0.0.1.clip")
+    file_path.write_bytes(os.urandom(MIN_PART_SIZE + 1))
+    url = cloud_access.upload(file_path)
+    assert file_path.name in url
+    assert moto_s3_access.object_exists(file_path.name)
+
+
+def test_s3_uploader_skip(tmp_path, moto_s3_access):
+    uploader = S3Uploader(moto_s3_access, part_size=MIN_PART_SIZE)
+    file_path = Path(tmp_path, "tapp_installer_win64.exe")
+    file_path.write_bytes(os.urandom(MIN_PART_SIZE + 1000))
+    assert not uploader.upload_file(file_path, file_path.name).skipped
+    assert uploader.upload_file(file_path, file_path.name).skipped  # by the SHA-256 in the object's metadata
+    assert not uploader.upload_file(file_path, file_path.name, force=True).skipped
+
+    file_path.write_bytes(os.urandom(MIN_PART_SIZE + 1000))  # same size, new contents
+    assert not uploader.is_up_to_date(file_path, file_path.name)
+    assert not uploader.upload_file(file_path, file_path.name).skipped
+
+    # uploaded by another tool, without the metadata - compared by the MD5 ETag
+    other_path = Path(tmp_path, "tapp_0.0.1.clip")
+    other_path.write_bytes(b"uploaded elsewhere")
+    moto_s3_access.client.put_object(Bucket=moto_s3_access.bucket_name, Key=other_path.name, Body=other_path.read_bytes())
+    assert uploader.is_up_to_date(other_path, other_path.name)
+    assert not uploader.is_up_to_date(other_path, "missing.clip")
+
+
+def _fail_part(monkeypatch, client, failing_part_number: int) -> List[int]:
+    # inject a network failure uploading one part, and record the parts uploaded
+    uploaded_parts = []
+    upload_part = getattr(client.upload_part, "__wrapped__", client.upload_part)  # the client's, not an earlier injection's
+
+    def failing_upload_part(**kwargs):
+        if kwargs["PartNumber"] == failing_part_number:
+            raise ConnectionError("injected failure")
+        uploaded_parts.append(kwargs["PartNumber"])
+        return upload_part(**kwargs)
+
+    failing_upload_part.__wrapped__ = upload_part  # type: ignore[attr-defined]
+    monkeypatch.setattr(client, "upload_part", failing_upload_part)
+    return uploaded_parts
+
+
+def test_s3_uploader_resume(tmp_path, moto_s3_access, monkeypatch):
+    state_dir = Path(tmp_path, "uploads")
+    file_path = Path(tmp_path, "tapp_0.0.1.clip")
+    file_path.write_bytes(os.urandom(4 * MIN_PART_SIZE - 1000))
+    client = moto_s3_access.client
+
+    uploader = S3Uploader(moto_s3_access, part_size=MIN_PART_SIZE, concurrency=1, state_dir=state_dir)
+    interrupted_parts = _fail_part(monkeypatch, client, 3)
+    with pytest.raises(ConnectionError):
+        uploader.upload_file(file_path, file_path.name)
+    assert 3 not in interrupted_parts and {1, 2} <= set(interrupted_parts)  # part 4 may have been uploaded too
+    assert len(list(state_dir.glob("*.json"))) == 1
+    assert len(client.list_multipart_uploads(Bucket=moto_s3_access.bucket_name)["Uploads"]) == 1  # left to be resumed
+
+    # e.g. ship() run again
+    uploader = S3Uploader(moto_s3_access, part_size=MIN_PART_SIZE, concurrency=1, state_dir=state_dir)
+    uploaded_parts = _fail_part(monkeypatch, client, 0)
+    stats = uploader.upload_file(file_path, file_path.name)
+    assert sorted(uploaded_parts) == sorted({1, 2, 3, 4} - set(interrupted_parts))  # only the missing parts
+    assert stats.resumed_parts == len(interrupted_parts)
+    assert f"({len(interrupted_parts)} resumed)" in str(stats)
+    assert list(state_dir.glob("*.json")) == []
+    download_path = Path(tmp_path, "download", file_path.name)
+    download_path.parent.mkdir()
+    moto_s3_access.download(file_path.name, download_path)
+    assert download_path.read_bytes() == file_path.read_bytes()
+    assert uploader.is_up_to_date(file_path, file_path.name)
+
+
+def test_s3_uploader_no_resume(tmp_path, moto_s3_access, monkeypatch):
+    state_dir = Path(tmp_path, "uploads")
+    file_path = Path(tmp_path, "tapp_0.0.1.clip")
+    file_path.write_bytes(os.urandom(2 * MIN_PART_SIZE))
+    client = moto_s3_access.client
+    uploader = S3Uploader(moto_s3_access, part_size=MIN_PART_SIZE, concurrency=1, state_dir=state_dir)
+    _fail_part(monkeypatch, client, 2)
+    with pytest.raises(ConnectionError):
+        uploader.upload_file(file_path, file_path.name)
+
+    # started over, and the interrupted upload is aborted
+    uploaded_parts = _fail_part(monkeypatch, client, 0)
+    assert uploader.upload_file(file_path, file_path.name, resume=False).resumed_parts == 0
+    assert uploaded_parts == [1, 2]
+    assert client.list_multipart_uploads(Bucket=moto_s3_access.bucket_name).get("Uploads", []) == []
+
+    # an interrupted upload that no longer exists in S3 (e.g. aborted by a lifecycle rule) also starts over
+    file_path.write_bytes(os.urandom(2 * MIN_PART_SIZE))
+    _fail_part(monkeypatch, client, 2)
+    with pytest.raises(ConnectionError):
+        uploader.upload_file(file_path, file_path.name)
+    for upload in client.list_multipart_uploads(Bucket=moto_s3_access.bucket_name)["Uploads"]:
+        client.abort_multipart_upload(Bucket=moto_s3_access.bucket_name, Key=upload["Key"], UploadId=upload["UploadId"])
+    uploaded_parts = _fail_part(monkeypatch, client, 0)
+    assert uploader.upload_file(file_path, file_path.name).resumed_parts == 0
+    assert uploaded_parts == [1, 2]
+
+
+def test_publish(tmp_path, moto_s3_access):
+    Path(tmp_path, "pyproject.toml").write_text('[project]\nname = "tapp"\nversion = "0.0.2"\nauthors = [{name = "Test Author"}]\n')
+    app_parent_dir = Path(tmp_path, APP_DIR_NAME)
+    app_parent_dir.mkdir()
+    for name in ("tapp_0.0.1.clip", "tapp_0.0.2.clip", "tapp_0.0.2_clip_manifest.json", "tapp_0.0.1_to_0.0.2.clippatch"):
+        Path(app_parent_dir, name).write_bytes(os.urandom(100))
+
+    py_ship = PyShip(tmp_path, cloud_bucket=moto_s3_access.bucket_name, cloud_id="test", cloud_secret="test")
+    thread_count = threading.active_count()
+    assert len(py_ship.publish(resume=True)) == 3  # no installer built
+    assert threading.active_count() == thread_count  # the upload threads are stopped
+    for name in ("tapp_0.0.2.clip", "tapp_0.0.2_clip_manifest.json", "tapp_0.0.1_to_0.0.2.clippatch"):
+        assert moto_s3_access.object_exists(name)
+    assert not moto_s3_access.object_exists("tapp_0.0.1.clip")
+    with PyShipCloud("tapp", moto_s3_access) as cloud_access:
+        latest_release = cloud_access.get_latest_release()
+    assert (latest_release["version"], latest_release["delta_keys"]) == ("0.0.2", ["tapp_0.0.1_to_0.0.2.clippatch"])
+
+
+def test_prune_releases_stops_upload_threads(tmp_path, moto_s3_access):
+    Path(tmp_path, "pyproject.toml").write_text('[project]\nname = "tapp"\nversion = "0.0.1"\nauthors = [{name = "Test Author"}]\n')
+    py_ship = PyShip(tmp_path, cloud_bucket=moto_s3_access.bucket_name, cloud_id="test", cloud_secret="test")
+    thread_count = threading.active_count()
+    _, cloud_report = py_ship.prune_releases(dry_run=True)
+    assert cloud_report is not None
+    assert threading.active_count() == thread_count
+
+
+def test_s3_uploader_context_manager(moto_s3_access):
+    thread_count = threading.active_count()
+    with S3Uploader(moto_s3_access, concurrency=4) as uploader:
+        assert threading.active_count() == thread_count + 4
+    assert threading.active_count() == thread_count
+    with pytest.raises(RuntimeError):
+        uploader.scheduler.submit(0, print)
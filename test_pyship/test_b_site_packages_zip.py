@@ -0,0 +1,79 @@
+import base64
+import hashlib
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+from pyship.site_packages_zip import pack_site_packages, get_distributions, add_pth_entry, SITE_PACKAGES_ZIP_NAME
+from pyship.bytecode import compile_clip
+
+
+def _install(site_packages_dir: Path, name: str, files: dict):
+    """Fake an installed distribution, with a RECORD."""
+    dist_info_dir = Path(site_packages_dir, f"{name}-1.0.dist-info")
+    files = {**files, f"{dist_info_dir.name}/METADATA": f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n"}
+    records = []
+    for relative_path, content in files.items():
+        file_path = Path(site_packages_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+        digest = base64.urlsafe_b64encode(hashlib.sha256(content.encode()).digest()).rstrip(b"=").decode()
+        records.append(f"{relative_path},sha256={digest},{len(content)}")
+    records.append(f"{dist_info_dir.name}/RECORD,,")
+    records.append(f"../../Scripts/{name}.exe,,")
+    Path(dist_info_dir, "RECORD").write_text("\n".join(records) + "\n")
+
+
+def _make_clip(clip_dir: Path) -> Path:
+    site_packages_dir = Path(clip_dir, "Lib", "site-packages")
+    _install(site_packages_dir, "pure_dep", {"pure_dep/__init__.py": "from pure_dep.core import VALUE\n", "pure_dep/core.py": "VALUE = 42\n"})
+    _install(site_packages_dir, "tapp", {"tapp/__init__.py": "import pure_dep\nRESULT = pure_dep.VALUE + 1\n", "tapp_hook.pth": "import os\n"})
+    _install(site_packages_dir, "native_dep", {"native_dep/__init__.py": "", "native_dep/_speedups.pyd": "binary"})
+    _install(site_packages_dir, "pip", {"pip/__init__.py": ""})
+    Path(clip_dir, "python312._pth").write_text(".\nLib\nLib\\site-packages\nDLLs\n")
+    return clip_dir
+
+
+def test_get_distributions(tmp_path):
+    clip_dir = _make_clip(tmp_path)
+    distributions = {d.name: d for d in get_distributions(Path(clip_dir, "Lib", "site-packages"))}
+    assert set(distributions) == {"pure_dep", "tapp", "native_dep", "pip"}
+    assert distributions["pure_dep"].is_pure
+    assert not distributions["native_dep"].is_pure
+    assert "pure_dep/core.py" in distributions["pure_dep"].files
+    assert not any(f.startswith("../") for f in distributions["pure_dep"].files)
+
+
+def test_pack_site_packages(tmp_path):
+    clip_dir = _make_clip(tmp_path)
+    compile_clip(Path(sys.executable), clip_dir)  # so the .pyc files get packed too
+    pack_stats = pack_site_packages(clip_dir, exclude=["Native-Dep"])
+
+    assert pack_stats.distributions == 2  # pure_dep and tapp (pip is excluded by default, native_dep has a .pyd)
+    site_packages_dir = Path(clip_dir, "Lib", "site-packages")
+    assert not Path(site_packages_dir, "pure_dep").exists()
+    assert Path(site_packages_dir, "tapp_hook.pth").exists()  # .pth files only work in site dirs
+    assert Path(site_packages_dir, "native_dep", "__init__.py").exists()
+    assert Path(site_packages_dir, "pip", "__init__.py").exists()
+
+    zip_path = Path(clip_dir, "Lib", SITE_PACKAGES_ZIP_NAME)
+    with zipfile.ZipFile(zip_path) as zip_file:
+        names = set(zip_file.namelist())
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in zip_file.infolist())
+    assert {"pure_dep/__init__.py", "pure_dep/core.py", "tapp/__init__.py", "pure_dep-1.0.dist-info/METADATA"} <= names
+    assert "pure_dep/core.pyc" in names  # the fake CLIP has no python3XX.dll, so its bytecode is for the running interpreter
+    assert "Lib\\site-packages.zip" in Path(clip_dir, "python312._pth").read_text().splitlines()
+
+    # importable from the zip, metadata included
+    code = f"import sys; sys.path[:0] = [{str(site_packages_dir)!r}, {str(zip_path)!r}]; import tapp, importlib.metadata; print(tapp.RESULT, importlib.metadata.version('pure_dep'))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert result.stdout.split() == ["43", "1.0"], result.stderr
+
+
+def test_add_pth_entry(tmp_path):
+    pth_path = Path(tmp_path, "python312._pth")
+    pth_path.write_text(".\nLib\nLib\\site-packages\nDLLs\n")
+    add_pth_entry(tmp_path, "Lib\\extra.zip")
+    add_pth_entry(tmp_path, "Lib\\extra.zip")
+    assert pth_path.read_text() == ".\nLib\nLib\\site-packages\nLib\\extra.zip\nDLLs\n"
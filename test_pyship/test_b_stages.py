@@ -0,0 +1,244 @@
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from semver import VersionInfo
+
+import pyship.pyship
+from pyship import AppInfo, PyShip, PyshipSigningUnavailable
+from pyship.build_cache import BuildCache
+from pyship.installer import get_installers_dir, installer_file_name
+from pyship.stages import Stage, run_stages, check_stage_graph
+
+
+def test_run_stages_passes_outputs_to_dependents():
+    stages = [
+        Stage("a", lambda: 1),
+        Stage("b", lambda: 2),
+        Stage("c", lambda a, b: a + b, ("a", "b")),
+        Stage("d", lambda c: c * 10, ("c",)),
+    ]
+    outputs = run_stages(stages)
+    assert outputs == {"a": 1, "b": 2, "c": 3, "d": 30}
+
+
+def test_run_stages_independent_stages_overlap():
+    # both stages must be running at the same time for either to get past the barrier
+    barrier = threading.Barrier(2, timeout=10)
+
+    def wait_for_other() -> bool:
+        barrier.wait()
+        return True
+
+    outputs = run_stages([Stage("a", wait_for_other), Stage("b", wait_for_other)])
+    assert outputs == {"a": True, "b": True}
+
+
+def test_run_stages_respects_dependencies():
+    order = []
+
+    def record(name):
+        def f(**_):
+            time.sleep(0.01)
+            order.append(name)
+            return name
+
+        return f
+
+    stages = [Stage("late", record("late"), ("early",)), Stage("early", record("early"))]
+    run_stages(stages)
+    assert order == ["early", "late"]
+
+
+def test_run_stages_failure_aborts_dependents():
+    ran = []
+
+    def fail():
+        raise RuntimeError("signing failed")
+
+    stages = [
+        Stage("sign", fail),
+        Stage("package", lambda sign: ran.append("package"), ("sign",)),
+        Stage("upload", lambda package: ran.append("upload"), ("package",)),
+    ]
+    with pytest.raises(RuntimeError, match="signing failed"):
+        run_stages(stages)
+    assert ran == []
+
+
+def test_run_stages_failure_does_not_start_ready_stages():
+    ran = []
+    release = threading.Event()
+
+    def fail():
+        raise ValueError("boom")
+
+    def slow():
+        release.wait(10)
+        return "slow"
+
+    def after_slow(slow):
+        ran.append("after_slow")
+
+    stages = [Stage("fail", fail), Stage("slow", slow), Stage("after_slow", after_slow, ("slow",))]
+    threading.Timer(0.2, release.set).start()
+    with pytest.raises(ValueError):
+        run_stages(stages)
+    assert ran == []
+
+
+def test_check_stage_graph_unknown_input():
+    with pytest.raises(ValueError, match="unknown input"):
+        check_stage_graph([Stage("a", lambda missing: None, ("missing",))])
+
+
+def test_check_stage_graph_duplicate_names():
+    with pytest.raises(ValueError, match="duplicate"):
+        check_stage_graph([Stage("a", lambda: None), Stage("a", lambda: None)])
+
+
+def test_check_stage_graph_cycle():
+    with pytest.raises(ValueError, match="cycle"):
+        check_stage_graph([Stage("a", lambda b: None, ("b",)), Stage("b", lambda a: None, ("a",))])
+
+
+def test_run_stages_empty():
+    assert run_stages([]) == {}
+
+
+def _make_app_info(project_dir):
+    app_info = AppInfo()
+    app_info.name = "testapp"
+    app_info.author = "Test Author"
+    app_info.version = VersionInfo.parse("1.2.3")
+    app_info.project_dir = project_dir
+    return app_info
+
+
+def _make_clip_dir(app_dir):
+    clip_dir = app_dir / "testapp_1.2.3"
+    clip_dir.mkdir(parents=True, exist_ok=True)
+    (clip_dir / "python.exe").write_bytes(b"python")
+    return clip_dir
+
+
+def test_ship_stages_signing_failure_aborts(tmp_path, monkeypatch):
+    built = []
+    monkeypatch.setattr(pyship.pyship, "create_pyship_launcher", lambda app_info, app_dir: tmp_path / "testapp.exe")
+    monkeypatch.setattr(pyship.pyship, "create_clip", lambda app_info, app_dir, *args, **kwargs: built.append("clip") or _make_clip_dir(app_dir))
+    monkeypatch.setattr(pyship.pyship, "run_nsis", lambda *args: built.append("nsis") or tmp_path / "installer.exe")
+    monkeypatch.setattr(pyship.pyship, "sign_if_configured", lambda file_path, signing_config: False)
+
+    py_ship = PyShip(tmp_path, upload=False, code_sign=True)
+    stages = py_ship._ship_stages(_make_app_info(tmp_path), tmp_path / "app" / "testapp", tmp_path / "cache", py_ship._signing_config())
+    assert [stage.name for stage in stages] == ["launcher", "clip", "installer"]
+    with pytest.raises(PyshipSigningUnavailable):
+        run_stages(stages)
+    assert "nsis" not in built
+
+
+class _FakeCloud:
+    def __init__(self, concurrent_names):
+        self.uploaded = []
+        self.releases = []
+        # the installer, .clip and CLIP manifest uploads must all be in progress at once to get past the barrier
+        self.concurrent_names = concurrent_names
+        self.barrier = threading.Barrier(len(concurrent_names), timeout=10)
+
+    def upload(self, file_path):
+        if file_path.name in self.concurrent_names:
+            self.barrier.wait()
+        self.uploaded.append(file_path.name)
+        return f"https://example.com/{file_path.name}"
+
+    def publish_release(self, release):
+        # only once everything is uploaded
+        assert len(self.uploaded) == len(self.concurrent_names) + 1
+        self.releases.append(release)
+        return "https://example.com/testapp_releases.json"
+
+
+def test_ship_stages_concurrent_upload(tmp_path, monkeypatch):
+    cloud = _FakeCloud({"installer.exe", "testapp_1.2.3.clip", "testapp_1.2.3_clip_manifest.json"})
+    monkeypatch.setattr(PyShip, "_connect_cloud", lambda self, app_info: cloud)
+    monkeypatch.setattr(pyship.pyship, "create_pyship_launcher", lambda app_info, app_dir: tmp_path / "testapp.exe")
+    monkeypatch.setattr(pyship.pyship, "create_clip", lambda app_info, app_dir, *args, **kwargs: _make_clip_dir(app_dir))
+    monkeypatch.setattr(pyship.pyship, "run_nsis", lambda *args: tmp_path / "installer.exe")
+    monkeypatch.setattr(pyship.pyship, "create_msix", lambda *args: tmp_path / "testapp.msix")
+
+    py_ship = PyShip(tmp_path, upload=True, msix=True, msix_publisher="CN=Test")
+    stages = py_ship._ship_stages(_make_app_info(tmp_path), tmp_path / "app" / "testapp", tmp_path / "cache", py_ship._signing_config())
+    upload_stage = next(stage for stage in stages if stage.name == "upload")
+    assert set(upload_stage.inputs) == {"upload_installer", "upload_clip", "upload_clip_manifest", "upload_msix"}
+    outputs = run_stages(stages)
+    assert sorted(cloud.uploaded) == sorted(["installer.exe", "testapp_1.2.3.clip", "testapp_1.2.3_clip_manifest.json", "testapp.msix"])  # including the MSIX
+    assert len(outputs["upload"]) == 4
+    assert [(release["version"], release["key"], release["installer_key"]) for release in cloud.releases] == [("1.2.3", "testapp_1.2.3.clip", "installer.exe")]
+
+
+def test_ship_stages_no_installer_no_upload(tmp_path, monkeypatch):
+    cloud = _FakeCloud(set())
+    monkeypatch.setattr(PyShip, "_connect_cloud", lambda self, app_info: cloud)
+    monkeypatch.setattr(pyship.pyship, "create_pyship_launcher", lambda app_info, app_dir: tmp_path / "testapp.exe")
+    monkeypatch.setattr(pyship.pyship, "create_clip", lambda app_info, app_dir, *args, **kwargs: _make_clip_dir(app_dir))
+    monkeypatch.setattr(pyship.pyship, "run_nsis", lambda *args: None)  # NSIS not available
+
+    py_ship = PyShip(tmp_path, upload=True)
+    outputs = run_stages(py_ship._ship_stages(_make_app_info(tmp_path), tmp_path / "app" / "testapp", tmp_path / "cache", py_ship._signing_config()))
+    assert outputs["upload"] == []
+    assert cloud.uploaded == []
+    assert outputs["release"] is None
+
+
+def test_ship_stages_installer_cache_only_restores_installer(tmp_path, monkeypatch):
+    installers_dir = get_installers_dir(tmp_path)
+    installer_path = Path(installers_dir, installer_file_name("testapp", "exe"))
+
+    def run_nsis(*args):
+        installers_dir.mkdir(parents=True, exist_ok=True)
+        installer_path.write_bytes(b"installer")
+        return installer_path
+
+    monkeypatch.setattr(pyship.pyship, "create_pyship_launcher", lambda app_info, app_dir: tmp_path / "testapp.exe")
+    monkeypatch.setattr(pyship.pyship, "create_clip", lambda app_info, app_dir, *args, **kwargs: _make_clip_dir(app_dir))
+    monkeypatch.setattr(pyship.pyship, "run_nsis", run_nsis)
+    monkeypatch.setattr(PyShip, "_stage_keys", lambda self, *args: {stage_name: f"{stage_name}_key" for stage_name in ("clip", "installer")})
+    py_ship = PyShip(tmp_path, upload=False)
+    build_cache = BuildCache(Path(tmp_path, "cache"), "testapp")
+
+    def ship_stages():
+        return py_ship._ship_stages(_make_app_info(tmp_path), tmp_path / "app" / "testapp", tmp_path / "cache", py_ship._signing_config(), build_cache, "source")
+
+    installers_dir.mkdir(parents=True)
+    Path(installers_dir, installer_file_name("testapp", "msix")).write_bytes(b"an MSIX from an earlier run")
+    run_stages(ship_stages())
+
+    shutil.rmtree(installers_dir)
+    monkeypatch.setattr(pyship.pyship, "run_nsis", None)  # restored, not built
+    assert run_stages(ship_stages())["installer"] == installer_path
+    assert sorted(path.name for path in installers_dir.iterdir()) == [installer_path.name]  # not the old MSIX
+
+
+def test_stage_keys_source_date_epoch(tmp_path, monkeypatch):
+    monkeypatch.setattr(pyship.pyship, "find_or_bootstrap_uv", lambda cache_dir: Path("uv.exe"))
+    monkeypatch.setattr(pyship.pyship, "uv_version", lambda uv_path: "0.0.0")
+    monkeypatch.setattr(pyship.pyship, "get_requirements_hash", lambda *args: "requirements")
+    monkeypatch.setattr(pyship.pyship, "get_icon", lambda *args: None)
+    monkeypatch.setattr(pyship.pyship, "calculate_metadata", lambda *args: {})
+    app_info = _make_app_info(tmp_path)
+    app_info.ui = "cli"
+    py_ship = PyShip(tmp_path, upload=False)
+
+    def stage_keys() -> dict:
+        return py_ship._stage_keys(app_info, tmp_path / "cache", "source")
+
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    keys = stage_keys()
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    epoch_keys = stage_keys()
+    assert epoch_keys["clip_file"] != keys["clip_file"]  # the cached .clip has the other timestamps
+    assert epoch_keys["clip"] == keys["clip"]
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1800000000")
+    assert stage_keys()["clip_file"] != epoch_keys["clip_file"]
@@ -0,0 +1,79 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+from pyship import PyshipTraceFailed
+from pyship.trace import run_trace, shake_clip, read_trace
+
+
+def _make_clip(clip_dir: Path) -> Path:
+    """Create a fake CLIP with a target app that reads a data file, plus a module it never imports."""
+    for relative_path, content in [
+        ("python.exe", "exe"),
+        ("python312._pth", "."),
+        ("DLLs/libssl-3.dll", "dll"),
+        ("DLLs/_tkinter.pyd", "pyd"),
+        ("Lib/encodings/cp1252.py", "# codec"),
+        ("Lib/unused_stdlib.py", "# unused"),
+        ("Lib/site-packages/tapp/__init__.py", "from tapp import used\n"),
+        ("Lib/site-packages/tapp/used.py", "VALUE = 1\n"),
+        ("Lib/site-packages/tapp/unused.py", "VALUE = 2\n"),
+        ("Lib/site-packages/tapp/plugins/plugin.py", "# loaded dynamically\n"),
+        ("Lib/site-packages/tapp/__main__.py", "from pathlib import Path\nprint(Path(Path(__file__).parent, 'data.txt').read_text())\n"),
+        ("Lib/site-packages/tapp/data.txt", "hello"),
+        ("Lib/site-packages/tapp-1.0.dist-info/METADATA", "Name: tapp"),
+    ]:
+        file_path = Path(clip_dir, relative_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(content)
+    return clip_dir
+
+
+def _files(clip_dir: Path) -> set:
+    return {p.relative_to(clip_dir).as_posix() for p in clip_dir.rglob("*") if p.is_file()}
+
+
+def test_run_trace(tmp_path):
+    clip_dir = _make_clip(Path(tmp_path, "clip"))
+    site_packages = Path(clip_dir, "Lib", "site-packages")
+    smoke_script = Path(tmp_path, "smoke.py")
+    smoke_script.write_text(f"import sys, runpy\nsys.path.insert(0, {str(site_packages)!r})\nrunpy.run_module('tapp', run_name='__main__')\n")
+    trace_path = Path(tmp_path, "pyship_trace.json")
+
+    files = run_trace(Path(sys.executable), clip_dir, "tapp", trace_path, smoke_script)
+
+    assert {"Lib/site-packages/tapp/__init__.py", "Lib/site-packages/tapp/used.py", "Lib/site-packages/tapp/__main__.py", "Lib/site-packages/tapp/data.txt"} <= set(files)
+    assert "Lib/site-packages/tapp/unused.py" not in files
+    assert all(not Path(f).is_absolute() for f in files)  # only CLIP files, relative to the CLIP dir
+    assert json.loads(trace_path.read_text())["files"] == files
+    assert not Path(tmp_path, "pyship_trace.json.raw").exists()
+
+
+def test_run_trace_no_trace(tmp_path):
+    clip_dir = _make_clip(Path(tmp_path, "clip"))
+    with pytest.raises(PyshipTraceFailed):
+        run_trace(Path(tmp_path, "does_not_exist.exe"), clip_dir, "tapp", Path(tmp_path, "pyship_trace.json"))
+
+
+def test_shake_clip(tmp_path):
+    clip_dir = _make_clip(Path(tmp_path, "clip"))
+    trace_path = Path(tmp_path, "pyship_trace.json")
+    traced = ["Lib/site-packages/tapp/__init__.py", "Lib/site-packages/tapp/used.py", "Lib/site-packages/tapp/__main__.py", "Lib/site-packages/tapp/data.txt"]
+    trace_path.write_text(json.dumps({"app": "tapp", "files": traced}))
+    assert read_trace(trace_path) == {f.lower() for f in traced}
+
+    prune_stats = shake_clip(clip_dir, trace_path, allow=["Lib/site-packages/tapp/plugins"])
+
+    assert _files(clip_dir) == {
+        *traced,
+        "python.exe",
+        "python312._pth",
+        "DLLs/libssl-3.dll",
+        "Lib/encodings/cp1252.py",
+        "Lib/site-packages/tapp/plugins/plugin.py",
+        "Lib/site-packages/tapp-1.0.dist-info/METADATA",
+    }
+    assert prune_stats.files == 3  # _tkinter.pyd, unused_stdlib.py, unused.py
+    assert prune_stats.bytes > 0
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+import pyship.upload_scheduler
+from pyship import UploadScheduler, get_upload_priority
+from pyship.s3_upload import S3Uploader, MIN_PART_SIZE
+from pyship.upload_scheduler import PRIORITY_CLIP, PRIORITY_INSTALLER, PRIORITY_OTHER, ADAPT_INTERVAL
+
+
+def test_get_upload_priority():
+    assert get_upload_priority("tapp_0.0.1.clip") == PRIORITY_CLIP
+    assert get_upload_priority("tapp_0.0.1_to_0.0.2.clippatch") == PRIORITY_CLIP
+    assert get_upload_priority("tapp_installer_win64.exe") == PRIORITY_INSTALLER
+    assert get_upload_priority("tapp_installer_win64.msix") == PRIORITY_INSTALLER
+    assert get_upload_priority("tapp_0.0.1_clip_manifest.json") == PRIORITY_OTHER
+
+
+def test_upload_scheduler_priority():
+    scheduler = UploadScheduler(1, adaptive=False)
+    release = threading.Event()
+    order = []
+    blocker = scheduler.submit(PRIORITY_OTHER, release.wait, 10)  # the only thread is busy while the rest are scheduled
+    futures = [
+        scheduler.submit(priority, order.append, name)
+        for priority, name in ((PRIORITY_OTHER, "manifest"), (PRIORITY_INSTALLER, "installer"), (PRIORITY_CLIP, "clip 1"), (PRIORITY_CLIP, "clip 2"))
+    ]
+    release.set()
+    for future in [blocker, *futures]:
+        future.result(10)
+    scheduler.shutdown()
+    assert order == ["clip 1", "clip 2", "installer", "manifest"]
+
+
+def test_upload_scheduler_bandwidth_cap():
+    scheduler = UploadScheduler(2, bytes_per_second=1_000_000, adaptive=False)
+    start = time.monotonic()
+    for _ in range(2):
+        body = scheduler.throttled(b"x" * 750_000)
+        while len(body.read(100_000)) > 0:
+            pass
+    # the first second's worth can be sent right away
+    assert time.monotonic() - start >= 0.4
+    assert scheduler.throttled(b"data") is not None
+    scheduler.shutdown()
+
+    assert UploadScheduler(1).throttled(b"data") == b"data"  # no cap
+
+
+class _FakeTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def _adapt(scheduler: UploadScheduler, fake_time: _FakeTime, throughput_at, intervals: int):
+    for _ in range(intervals):
+        fake_time.now += ADAPT_INTERVAL
+        scheduler.record(int(throughput_at(scheduler.concurrency) * ADAPT_INTERVAL))
+
+
+def test_upload_scheduler_adaptive_concurrency(monkeypatch):
+    fake_time = _FakeTime()
+    monkeypatch.setattr(pyship.upload_scheduler, "time", fake_time)
+
+    # throughput grows with concurrency - up to the maximum
+    scheduler = UploadScheduler(8)
+    assert scheduler.concurrency == 4
+    _adapt(scheduler, fake_time, lambda concurrency: concurrency * 1e6, 10)
+    assert scheduler.concurrency == 8
+    scheduler.shutdown()
+
+    # capped (e.g. by --upload-bandwidth) - down to the fewest connections
+    scheduler = UploadScheduler(8)
+    _adapt(scheduler, fake_time, lambda concurrency: 1e6, 10)
+    assert scheduler.concurrency == 1
+    assert len(scheduler.concurrency_history) > 0
+    scheduler.shutdown()
+
+    # saturates at 3 - stays around it
+    scheduler = UploadScheduler(8)
+    _adapt(scheduler, fake_time, lambda concurrency: min(concurrency, 3) * 1e6, 20)
+    assert 2 <= scheduler.concurrency <= 4
+    scheduler.shutdown()
+
+
+def test_s3_uploader_bandwidth_cap(tmp_path, moto_s3_access):
+    uploader = S3Uploader(moto_s3_access, part_size=MIN_PART_SIZE, bytes_per_second=4 * 1024 * 1024)
+    file_path = Path(tmp_path, "tapp_0.0.1.clip")
+    file_path.write_bytes(os.urandom(MIN_PART_SIZE + 2 * 1024 * 1024))
+    stats = uploader.upload_file(file_path, file_path.name)
+    assert stats.parts == 2
+    assert stats.seconds >= 0.5  # 7 MiB at 4 MiB/s, with a second's worth of burst
+    uploader.close()
+    download_path = Path(tmp_path, "download", file_path.name)
+    download_path.parent.mkdir()
+    moto_s3_access.download(file_path.name, download_path)
+    assert download_path.read_bytes() == file_path.read_bytes()
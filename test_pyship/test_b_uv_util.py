@@ -0,0 +1,106 @@
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import pyship.uv_util
+from pyship.uv_util import uv_python_dir, find_managed_python, uv_python_install, copy_standalone_python, get_dir_listing_hash
+
+
+class FakeRun:
+    """Stands in for subprocess.run, recording each command."""
+
+    def __init__(self, outputs: dict):
+        self.outputs = outputs
+        self.commands = []
+
+    def __call__(self, cmd, *args, **kwargs):
+        self.commands.append(cmd[1:])
+        for key, stdout in self.outputs.items():
+            if key in " ".join(cmd):
+                return SimpleNamespace(returncode=0, stdout=stdout, stderr="")
+        return SimpleNamespace(returncode=0, stdout="", stderr="")
+
+
+@pytest.fixture(autouse=True)
+def clear_memos():
+    pyship.uv_util._uv_versions.clear()
+    pyship.uv_util._uv_python_dirs.clear()
+    yield
+    pyship.uv_util._uv_versions.clear()
+    pyship.uv_util._uv_python_dirs.clear()
+
+
+def _make_managed_python(managed_python_dir: Path, name: str) -> Path:
+    python_exe = Path(managed_python_dir, name, "python.exe")
+    python_exe.parent.mkdir(parents=True)
+    python_exe.write_text("exe")
+    Path(managed_python_dir, name, "python312.dll").write_text("dll")
+    return python_exe
+
+
+def test_uv_python_dir_memoized(tmp_path, monkeypatch):
+    fake_run = FakeRun({"python dir": f"{tmp_path}\n"})
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    uv_path = Path(tmp_path, "uv.exe")
+    assert uv_python_dir(uv_path) == tmp_path
+    assert uv_python_dir(uv_path) == tmp_path
+    assert fake_run.commands == [["python", "dir"]]
+
+
+def test_find_managed_python(tmp_path):
+    assert find_managed_python(Path(tmp_path, "does_not_exist"), "3.12") is None
+    python_exe = _make_managed_python(tmp_path, "cpython-3.12.8-windows-x86_64-none")
+    _make_managed_python(tmp_path, "cpython-3.13.1-windows-x86_64-none")
+    assert find_managed_python(tmp_path, "3.12") == python_exe
+    assert find_managed_python(tmp_path, "3.11") is None
+
+
+def test_uv_python_install_skips_install_when_present(tmp_path, monkeypatch):
+    python_exe = _make_managed_python(tmp_path, "cpython-3.12.8-windows-x86_64-none")
+    fake_run = FakeRun({"python dir": str(tmp_path)})
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    assert uv_python_install(Path(tmp_path, "uv.exe"), "3.12") == python_exe
+    assert fake_run.commands == [["python", "dir"]]
+
+
+def test_uv_python_install_installs_when_missing(tmp_path, monkeypatch):
+    fake_run = FakeRun({"python dir": str(tmp_path)})
+
+    def run(cmd, *args, **kwargs):
+        if cmd[1:3] == ["python", "install"]:
+            _make_managed_python(tmp_path, "cpython-3.12.8-windows-x86_64-none")
+        return fake_run(cmd, *args, **kwargs)
+
+    monkeypatch.setattr(subprocess, "run", run)
+    assert uv_python_install(Path(tmp_path, "uv.exe"), "3.12").exists()
+    assert fake_run.commands == [["python", "dir"], ["python", "install", "3.12"]]
+
+
+def test_copy_standalone_python_verifies_once(tmp_path, monkeypatch):
+    managed_python_dir = Path(tmp_path, "managed")
+    _make_managed_python(managed_python_dir, "cpython-3.12.8-windows-x86_64-none")
+    fake_run = FakeRun({"python dir": str(managed_python_dir), "--version": "uv 0.9.0", "sys.version": "3.12.8"})
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    uv_path = Path(tmp_path, "uv.exe")
+    cache_dir = Path(tmp_path, "cache")
+
+    copy_standalone_python(uv_path, "3.12", Path(tmp_path, "clip_1"), cache_dir)
+    copy_standalone_python(uv_path, "3.12", Path(tmp_path, "clip_2"), cache_dir)
+    verifications = [c for c in fake_run.commands if c[-1] == "import sys; print(sys.version)"]
+    assert len(verifications) == 1
+
+    # a different uv version is verified again
+    pyship.uv_util._uv_versions[uv_path] = "uv 0.9.1"
+    copy_standalone_python(uv_path, "3.12", Path(tmp_path, "clip_3"), cache_dir)
+    verifications = [c for c in fake_run.commands if c[-1] == "import sys; print(sys.version)"]
+    assert len(verifications) == 2
+
+
+def test_dir_listing_hash_changes_with_contents(tmp_path):
+    Path(tmp_path, "a.txt").write_text("a")
+    before = get_dir_listing_hash(tmp_path)
+    assert get_dir_listing_hash(tmp_path) == before
+    Path(tmp_path, "a.txt").write_text("longer")
+    assert get_dir_listing_hash(tmp_path) != before
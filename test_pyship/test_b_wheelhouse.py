@@ -0,0 +1,128 @@
+import os
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+import pyship.clip
+from pyship import PyshipWheelhouseMissing
+from pyship.clip import install_target_app
+from pyship.uv_util import uv_pip_install
+from pyship.wheelhouse import get_requirements_hash, build_wheelhouse, require_wheelhouse, get_wheelhouse_dir, uv_lock, WHEELHOUSE_DIR_NAME
+
+
+class FakePipDownload:
+    """Stands in for subprocess.run - "downloads" the given wheels into pip's -d dir."""
+
+    def __init__(self, wheels: dict):
+        self.wheels = wheels
+        self.commands = []
+
+    def __call__(self, cmd, *args, **kwargs):
+        self.commands.append(cmd)
+        if "download" in cmd:
+            download_dir = cmd[cmd.index("-d") + 1]
+            for name, content in self.wheels.items():
+                Path(download_dir, name).write_bytes(content)
+        return SimpleNamespace(returncode=0, stdout="", stderr="")
+
+
+def _lock(tmp_path: Path, name: str, content: str) -> Path:
+    lock_path = Path(tmp_path, name)
+    lock_path.write_text(content)
+    return lock_path
+
+
+def test_build_wheelhouse(tmp_path, monkeypatch):
+    cache_dir = Path(tmp_path, "cache")
+    lock_path = _lock(tmp_path, "pyship-lock.txt", "attrs==25.1.0 --hash=sha256:abc\n")
+    fake_run = FakePipDownload({"attrs-25.1.0-py3-none-any.whl": b"attrs", "typeguard-4.4.0-py3-none-any.whl": b"typeguard"})
+    monkeypatch.setattr(subprocess, "run", fake_run)
+
+    wheelhouse_dir = build_wheelhouse(Path("uv.exe"), lock_path, cache_dir, "3.12")
+
+    assert wheelhouse_dir == get_wheelhouse_dir(cache_dir, lock_path)
+    assert Path(wheelhouse_dir, "attrs-25.1.0-py3-none-any.whl").read_bytes() == b"attrs"
+    cmd = fake_run.commands[0]
+    assert cmd[1:5] == ["tool", "run", "pip", "download"]
+    assert {"--require-hashes", "--only-binary", "win_amd64", "cp312"} <= set(cmd)
+    # content-addressed store, linked into the lock's wheelhouse dir
+    stored = [p for p in Path(cache_dir, WHEELHOUSE_DIR_NAME).glob("*/*.whl") if p.parent.name != "locks"]
+    assert len(stored) == 2
+    assert os.path.samefile(Path(wheelhouse_dir, "attrs-25.1.0-py3-none-any.whl"), next(p for p in stored if p.name.startswith("attrs")))
+
+    # already complete - nothing downloaded
+    assert build_wheelhouse(Path("uv.exe"), lock_path, cache_dir, "3.12") == wheelhouse_dir
+    assert len(fake_run.commands) == 1
+    assert require_wheelhouse(cache_dir, lock_path) == wheelhouse_dir
+
+    # a new lock shares the unchanged wheel
+    new_lock_path = _lock(tmp_path, "new-lock.txt", "attrs==25.1.0 --hash=sha256:abc\ntypeguard==4.4.1\n")
+    fake_run.wheels = {"attrs-25.1.0-py3-none-any.whl": b"attrs", "typeguard-4.4.1-py3-none-any.whl": b"typeguard 4.4.1"}
+    build_wheelhouse(Path("uv.exe"), new_lock_path, cache_dir, "3.12")
+    stored = [p for p in Path(cache_dir, WHEELHOUSE_DIR_NAME).glob("*/*.whl") if p.parent.name != "locks"]
+    assert len(stored) == 3
+
+
+def test_require_wheelhouse(tmp_path):
+    cache_dir = Path(tmp_path, "cache")
+    with pytest.raises(PyshipWheelhouseMissing):
+        require_wheelhouse(cache_dir, Path(tmp_path, "no-lock.txt"))
+    with pytest.raises(PyshipWheelhouseMissing):
+        require_wheelhouse(cache_dir, _lock(tmp_path, "pyship-lock.txt", "attrs==25.1.0\n"))
+
+
+def test_uv_lock(tmp_path, monkeypatch):
+    fake_run = FakePipDownload({})
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    lock_path = Path(tmp_path, "pyship-lock.txt")
+    assert uv_lock(Path("uv.exe"), tmp_path, "3.13", lock_path) == lock_path
+    cmd = fake_run.commands[0]
+    assert cmd[1:4] == ["pip", "compile", "pyproject.toml"]
+    assert {"--generate-hashes", "x86_64-pc-windows-msvc", "3.13", str(lock_path.absolute())} <= set(cmd)
+
+
+def test_get_requirements_hash(tmp_path, monkeypatch):
+    resolved = {"requirements": "attrs==25.1.0\n"}
+    commands = []
+
+    def fake_run(cmd, *args, **kwargs):
+        commands.append(cmd)
+        return SimpleNamespace(returncode=0, stdout=resolved["requirements"], stderr="")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    requirements_hash = get_requirements_hash(Path("uv.exe"), tmp_path, "3.13")
+    assert get_requirements_hash(Path("uv.exe"), tmp_path, "3.13") == requirements_hash
+    resolved["requirements"] = "attrs==25.3.0\n"  # a new dependency release
+    assert get_requirements_hash(Path("uv.exe"), tmp_path, "3.13") != requirements_hash
+    assert commands[0][1:4] == ["pip", "compile", "pyproject.toml"]
+    assert {"x86_64-pc-windows-msvc", "3.13", "--no-header"} <= set(commands[0])
+
+
+def test_install_target_app_offline(tmp_path, monkeypatch):
+    fake_run = FakePipDownload({})
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    monkeypatch.setattr(pyship.clip, "find_or_bootstrap_uv", lambda cache_dir: Path("uv.exe"))
+    dist_dir = Path(tmp_path, "dist")
+    wheelhouse_dir = Path(tmp_path, "wheelhouse")
+    dist_dir.mkdir()
+    wheelhouse_dir.mkdir()
+    lock_path = _lock(tmp_path, "pyship-lock.txt", "attrs==25.1.0\n")
+
+    install_target_app("tapp", Path(tmp_path, "clip"), dist_dir, tmp_path, lock_path, wheelhouse_dir)
+
+    dependencies_cmd, app_cmd = fake_run.commands
+    for cmd in (dependencies_cmd, app_cmd):
+        assert {"--no-index", "--offline"} <= set(cmd)
+        assert "-U" not in cmd
+    assert dependencies_cmd[dependencies_cmd.index("-r") + 1] == str(lock_path)
+    assert str(wheelhouse_dir) in dependencies_cmd
+    assert "tapp" in app_cmd and "--no-deps" in app_cmd
+
+
+def test_uv_pip_install_online(tmp_path, monkeypatch):
+    fake_run = FakePipDownload({})
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    uv_pip_install(Path("uv.exe"), Path("python.exe"), ["tapp"], tmp_path, system=True)
+    assert fake_run.commands[0][1:] == ["pip", "install", "--python", "python.exe", "--system", "-U", "tapp", "-f", str(tmp_path)]